@@ -1,18 +1,89 @@
 """
 智能体决策系统 - 根据用户查询路由到合适的Agent
 """
-from typing import Dict, List
+import json
+import re
+from typing import Dict, List, Optional, Tuple
 from langchain_core.prompts import PromptTemplate
 from config import AgentDecisionConfig
+from llm_limiter import ProviderOverloadedError
+from .executor import run_blocking
+from .fast_router import FastRouter
+
+AGENT_TYPES = ("RAG", "WEBSEARCH", "CONVERSATION")
+
+# 模型有时会把JSON包在 ```json ... ``` 代码块里
+_JSON_OBJECT_PATTERN = re.compile(r'\{.*\}', re.DOTALL)
+# 决策提示词结尾的「你的决策:」，合并决策时移到追加的输出要求之后
+_DECISION_SUFFIX_PATTERN = re.compile(r'\s*你的决策\s*[:：]\s*$')
+
+
+def parse_route_decision(text: str, available_kbs: Dict[str, str]) -> Tuple[str, List[str]]:
+    """
+    严格解析合并决策的JSON输出
+
+    Args:
+        text: LLM输出，形如 {"agent": "RAG", "knowledge_bases": ["医疗知识库"]}
+        available_kbs: 可用的知识库 {名称: 描述}
+
+    Returns:
+        (agent_type, 知识库名称列表)；非RAG决策的知识库列表为空，
+        RAG决策没有选中任何已知知识库时返回所有知识库
+
+    Raises:
+        ValueError: 输出不是合法的JSON对象，或字段缺失、类型错误、智能体类型未知
+    """
+    match = _JSON_OBJECT_PATTERN.search(text)
+    if not match:
+        raise ValueError(f"决策输出中没有JSON对象: {text!r}")
+    try:
+        decision = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"决策输出不是合法的JSON: {e}")
+    if not isinstance(decision, dict):
+        raise ValueError("决策输出不是JSON对象")
+
+    agent_type = decision.get("agent")
+    if not isinstance(agent_type, str) or agent_type.strip().upper() not in AGENT_TYPES:
+        raise ValueError(f"未知的智能体类型: {agent_type!r}")
+    agent_type = agent_type.strip().upper()
+
+    knowledge_bases = decision.get("knowledge_bases", [])
+    if not isinstance(knowledge_bases, list) or not all(isinstance(kb, str) for kb in knowledge_bases):
+        raise ValueError(f"knowledge_bases 必须是字符串列表: {knowledge_bases!r}")
+    if agent_type != "RAG":
+        return agent_type, []
+
+    requested = {kb.strip() for kb in knowledge_bases}
+    selected_kbs = [kb_name for kb_name in available_kbs if kb_name in requested]
+    return agent_type, selected_kbs or list(available_kbs.keys())
+
 
 class AgentDecision:
     """智能体决策类 - 决定使用哪个Agent处理用户请求"""
     
-    def __init__(self, config_manager=None):
+    def __init__(self, config_manager=None, embedding_model=None, knowledge_bases: Dict[str, str] = None):
+        """
+        Args:
+            config_manager: 配置管理器
+            embedding_model: 向量化模型，提供时启用本地快速路由
+            knowledge_bases: 知识库 {名称: 描述}，用于本地快速路由
+        """
         self.config = AgentDecisionConfig()
         self.llm = self.config.llm
         self.config_manager = config_manager
         
+        # 本地快速路由（置信度高时跳过LLM决策）
+        self.fast_router = None
+        if self.config.fast_router_enabled and embedding_model is not None:
+            self.fast_router = FastRouter(
+                embedding_model,
+                knowledge_bases or {},
+                examples=FastRouter.load_examples(self.config.fast_router_examples_path),
+                min_similarity=self.config.fast_router_min_similarity,
+                min_margin=self.config.fast_router_min_margin
+            )
+        
         # 从配置管理器加载提示词模板
         self.update_prompt()
     
@@ -66,6 +137,132 @@ class AgentDecision:
 
 你的决策:"""
     
+    def _get_route_decision_template(self) -> str:
+        """获取合并决策的附加模板（可用知识库和JSON输出格式），追加在配置的决策提示词之后"""
+        return """
+
+可用的知识库:
+{knowledge_bases}
+
+输出要求(以此为准,替代上面要求的回答格式):
+只输出一个JSON对象,不要输出其他内容,格式如下:
+{{"agent": "RAG 或 WEBSEARCH 或 CONVERSATION", "knowledge_bases": ["知识库名称"]}}
+agent不是RAG时knowledge_bases为空列表;需要搜索多个知识库时列出所有知识库名称。
+
+你的决策:"""
+    
+    def _format_history(self, conversation_history: List[Dict] = None) -> str:
+        """格式化最近4条对话历史"""
+        history_text = ""
+        if conversation_history:
+            for msg in conversation_history[-4:]:
+                history_text += f"{msg.get('role', '')}: {msg.get('content', '')}\n"
+        return history_text if history_text else "无"
+    
+    def _build_route_prompt(self, query: str, conversation_history: List[Dict],
+                            available_kbs: Dict[str, str]) -> str:
+        """合并决策提示词：配置的决策提示词（用户可在配置页面修改） + 可用知识库 + JSON输出格式"""
+        decision_text = self.decision_prompt.format(
+            query=query,
+            conversation_history=self._format_history(conversation_history)
+        )
+        decision_text = _DECISION_SUFFIX_PATTERN.sub("", decision_text)
+        kb_info = "".join(f"- {kb_name}: {description}\n" for kb_name, description in available_kbs.items())
+        return decision_text + self._get_route_decision_template().format(knowledge_bases=kb_info if kb_info else "无")
+    
+    def decide_route(self, query: str, conversation_history: List[Dict] = None,
+                     available_kbs: Dict[str, str] = None) -> Tuple[str, List[str]]:
+        """
+        一次LLM调用同时决定使用哪个Agent和哪些知识库
+        
+        Args:
+            query: 用户查询
+            conversation_history: 对话历史
+            available_kbs: 可用的知识库 {名称: 描述}
+            
+        Returns:
+            (agent_type, 知识库名称列表)，非RAG决策的知识库列表为空
+        """
+        available_kbs = available_kbs or {}
+        try:
+            response = self.llm.invoke(self._build_route_prompt(query, conversation_history, available_kbs))
+            return parse_route_decision(response.content.strip(), available_kbs)
+        except ValueError as e:
+            # 输出格式不合法时退回分两步决策
+            print(f"⚠️  合并决策输出无法解析，改为分步决策: {e}")
+        except ProviderOverloadedError:
+            # 限流排队失败交给Web层返回429/503
+            raise
+        except Exception as e:
+            print(f"决策出错: {e}")
+            return "CONVERSATION", []
+        
+        agent_type = self.decide(query, conversation_history)
+        if agent_type != "RAG":
+            return agent_type, []
+        return agent_type, self.decide_knowledge_base(query, available_kbs)
+    
+    async def adecide_route(self, query: str, conversation_history: List[Dict] = None,
+                            available_kbs: Dict[str, str] = None) -> Tuple[str, List[str]]:
+        """decide_route 的异步版本"""
+        available_kbs = available_kbs or {}
+        try:
+            response = await self.llm.ainvoke(self._build_route_prompt(query, conversation_history, available_kbs))
+            return parse_route_decision(response.content.strip(), available_kbs)
+        except ValueError as e:
+            print(f"⚠️  合并决策输出无法解析，改为分步决策: {e}")
+        except ProviderOverloadedError:
+            raise
+        except Exception as e:
+            print(f"决策出错: {e}")
+            return "CONVERSATION", []
+        
+        agent_type = await self.adecide(query, conversation_history)
+        if agent_type != "RAG":
+            return agent_type, []
+        return agent_type, await self.adecide_knowledge_base(query, available_kbs)
+    
+    def fast_route(self, query: str, conversation_history: List[Dict] = None,
+                   available_kbs: Dict[str, str] = None, query_vector: List[float] = None) -> Optional[Dict]:
+        """
+        尝试用本地快速路由完成决策
+        
+        Args:
+            query: 用户查询
+            conversation_history: 当前问题之前的对话历史（不含当前问题）
+            available_kbs: 可用的知识库 {名称: 描述}
+            query_vector: 已经计算好的查询向量，None表示按需向量化
+            
+        Returns:
+            置信度足够时返回 {"agent", "knowledge_bases", "method", "similarity"}，否则返回None（需要LLM决策）
+        """
+        if self.fast_router is None:
+            return None
+        decision = self.fast_router.route(query, query_vector, conversation_history, available_kbs)
+        if decision is not None:
+            # 合并决策模式下省下1次调用，分步决策模式下RAG问题省下2次
+            saved = 1 if self.config.combined_routing or decision["agent"] != "RAG" else 2
+            self.fast_router.record_saved_calls(saved)
+        return decision
+    
+    async def afast_route(self, query: str, conversation_history: List[Dict] = None,
+                          available_kbs: Dict[str, str] = None, query_vector: List[float] = None) -> Optional[Dict]:
+        """fast_route 的异步版本（可能需要向量化查询，在共享线程池中执行）"""
+        if self.fast_router is None:
+            return None
+        return await run_blocking(self.fast_route, query, conversation_history, available_kbs, query_vector)
+    
+    @staticmethod
+    def _parse_decision(text: str) -> str:
+        """从决策输出中识别智能体类型"""
+        decision = text.strip().upper()
+        if "RAG" in decision:
+            return "RAG"
+        elif "WEBSEARCH" in decision:
+            return "WEBSEARCH"
+        else:
+            return "CONVERSATION"
+    
     def decide(self, query: str, conversation_history: List[Dict] = None) -> str:
         """
         决定使用哪个Agent
@@ -77,37 +274,52 @@ class AgentDecision:
         Returns:
             agent_type: "RAG", "WEBSEARCH", 或 "CONVERSATION"
         """
-        # 格式化对话历史
-        history_text = ""
-        if conversation_history:
-            recent_history = conversation_history[-4:]  # 只看最近4条
-            for msg in recent_history:
-                role = msg.get("role", "")
-                content = msg.get("content", "")
-                history_text += f"{role}: {content}\n"
-        
-        # 调用LLM进行决策
         prompt = self.decision_prompt.format(
             query=query,
-            conversation_history=history_text if history_text else "无"
+            conversation_history=self._format_history(conversation_history)
         )
         
         try:
             response = self.llm.invoke(prompt)
-            decision = response.content.strip().upper()
-            
-            # 验证决策结果
-            if "RAG" in decision:
-                return "RAG"
-            elif "WEBSEARCH" in decision:
-                return "WEBSEARCH"
-            else:
-                return "CONVERSATION"
-                
+            return self._parse_decision(response.content)
+        except ProviderOverloadedError:
+            raise
         except Exception as e:
             print(f"决策出错: {e}")
             return "CONVERSATION"  # 默认返回对话Agent
     
+    async def adecide(self, query: str, conversation_history: List[Dict] = None) -> str:
+        """decide 的异步版本"""
+        prompt = self.decision_prompt.format(
+            query=query,
+            conversation_history=self._format_history(conversation_history)
+        )
+        
+        try:
+            response = await self.llm.ainvoke(prompt)
+            return self._parse_decision(response.content)
+        except ProviderOverloadedError:
+            raise
+        except Exception as e:
+            print(f"决策出错: {e}")
+            return "CONVERSATION"
+    
+    def _build_knowledge_base_prompt(self, query: str, available_kbs: Dict[str, str]) -> str:
+        kb_info = ""
+        for kb_name, description in available_kbs.items():
+            kb_info += f"- {kb_name}: {description}\n"
+        return self._get_knowledge_base_decision_template().format(
+            knowledge_bases=kb_info,
+            query=query
+        )
+    
+    @staticmethod
+    def _parse_knowledge_base_decision(text: str, available_kbs: Dict[str, str]) -> List[str]:
+        """从决策输出中匹配知识库名称，没有匹配到时返回所有知识库"""
+        decision = text.strip()
+        selected_kbs = [kb_name for kb_name in available_kbs.keys() if kb_name in decision]
+        return selected_kbs or list(available_kbs.keys())
+    
     def decide_knowledge_base(self, query: str, available_kbs: Dict[str, str]) -> List[str]:
         """
         决定使用哪个知识库
@@ -122,39 +334,30 @@ class AgentDecision:
         if not available_kbs:
             return []
         
-        # 构建知识库信息文本
-        kb_info = ""
-        for kb_name, description in available_kbs.items():
-            kb_info += f"- {kb_name}: {description}\n"
-        
-        # 创建知识库决策提示词
-        template = self._get_knowledge_base_decision_template()
-        prompt = template.format(
-            knowledge_bases=kb_info,
-            query=query
-        )
-        
         try:
-            response = self.llm.invoke(prompt)
-            decision = response.content.strip()
-            
-            # 解析决策结果
-            selected_kbs = []
-            for kb_name in available_kbs.keys():
-                if kb_name in decision:
-                    selected_kbs.append(kb_name)
-            
-            # 如果没有匹配到任何知识库，返回所有知识库
-            if not selected_kbs:
-                selected_kbs = list(available_kbs.keys())
-            
-            return selected_kbs
-                
+            response = self.llm.invoke(self._build_knowledge_base_prompt(query, available_kbs))
+            return self._parse_knowledge_base_decision(response.content, available_kbs)
+        except ProviderOverloadedError:
+            raise
         except Exception as e:
             print(f"知识库决策出错: {e}")
             # 默认返回所有知识库
             return list(available_kbs.keys())
     
+    async def adecide_knowledge_base(self, query: str, available_kbs: Dict[str, str]) -> List[str]:
+        """decide_knowledge_base 的异步版本"""
+        if not available_kbs:
+            return []
+        
+        try:
+            response = await self.llm.ainvoke(self._build_knowledge_base_prompt(query, available_kbs))
+            return self._parse_knowledge_base_decision(response.content, available_kbs)
+        except ProviderOverloadedError:
+            raise
+        except Exception as e:
+            print(f"知识库决策出错: {e}")
+            return list(available_kbs.keys())
+    
     def get_agent_info(self) -> Dict[str, str]:
         """返回各Agent的信息"""
         return {
@@ -1,9 +1,10 @@
 """
 对话智能体 - 处理一般性咨询对话
 """
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List
 from langchain_core.prompts import PromptTemplate
 from config import ConversationConfig
+from llm_limiter import ProviderOverloadedError
 
 class ConversationAgent:
     """对话智能体"""
@@ -41,6 +42,35 @@ class ConversationAgent:
 
 助手:"""
     
+    def _build_prompt(self, query: str, conversation_history: List[Dict] = None) -> str:
+        """格式化对话历史并生成提示词"""
+        history_text = ""
+        if conversation_history:
+            recent_history = conversation_history[-self.config.context_limit:]
+            for msg in recent_history:
+                role = msg.get("role", "")
+                content = msg.get("content", "")
+                if role == "user":
+                    history_text += f"用户: {content}\n"
+                elif role == "assistant":
+                    history_text += f"医疗助手: {content}\n"
+        
+        return self.conversation_prompt.format(
+            query=query,
+            conversation_history=history_text if history_text else "这是对话的开始"
+        )
+    
+    def _agent_name(self) -> str:
+        return self.config_manager.get_config("system_name") if self.config_manager else "对话智能体"
+    
+    def _error_response(self, e: Exception) -> Dict:
+        print(f"对话处理出错: {e}")
+        return {
+            "agent": self._agent_name(),
+            "response": "抱歉,处理您的请求时出现错误。请稍后重试。",
+            "error": str(e)
+        }
+    
     def chat(self, query: str, conversation_history: List[Dict] = None) -> Dict:
         """
         处理对话请求
@@ -53,39 +83,51 @@ class ConversationAgent:
             response_dict: 包含回答的字典
         """
         try:
-            # 格式化对话历史
-            history_text = ""
-            if conversation_history:
-                recent_history = conversation_history[-self.config.context_limit:]
-                for msg in recent_history:
-                    role = msg.get("role", "")
-                    content = msg.get("content", "")
-                    if role == "user":
-                        history_text += f"用户: {content}\n"
-                    elif role == "assistant":
-                        history_text += f"医疗助手: {content}\n"
-            
-            # 生成响应
-            prompt = self.conversation_prompt.format(
-                query=query,
-                conversation_history=history_text if history_text else "这是对话的开始"
-            )
-            
-            response = self.llm.invoke(prompt)
-            
-            agent_name = self.config_manager.get_config("system_name") if self.config_manager else "对话智能体"
+            response = self.llm.invoke(self._build_prompt(query, conversation_history))
             return {
-                "agent": agent_name,
+                "agent": self._agent_name(),
                 "response": response.content
             }
-            
+        except ProviderOverloadedError:
+            # 限流排队失败交给Web层返回429/503
+            raise
         except Exception as e:
-            print(f"对话处理出错: {e}")
-            agent_name = self.config_manager.get_config("system_name") if self.config_manager else "对话智能体"
+            return self._error_response(e)
+    
+    async def achat(self, query: str, conversation_history: List[Dict] = None) -> Dict:
+        """处理对话请求（异步版本，不阻塞事件循环）"""
+        try:
+            response = await self.llm.ainvoke(self._build_prompt(query, conversation_history))
             return {
-                "agent": agent_name,
-                "response": "抱歉,处理您的请求时出现错误。请稍后重试。"
+                "agent": self._agent_name(),
+                "response": response.content
             }
+        except ProviderOverloadedError:
+            raise
+        except Exception as e:
+            return self._error_response(e)
+    
+    async def astream_chat(self, query: str, conversation_history: List[Dict] = None) -> AsyncIterator[Dict]:
+        """
+        流式处理对话请求
+        
+        Yields:
+            {"event": "token", "data": 文本片段}，最后是 {"event": "result", "data": 回答字典}
+        """
+        try:
+            parts = []
+            async for chunk in self.llm.astream(self._build_prompt(query, conversation_history)):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield {"event": "token", "data": chunk.content}
+            yield {"event": "result", "data": {
+                "agent": self._agent_name(),
+                "response": "".join(parts)
+            }}
+        except ProviderOverloadedError:
+            raise
+        except Exception as e:
+            yield {"event": "result", "data": self._error_response(e)}
     
     def get_health_tips(self) -> str:
         """返回通用健康建议"""
@@ -0,0 +1,49 @@
+"""
+异步执行 - 在有界线程池中运行同步调用，避免阻塞Web服务的事件循环
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from config import ExecutorConfig
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class _SharedExecutor(ThreadPoolExecutor):
+    """进程内共享的线程池：事件循环关闭时会关闭它的默认执行器，共享线程池不随之关闭"""
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        pass
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """获取共享的阻塞调用线程池（首次使用时创建）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = _SharedExecutor(
+                    max_workers=ExecutorConfig().blocking_workers,
+                    thread_name_prefix="agent-blocking"
+                )
+    return _executor
+
+
+def install_default_executor(loop: asyncio.AbstractEventLoop = None):
+    """
+    把共享线程池设为事件循环的默认执行器
+
+    LLM客户端的异步接口（ainvoke）内部通过 run_in_executor(None, ...) 执行同步请求，
+    默认执行器只有 min(32, CPU数+4) 个线程，会限制同时进行的对话数
+    """
+    (loop or asyncio.get_running_loop()).set_default_executor(get_executor())
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """在共享线程池中运行同步函数并等待结果"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
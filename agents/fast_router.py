@@ -0,0 +1,195 @@
+"""
+本地快速路由 - 用关键词规则和示例问题的向量中心做路由决策，置信度高时不调用LLM
+"""
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# 内置的带标签示例问题，标签为智能体类型或知识库名称；不存在的知识库会被忽略
+DEFAULT_EXAMPLES: Dict[str, List[str]] = {
+    "CONVERSATION": [
+        "你好", "您好，请问你是谁", "谢谢你的帮助", "再见", "你能做什么",
+        "早上好", "好的，我知道了", "介绍一下你自己"
+    ],
+    "WEBSEARCH": [
+        "最新的流感疫情情况怎么样", "今天有什么健康新闻", "最近有哪些新药获批上市",
+        "今年的医保政策有什么变化", "近期A股市场走势如何", "最新的癌症治疗研究进展"
+    ],
+    "医疗知识库": [
+        "高血压患者日常需要注意什么", "糖尿病有哪些典型症状", "感冒发烧应该吃什么药",
+        "布洛芬的副作用有哪些", "孕妇可以喝咖啡吗", "胃痛是什么原因引起的"
+    ],
+    "商业知识库": [
+        "如何制定公司的年度预算", "现金流量表怎么分析", "什么是市场营销的4P理论",
+        "创业公司如何进行股权分配", "怎样提高团队的管理效率", "企业融资有哪些方式"
+    ],
+}
+
+# 关键词规则：整句匹配寒暄用语，直接交给对话智能体
+_SMALL_TALK_PATTERN = re.compile(
+    r'^(你好|您好|嗨|哈喽|hi|hello|hey|早上好|中午好|下午好|晚上好|晚安|谢谢|多谢|感谢|谢谢你|谢啦|'
+    r'再见|拜拜|bye|好的|好|嗯|嗯嗯|ok|okay|知道了|明白了|收到|你是谁|你叫什么)'
+    r'[\s,，.。!！?？~～呀啊呢吧哦啦]*$',
+    re.IGNORECASE
+)
+# 关键词规则：明确要求联网，或时间词与资讯类词同时出现（"最近总是头痛"这类问题不会命中）
+_WEBSEARCH_EXPLICIT_PATTERN = re.compile(r'(新闻|上网搜|网上搜|搜索一下|搜一下|联网)')
+_WEBSEARCH_TIME_PATTERN = re.compile(r'(最新|最近|近期|今天|今日|昨天|本周|这周|本月|今年|实时)')
+_WEBSEARCH_TOPIC_PATTERN = re.compile(r'(消息|进展|动态|政策|疫情|行情|发布|获批|上市|股价|汇率|天气)')
+
+
+class FastRouter:
+    """
+    本地路由分类器
+
+    每个标签（CONVERSATION、WEBSEARCH、各知识库）的示例问题和知识库描述向量化后取平均作为中心，
+    查询向量与最相似的中心相似度足够高、且明显高于第二名时直接给出决策
+    """
+
+    def __init__(self, embedding_model, knowledge_bases: Dict[str, str],
+                 examples: Dict[str, List[str]] = None, min_similarity: float = 0.6,
+                 min_margin: float = 0.08):
+        """
+        Args:
+            embedding_model: 向量化模型（与检索共用，查询向量可复用缓存）
+            knowledge_bases: 知识库 {名称: 描述}
+            examples: 带标签的示例问题 {智能体类型或知识库名称: [问题]}，None表示使用内置示例
+            min_similarity: 直接决策所需的最小余弦相似度
+            min_margin: 最相似标签与第二名的最小相似度差
+        """
+        self.embedding_model = embedding_model
+        self.knowledge_bases = knowledge_bases
+        self.examples = examples if examples is not None else DEFAULT_EXAMPLES
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.decisions = 0
+        self.fast_decisions = 0
+        self.llm_calls_saved = 0
+        self._labels: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load_examples(path: str) -> Dict[str, List[str]]:
+        """
+        加载示例问题，文件中的标签追加到内置示例上
+
+        文件格式: {"CONVERSATION": ["..."], "WEBSEARCH": ["..."], "医疗知识库": ["..."]}
+        """
+        examples = {label: list(queries) for label, queries in DEFAULT_EXAMPLES.items()}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for label, queries in json.load(f).items():
+                        examples.setdefault(label, []).extend(queries)
+            except Exception as e:
+                print(f"⚠️  加载路由示例失败: {e}")
+        return examples
+
+    def _build_centroids(self):
+        """向量化示例问题和知识库描述，计算每个标签的中心"""
+        texts_by_label: Dict[str, List[str]] = {}
+        for label in ("CONVERSATION", "WEBSEARCH"):
+            texts_by_label[label] = list(self.examples.get(label, []))
+        for kb_name, description in self.knowledge_bases.items():
+            texts_by_label[kb_name] = [description] + list(self.examples.get(kb_name, []))
+        texts_by_label = {label: texts for label, texts in texts_by_label.items() if texts}
+
+        all_texts = [text for texts in texts_by_label.values() for text in texts]
+        vectors = np.asarray(self.embedding_model.embed_documents(all_texts), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        labels, centroids, start = [], [], 0
+        for label, texts in texts_by_label.items():
+            centroid = vectors[start:start + len(texts)].mean(axis=0)
+            centroids.append(centroid / max(np.linalg.norm(centroid), 1e-12))
+            labels.append(label)
+            start += len(texts)
+        self._labels = labels
+        self._centroids = np.stack(centroids)
+
+    def classify(self, query_vector: List[float]) -> List[tuple]:
+        """
+        计算查询与每个标签中心的相似度
+
+        Returns:
+            [(标签, 余弦相似度)]，按相似度从高到低排列
+        """
+        with self._lock:
+            if self._centroids is None:
+                self._build_centroids()
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+        similarities = self._centroids @ query
+        order = np.argsort(-similarities)
+        return [(self._labels[i], float(similarities[i])) for i in order]
+
+    def route(self, query: str, query_vector: List[float] = None, conversation_history: List[Dict] = None,
+              available_kbs: Dict[str, str] = None) -> Optional[Dict]:
+        """
+        尝试在本地完成路由
+
+        有对话历史时只应用寒暄规则，追问的含义依赖上下文，交给LLM判断
+
+        Args:
+            conversation_history: 当前问题之前的对话历史（不含当前问题）
+
+        Returns:
+            置信度足够时返回 {"agent", "knowledge_bases", "method", "similarity"}，否则返回None
+        """
+        self.decisions += 1
+        available_kbs = available_kbs if available_kbs is not None else self.knowledge_bases
+        stripped = query.strip()
+
+        if _SMALL_TALK_PATTERN.match(stripped):
+            return self._decide("CONVERSATION", [], "keyword")
+        if conversation_history:
+            return None
+        if _WEBSEARCH_EXPLICIT_PATTERN.search(stripped) or (
+                _WEBSEARCH_TIME_PATTERN.search(stripped) and _WEBSEARCH_TOPIC_PATTERN.search(stripped)):
+            return self._decide("WEBSEARCH", [], "keyword")
+
+        try:
+            if query_vector is None:
+                query_vector = self.embedding_model.embed_query(query)
+            ranking = self.classify(query_vector)
+        except Exception as e:
+            print(f"⚠️  本地路由失败: {e}")
+            return None
+
+        label, similarity = ranking[0]
+        runner_up = ranking[1][1] if len(ranking) > 1 else -1.0
+        if similarity < self.min_similarity or similarity - runner_up < self.min_margin:
+            return None
+        if label in ("CONVERSATION", "WEBSEARCH"):
+            return self._decide(label, [], "embedding", similarity)
+        if label not in available_kbs:
+            return None
+        return self._decide("RAG", [label], "embedding", similarity)
+
+    def _decide(self, agent_type: str, knowledge_bases: List[str], method: str,
+                similarity: float = None) -> Dict:
+        self.fast_decisions += 1
+        return {
+            "agent": agent_type,
+            "knowledge_bases": knowledge_bases,
+            "method": method,
+            "similarity": round(similarity, 4) if similarity is not None else None
+        }
+
+    def record_saved_calls(self, count: int):
+        """记录本地决策省下的LLM调用次数"""
+        self.llm_calls_saved += count
+
+    def get_stats(self) -> Dict:
+        """获取本地路由统计"""
+        return {
+            "decisions": self.decisions,
+            "fast_decisions": self.fast_decisions,
+            "llm_calls_saved": self.llm_calls_saved,
+            "fast_rate": self.fast_decisions / self.decisions if self.decisions else 0.0
+        }
@@ -1,13 +1,33 @@
 """
 RAG智能体 - 基于向量数据库的检索增强生成
 """
-from typing import Dict, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import (
+    CompressionRatio, Distance, PointIdsList, PointStruct, ProductQuantization, ProductQuantizationConfig,
+    QuantizationSearchParams, ScalarQuantization, ScalarQuantizationConfig, ScalarType, SearchParams, VectorParams
+)
 from config import RAGConfig
+from llm_limiter import ProviderOverloadedError
+from ..executor import run_blocking
+from .bulk_loader import BulkLoader
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+from .kb_router import KnowledgeBaseRouter
+from .lexical_index import BM25Index, normalize_point_id, reciprocal_rank_fusion
+from .local_vector_store import LocalVectorClient, LocalVectorStore
+from .locked_client import LockedClient
+from .reranker import create_reranker, rerank_with_budget
+import math
 import os
+import threading
+import time
+import uuid
 
 class MedicalRAG:
     """RAG智能体 - 支持多知识库"""
@@ -18,16 +38,114 @@ class MedicalRAG:
         self.embedding_model = self.config.embedding_model
         self.config_manager = config_manager
         
+        # 文档向量和查询向量都经过本地缓存
+        self.embedding_cache = None
+        if self.config.embedding_cache_enabled:
+            self.embedding_cache = EmbeddingCache(
+                self.config.embedding_cache_path,
+                max_items=self.config.embedding_cache_max_items
+            )
+            self.embedding_model = CachedEmbeddings(
+                self.embedding_model,
+                self.embedding_cache,
+                self.config.embedding_model_name
+            )
+        
+        # 文档向量化批处理器（分批、并发、限流、重试）
+        self.embedding_batcher = EmbeddingBatcher(
+            self.embedding_model,
+            batch_size=self.config.embedding_batch_size,
+            max_concurrency=self.config.embedding_max_concurrency,
+            rate_limit=self.config.embedding_rate_limit,
+            max_retries=self.config.embedding_max_retries
+        )
+        
         # 初始化Qdrant客户端和所有知识库
         self._init_vector_db()
         
+        # 预先计算好的向量直接分批并行写入Qdrant（本地模式的客户端不是线程安全的，只能串行写入）
+        self.bulk_loader = BulkLoader(
+            self.qdrant_client,
+            batch_size=self.config.upsert_batch_size,
+            parallelism=1 if self.config.use_local or self.config.vector_backend == "local"
+            else self.config.upsert_parallelism,
+            indexing_threshold=self.config.indexing_threshold
+        )
+        
+        # 每个collection的BM25索引，首次使用时打开
+        self.lexical_indexes: Dict[str, BM25Index] = {}
+        self._lexical_lock = threading.Lock()
+        
+        # 知识库向量画像（导入时更新，用于不调用LLM的知识库路由）
+        self.kb_router = KnowledgeBaseRouter(
+            self.config.kb_profile_dir,
+            sample_size=self.config.kb_profile_samples,
+            threshold=self.config.kb_routing_threshold,
+            margin=self.config.kb_routing_margin
+        )
+        
+        # Qdrant量化配置（None表示不量化）
+        self.quantization_config = self._get_quantization_config()
+        
         # 存储每个知识库的vectorstore
         self.vectorstores = {}
         self._init_all_collections()
         
+        # 检索参数（量化精排等）
+        self._search_kwargs = self._get_search_kwargs()
+        
+        # 合并后候选文档的重排序器
+        self.reranker = create_reranker(self.config.reranker)
+        
+        # 多知识库并发检索线程池（本地Qdrant的调用加锁串行执行，逐个知识库检索，不需要线程池）
+        self._search_executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self.config.knowledge_bases)),
+            thread_name_prefix="rag-search"
+        ) if not isinstance(self.qdrant_client, LockedClient) else None
+        # 推测检索线程池（与检索线程池分开，避免推测任务占满检索线程导致死锁）
+        self._speculative_executor = ThreadPoolExecutor(
+            max_workers=self.config.speculative_workers,
+            thread_name_prefix="rag-speculative"
+        )
+        
+        # 知识库内容版本，写入或删除文档后递增（用于语义缓存失效）
+        self._kb_version = 0
+        
         # 从配置管理器加载提示词模板
         self.update_prompt()
     
+    def _get_quantization_config(self):
+        """Qdrant的量化配置，未开启量化或不支持量化的后端返回None"""
+        quantization = self.config.vector_quantization
+        if quantization == "none" or self.config.vector_backend == "local":
+            return None
+        if self.config.use_local:
+            print("⚠️  本地模式的Qdrant不支持量化，已忽略 VECTOR_QUANTIZATION（可使用 VECTOR_BACKEND=local）")
+            return None
+        if quantization == "int8":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if quantization == "pq":
+            return ProductQuantization(
+                product=ProductQuantizationConfig(compression=CompressionRatio.X16, always_ram=True)
+            )
+        print(f"⚠️  未知的量化方式 '{quantization}'，已忽略")
+        return None
+    
+    def _get_search_kwargs(self) -> Dict:
+        """检索参数：Qdrant开启量化时粗排后用原始向量精排"""
+        if self.quantization_config is None:
+            return {}
+        return {
+            "search_params": SearchParams(
+                quantization=QuantizationSearchParams(
+                    rescore=True,
+                    oversampling=self.config.quantization_oversampling
+                )
+            )
+        }
+    
     def update_prompt(self):
         """更新提示词模板"""
         template = self.config_manager.get_prompt("rag") if self.config_manager else self._get_default_template()
@@ -55,10 +173,21 @@ class MedicalRAG:
     def _init_vector_db(self):
         """初始化向量数据库客户端"""
         try:
-            if self.config.use_local:
+            if self.config.vector_backend == "local":
+                # 进程内向量库，接口与QdrantClient一致
+                self.qdrant_client = LocalVectorClient(
+                    self.config.local_vector_path,
+                    index_type=self.config.local_index_type,
+                    hnsw_min_points=self.config.hnsw_min_points,
+                    quantization=self.config.vector_quantization,
+                    oversampling=self.config.quantization_oversampling,
+                    compact_threshold=self.config.local_compact_threshold
+                )
+            elif self.config.use_local:
                 # 使用本地Qdrant
                 os.makedirs(self.config.vector_local_path, exist_ok=True)
-                self.qdrant_client = QdrantClient(path=self.config.vector_local_path)
+                # 本地模式的客户端不是线程安全的，检索、推测检索和文件夹监听的写入共用时需要加锁
+                self.qdrant_client = LockedClient(QdrantClient(path=self.config.vector_local_path))
             else:
                 # 使用云端Qdrant
                 self.qdrant_client = QdrantClient(
@@ -79,6 +208,7 @@ class MedicalRAG:
             # 获取现有的collections
             collections = self.qdrant_client.get_collections().collections
             collection_names = [c.name for c in collections]
+            quantization_config = self.quantization_config
             
             # 为每个知识库创建collection和vectorstore
             for kb_name, kb_config in self.config.knowledge_bases.items():
@@ -90,13 +220,23 @@ class MedicalRAG:
                         collection_name=collection_name,
                         vectors_config=VectorParams(
                             size=self.config.embedding_dim,
-                            distance=Distance.COSINE
-                        )
+                            distance=Distance.COSINE,
+                            # 量化后原始向量只用于精排，可以放在磁盘上
+                            on_disk=quantization_config is not None
+                        ),
+                        quantization_config=quantization_config
                     )
                     print(f"✅ 创建新的知识库: {kb_name} (collection: {collection_name})")
+                elif quantization_config is not None:
+                    # 已有collection开启量化，Qdrant在后台生成量化向量
+                    self.qdrant_client.update_collection(
+                        collection_name=collection_name,
+                        quantization_config=quantization_config
+                    )
                 
                 # 初始化vectorstore
-                self.vectorstores[kb_name] = QdrantVectorStore(
+                vectorstore_class = LocalVectorStore if self.config.vector_backend == "local" else QdrantVectorStore
+                self.vectorstores[kb_name] = vectorstore_class(
                     client=self.qdrant_client,
                     collection_name=collection_name,
                     embedding=self.embedding_model
@@ -116,8 +256,168 @@ class MedicalRAG:
             print(f"初始化知识库collections失败: {e}")
             self.vectorstore = None
     
+    def speculative_retrieve(self, query: str) -> Optional[Future]:
+        """
+        在后台检索所有知识库，与路由决策并行进行
+        
+        检索结果带有知识库来源，路由选出知识库后按来源过滤即可，与只检索选定知识库的结果相同
+        （每个知识库各自取top_k，混合检索的融合分数也只取决于文档所在知识库的排名）
+        
+        Args:
+            query: 用户查询
+            
+        Returns:
+            检索结果的Future，传给 query(speculative=...)；没有可用知识库时返回None
+        """
+        if not self.vectorstores:
+            return None
+        return self._speculative_executor.submit(self._retrieve, query, list(self.vectorstores.keys()))
+    
+    def _prepare_query(self, query: str, conversation_history: List[Dict] = None,
+                       knowledge_bases: List[str] = None, speculative: Future = None) -> Dict:
+        """
+        检索、重排序并生成提示词（同步阻塞部分）
+        
+        Returns:
+            不需要调用LLM时返回 {"result": 最终回答字典}，
+            否则返回 {"prompt", "top_docs", "all_docs", "best_score", "search_kbs", "timings", "rerank_timed_out"}
+        """
+        # 检查是否有可用的知识库
+        if not self.vectorstores:
+            return {"result": {
+                "agent": "RAG智能体",
+                "response": "知识库暂时不可用。这可能是因为知识库还未初始化。请联系管理员添加文档到知识库中。",
+                "sources": [],
+                "confidence": 0.0,
+                "knowledge_bases_used": []
+            }}
+        
+        # 确定要检索的知识库
+        if knowledge_bases is None:
+            # 检索所有知识库
+            search_kbs = list(self.vectorstores.keys())
+        else:
+            # 检索指定的知识库
+            search_kbs = [kb for kb in knowledge_bases if kb in self.vectorstores]
+        
+        if not search_kbs:
+            return {"result": {
+                "agent": "RAG智能体",
+                "response": "指定的知识库不存在。",
+                "sources": [],
+                "confidence": 0.0,
+                "knowledge_bases_used": []
+            }}
+        
+        # 从所有指定的知识库中检索文档（已有推测检索时等待其结果并按知识库过滤）
+        started_at = time.perf_counter()
+        all_retrieved_docs = None
+        if speculative is not None:
+            try:
+                all_retrieved_docs = [
+                    (doc, score) for doc, score in speculative.result()
+                    if doc.metadata.get("knowledge_base") in search_kbs
+                ]
+            except Exception as e:
+                print(f"⚠️  推测检索失败，重新检索: {e}")
+        if all_retrieved_docs is None:
+            all_retrieved_docs = self._retrieve(query, search_kbs)
+        timings = {
+            "retrieve_ms": (time.perf_counter() - started_at) * 1000,
+            "speculative": speculative is not None
+        }
+        
+        # 检查检索置信度（混合检索按融合排名排序，取所有结果中最好的向量分数，回答的置信度也使用该分数）
+        best_score = min(score for _, score in all_retrieved_docs) if all_retrieved_docs else None
+        if best_score is None or best_score > self.config.min_retrieval_confidence:
+            return {"result": {
+                "agent": "RAG智能体",
+                "response": "抱歉,我在知识库中没有找到足够可靠的相关信息来回答您的问题。建议尝试使用网络搜索功能。",
+                "sources": [],
+                "confidence": 0.0,
+                "knowledge_bases_used": search_kbs,
+                "timings": timings
+            }}
+        
+        # 重排序合并后的候选文档，只保留前N个作为上下文
+        started_at = time.perf_counter()
+        top_docs, rerank_timed_out = rerank_with_budget(
+            self.reranker, query, all_retrieved_docs,
+            self.config.reranker_top_k, self.config.rerank_budget_ms
+        )
+        timings["rerank_ms"] = (time.perf_counter() - started_at) * 1000
+        if rerank_timed_out:
+            print(f"⚠️  重排序超出时间预算 {self.config.rerank_budget_ms:g}ms，已按检索顺序截断")
+        context = "\n\n".join([doc[0].page_content for doc in top_docs])
+        
+        # 格式化对话历史
+        history_text = ""
+        if conversation_history:
+            recent_history = conversation_history[-4:]
+            for msg in recent_history:
+                role = msg.get("role", "")
+                content = msg.get("content", "")
+                history_text += f"{role}: {content}\n"
+        
+        prompt = self.response_prompt.format(
+            query=query,
+            context=context,
+            conversation_history=history_text if history_text else "无"
+        )
+        return {
+            "prompt": prompt,
+            "top_docs": top_docs,
+            "all_docs": all_retrieved_docs,
+            "best_score": best_score,
+            "search_kbs": search_kbs,
+            "timings": timings,
+            "rerank_timed_out": rerank_timed_out
+        }
+    
+    def _build_sources(self, top_docs: List[Tuple]) -> List[Dict]:
+        """提取来源信息"""
+        sources = []
+        if self.config.include_sources:
+            for doc, score in top_docs:
+                source_info = {
+                    "content": doc.page_content[:200] + "...",
+                    "score": float(score),
+                    "metadata": doc.metadata,
+                    "knowledge_base": doc.metadata.get("knowledge_base", "未知")
+                }
+                sources.append(source_info)
+        return sources
+    
+    def _finish_query(self, prepared: Dict, response_text: str) -> Dict:
+        """根据生成的回答和检索结果组装返回字典"""
+        return {
+            "agent": "RAG智能体",
+            "response": response_text,
+            "sources": self._build_sources(prepared["top_docs"]),
+            "confidence": float(prepared["best_score"]),
+            "knowledge_bases_used": prepared["search_kbs"],
+            "timings": {
+                **prepared["timings"],
+                "candidates": len(prepared["all_docs"]),
+                "reranker": self.reranker.name,
+                "rerank_timed_out": prepared["rerank_timed_out"]
+            }
+        }
+    
+    def _query_error(self, e: Exception) -> Dict:
+        print(f"RAG查询出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return {
+            "agent": "RAG智能体",
+            "response": f"处理查询时出错: {str(e)}",
+            "sources": [],
+            "confidence": 0.0,
+            "knowledge_bases_used": []
+        }
+    
     def query(self, query: str, conversation_history: List[Dict] = None, 
-              knowledge_bases: List[str] = None) -> Dict:
+              knowledge_bases: List[str] = None, speculative: Future = None) -> Dict:
         """
         处理RAG查询 - 支持多知识库检索
         
@@ -125,137 +425,356 @@ class MedicalRAG:
             query: 用户查询
             conversation_history: 对话历史
             knowledge_bases: 要检索的知识库列表，None表示检索所有知识库
+            speculative: speculative_retrieve 返回的推测检索结果，None表示现在检索
             
         Returns:
             response_dict: 包含回答和元数据的字典
         """
         try:
-            # 检查是否有可用的知识库
-            if not self.vectorstores:
-                return {
-                    "agent": "RAG智能体",
-                    "response": "知识库暂时不可用。这可能是因为知识库还未初始化。请联系管理员添加文档到知识库中。",
-                    "sources": [],
-                    "confidence": 0.0,
-                    "knowledge_bases_used": []
-                }
-            
-            # 确定要检索的知识库
-            if knowledge_bases is None:
-                # 检索所有知识库
-                search_kbs = list(self.vectorstores.keys())
-            else:
-                # 检索指定的知识库
-                search_kbs = [kb for kb in knowledge_bases if kb in self.vectorstores]
+            prepared = self._prepare_query(query, conversation_history, knowledge_bases, speculative)
+            if "result" in prepared:
+                return prepared["result"]
             
-            if not search_kbs:
-                return {
-                    "agent": "RAG智能体",
-                    "response": "指定的知识库不存在。",
-                    "sources": [],
-                    "confidence": 0.0,
-                    "knowledge_bases_used": []
-                }
+            # 生成响应
+            started_at = time.perf_counter()
+            response = self.llm.invoke(prepared["prompt"])
+            prepared["timings"]["generate_ms"] = (time.perf_counter() - started_at) * 1000
+            return self._finish_query(prepared, response.content)
             
-            # 从所有指定的知识库中检索文档
-            all_retrieved_docs = []
-            for kb_name in search_kbs:
-                vectorstore = self.vectorstores[kb_name]
-                docs = vectorstore.similarity_search_with_score(
-                    query,
-                    k=self.config.top_k
-                )
-                # 添加知识库来源信息
-                for doc, score in docs:
-                    doc.metadata["knowledge_base"] = kb_name
-                    all_retrieved_docs.append((doc, score))
+        except ProviderOverloadedError:
+            # 限流排队失败交给Web层返回429/503
+            raise
+        except Exception as e:
+            return self._query_error(e)
+    
+    async def aquery(self, query: str, conversation_history: List[Dict] = None,
+                     knowledge_bases: List[str] = None, speculative: Future = None) -> Dict:
+        """query 的异步版本：检索和重排序在共享线程池中执行，生成回答使用LLM的异步接口"""
+        try:
+            prepared = await run_blocking(self._prepare_query, query, conversation_history,
+                                          knowledge_bases, speculative)
+            if "result" in prepared:
+                return prepared["result"]
             
-            # 按相似度排序（分数越小越相似）
-            all_retrieved_docs.sort(key=lambda x: x[1])
+            started_at = time.perf_counter()
+            response = await self.llm.ainvoke(prepared["prompt"])
+            prepared["timings"]["generate_ms"] = (time.perf_counter() - started_at) * 1000
+            return self._finish_query(prepared, response.content)
             
-            # 检查检索置信度
-            if not all_retrieved_docs or all_retrieved_docs[0][1] > self.config.min_retrieval_confidence:
-                return {
-                    "agent": "RAG智能体",
-                    "response": "抱歉,我在知识库中没有找到足够可靠的相关信息来回答您的问题。建议尝试使用网络搜索功能。",
-                    "sources": [],
-                    "confidence": 0.0,
-                    "knowledge_bases_used": search_kbs
-                }
+        except ProviderOverloadedError:
+            raise
+        except Exception as e:
+            return self._query_error(e)
+    
+    async def astream_query(self, query: str, conversation_history: List[Dict] = None,
+                            knowledge_bases: List[str] = None, speculative: Future = None) -> AsyncIterator[Dict]:
+        """
+        流式处理RAG查询：检索完成后先产出来源，再逐段产出回答
+        
+        Yields:
+            {"event": "sources", "data": 来源列表}、{"event": "token", "data": 文本片段}，
+            最后是 {"event": "result", "data": 回答字典}（timings 中含首个文本片段的耗时 first_token_ms）
+        """
+        try:
+            prepared = await run_blocking(self._prepare_query, query, conversation_history,
+                                          knowledge_bases, speculative)
+            if "result" in prepared:
+                yield {"event": "result", "data": prepared["result"]}
+                return
             
-            # 构建上下文（取前N个最相关的）
-            top_docs = all_retrieved_docs[:self.config.reranker_top_k]
-            context = "\n\n".join([doc[0].page_content for doc in top_docs])
+            yield {"event": "sources", "data": self._build_sources(prepared["top_docs"])}
+            started_at = time.perf_counter()
+            parts = []
+            async for chunk in self.llm.astream(prepared["prompt"]):
+                if not chunk.content:
+                    continue
+                if not parts:
+                    prepared["timings"]["first_token_ms"] = (time.perf_counter() - started_at) * 1000
+                parts.append(chunk.content)
+                yield {"event": "token", "data": chunk.content}
+            prepared["timings"]["generate_ms"] = (time.perf_counter() - started_at) * 1000
+            yield {"event": "result", "data": self._finish_query(prepared, "".join(parts))}
             
-            # 格式化对话历史
-            history_text = ""
-            if conversation_history:
-                recent_history = conversation_history[-4:]
-                for msg in recent_history:
-                    role = msg.get("role", "")
-                    content = msg.get("content", "")
-                    history_text += f"{role}: {content}\n"
+        except ProviderOverloadedError:
+            raise
+        except Exception as e:
+            yield {"event": "result", "data": self._query_error(e)}
+    
+    async def aroute_knowledge_bases(self, query: str, query_vector: List[float] = None) -> Dict:
+        """route_knowledge_bases 的异步版本"""
+        return await run_blocking(self.route_knowledge_bases, query, query_vector)
+    
+    def _retrieve(self, query: str, search_kbs: List[str]) -> List[Tuple]:
+        """
+        在多个知识库中检索文档
+        
+        查询只向量化一次，再用同一个向量检索所有知识库（本地Qdrant逐个检索，其他后端并发检索）；
+        启用混合检索时同时查询每个知识库的BM25索引，两路结果按倒数排名融合
+        
+        Args:
+            query: 用户查询
+            search_kbs: 要检索的知识库名称列表
             
-            # 生成响应
-            prompt = self.response_prompt.format(
-                query=query,
-                context=context,
-                conversation_history=history_text if history_text else "无"
+        Returns:
+            (文档, 分数) 列表，按分数排序（混合检索时按融合排名排序，分数仍为向量分数）
+        """
+        query_vector = self.embedding_model.embed_query(query)
+        hybrid = self.config.hybrid_search_enabled
+        
+        def search(kb_name):
+            vectorstore = self.vectorstores[kb_name]
+            docs = vectorstore.similarity_search_with_score_by_vector(
+                query_vector,
+                k=self.config.top_k,
+                **self._search_kwargs
             )
+            lexical_hits = []
+            if hybrid:
+                index = self._get_lexical_index(vectorstore.collection_name)
+                lexical_hits = index.search(query, k=self.config.bm25_top_k)
+            return kb_name, docs, lexical_hits
+        
+        if self._search_executor is not None:
+            results = list(self._search_executor.map(search, search_kbs))
+        else:
+            results = [search(kb_name) for kb_name in search_kbs]
+        
+        all_retrieved_docs = []
+        for kb_name, docs, _ in results:
+            # 添加知识库来源信息
+            for doc, score in docs:
+                doc.metadata["knowledge_base"] = kb_name
+                all_retrieved_docs.append((doc, score))
+        
+        if hybrid:
+            return self._fuse_lexical_results(query_vector, results)
+        
+        # 按相似度排序（分数越小越相似）
+        all_retrieved_docs.sort(key=lambda x: x[1])
+        return all_retrieved_docs
+    
+    def _fuse_lexical_results(self, query_vector: List[float], results: List[Tuple]) -> List[Tuple]:
+        """
+        按倒数排名融合向量检索和BM25检索的结果
+        
+        只被BM25检索到的文档从Qdrant取回向量计算分数，保证所有结果的分数含义一致
+        
+        Args:
+            query_vector: 查询向量
+            results: [(知识库名称, 向量检索结果, BM25检索结果)]
+        """
+        candidates = {}
+        rankings = []
+        for kb_name, docs, lexical_hits in results:
+            collection_name = self.vectorstores[kb_name].collection_name
+            dense_ranking = []
+            for rank, (doc, score) in enumerate(docs):
+                point_id = doc.metadata.get("_id")
+                point_id = normalize_point_id(point_id) if point_id is not None else f"{collection_name}#{rank}"
+                candidates[point_id] = (doc, score)
+                dense_ranking.append(point_id)
+            rankings.append(dense_ranking)
             
-            response = self.llm.invoke(prompt)
+            missing = [hit for hit in lexical_hits if hit[0] not in candidates]
+            scores = self._score_points(collection_name, [hit[0] for hit in missing], query_vector)
+            for point_id, content, metadata, _ in missing:
+                # 索引中有但向量库中已不存在的文档跳过
+                if point_id not in scores:
+                    continue
+                metadata = dict(metadata, knowledge_base=kb_name, _id=point_id, _collection_name=collection_name)
+                candidates[point_id] = (Document(page_content=content, metadata=metadata), scores[point_id])
+            rankings.append([hit[0] for hit in lexical_hits if hit[0] in candidates])
+        
+        fused = reciprocal_rank_fusion(rankings, k=self.config.rrf_k)
+        # 融合分数相同时按向量分数排序（分数越小越相似）
+        order = sorted(candidates, key=lambda point_id: (-fused[point_id], candidates[point_id][1]))
+        return [candidates[point_id] for point_id in order]
+    
+    def _score_points(self, collection_name: str, point_ids: List[str], query_vector: List[float]) -> Dict[str, float]:
+        """取回指定点的向量，按collection的余弦度量计算与查询向量的分数"""
+        if not point_ids:
+            return {}
+        points = self.qdrant_client.retrieve(
+            collection_name=collection_name,
+            ids=point_ids,
+            with_vectors=True
+        )
+        query_norm = math.sqrt(sum(x * x for x in query_vector)) or 1.0
+        scores = {}
+        for point in points:
+            vector = point.vector
+            norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+            scores[normalize_point_id(point.id)] = sum(q * v for q, v in zip(query_vector, vector)) / (query_norm * norm)
+        return scores
+    
+    def _get_lexical_index(self, collection_name: str) -> BM25Index:
+        """获取collection的BM25索引"""
+        with self._lexical_lock:
+            index = self.lexical_indexes.get(collection_name)
+            if index is None:
+                index = BM25Index(os.path.join(self.config.lexical_index_dir, f"{collection_name}.sqlite"))
+                self.lexical_indexes[collection_name] = index
+            return index
+    
+    def route_knowledge_bases(self, query: str, query_vector: List[float] = None) -> Dict:
+        """
+        按查询向量与知识库画像的相似度选择知识库（不调用LLM）
+        
+        Args:
+            query: 用户查询
+            query_vector: 已经计算好的查询向量，None表示现在向量化（查询向量有缓存，检索时不会重复请求）
             
-            # 提取来源信息
-            sources = []
-            if self.config.include_sources:
-                for doc, score in top_docs:
-                    source_info = {
-                        "content": doc.page_content[:200] + "...",
-                        "score": float(score),
-                        "metadata": doc.metadata,
-                        "knowledge_base": doc.metadata.get("knowledge_base", "未知")
-                    }
-                    sources.append(source_info)
+        Returns:
+            {"knowledge_bases": 选中的知识库（不够确定时为空列表）, "scores": {知识库名称: 相似度}}
+        """
+        if query_vector is None:
+            query_vector = self.embedding_model.embed_query(query)
+        collections = {kb_name: vectorstore.collection_name for kb_name, vectorstore in self.vectorstores.items()}
+        return self.kb_router.route(query_vector, collections)
+    
+    def rebuild_kb_profile(self, knowledge_base: str = None, batch_size: int = 1000) -> int:
+        """
+        从向量库重建知识库画像（用于启用向量路由之前导入、或删除过大量文档的知识库）
+        
+        Args:
+            knowledge_base: 知识库名称，None表示默认知识库
+            batch_size: 每次从向量库读取的点数
             
-            return {
-                "agent": "RAG智能体",
-                "response": response.content,
-                "sources": sources,
-                "confidence": float(all_retrieved_docs[0][1]),
-                "knowledge_bases_used": search_kbs
-            }
+        Returns:
+            int: 参与画像的文本块数
+        """
+        _, vectorstore = self._resolve_vectorstore(knowledge_base)
+        if vectorstore is None:
+            print("❌ 没有可用的知识库")
+            return 0
+        self.kb_router.reset(vectorstore.collection_name)
+        count = 0
+        offset = None
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=vectorstore.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=True
+            )
+            self.kb_router.update(vectorstore.collection_name, [point.vector for point in points])
+            count += len(points)
+            if offset is None:
+                return count
+    
+    def compact_vector_store(self, knowledge_base: str = None) -> int:
+        """
+        压缩local后端的向量库，回收删除和覆盖文档留下的行并重建HNSW索引
+        
+        Args:
+            knowledge_base: 知识库名称，None表示默认知识库
+            
+        Returns:
+            int: 回收的行数（Qdrant后端不需要压缩，返回0）
+        """
+        if self.config.vector_backend != "local":
+            return 0
+        _, vectorstore = self._resolve_vectorstore(knowledge_base)
+        if vectorstore is None:
+            print("❌ 没有可用的知识库")
+            return 0
+        return self.qdrant_client.compact(vectorstore.collection_name)
+    
+    def rebuild_lexical_index(self, knowledge_base: str = None, batch_size: int = 1000) -> int:
+        """
+        从向量库重建BM25索引（用于启用混合检索之前导入的知识库）
+        
+        Args:
+            knowledge_base: 知识库名称，None表示默认知识库
+            batch_size: 每次从Qdrant读取的点数
+            
+        Returns:
+            int: 索引的文档数
+        """
+        _, vectorstore = self._resolve_vectorstore(knowledge_base)
+        if vectorstore is None:
+            print("❌ 没有可用的知识库")
+            return 0
+        index = self._get_lexical_index(vectorstore.collection_name)
+        index.clear()
+        count = 0
+        offset = None
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=vectorstore.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            index.add(
+                [point.id for point in points],
+                [point.payload.get(vectorstore.content_payload_key, "") for point in points],
+                [point.payload.get(vectorstore.metadata_payload_key) or {} for point in points]
+            )
+            count += len(points)
+            if offset is None:
+                return count
+    
+    def _resolve_vectorstore(self, knowledge_base: str = None) -> Tuple[Optional[str], Optional[QdrantVectorStore]]:
+        """
+        确定目标知识库
+        
+        Returns:
+            (知识库名称, vectorstore)，知识库不存在且没有默认知识库时返回 (None, None)
+        """
+        if knowledge_base and knowledge_base in self.vectorstores:
+            return knowledge_base, self.vectorstores[knowledge_base]
+        if self.vectorstore:
+            return "默认知识库", self.vectorstore
+        return None, None
+    
+    def get_collection_name(self, knowledge_base: str = None) -> Optional[str]:
+        """获取知识库对应的collection名称，None表示默认知识库"""
+        _, vectorstore = self._resolve_vectorstore(knowledge_base)
+        return vectorstore.collection_name if vectorstore else None
+    
+    def add_documents(self, texts: List[str], metadatas: List[Dict] = None, 
+                      knowledge_base: str = None, ids: List[str] = None):
+        """
+        添加文档到知识库
+        
+        Args:
+            texts: 文本列表
+            metadatas: 元数据列表
+            knowledge_base: 要添加到的知识库名称，None表示添加到默认知识库
+            ids: 向量点ID列表，None表示随机生成；相同ID的点会被覆盖
+        """
+        try:
+            if knowledge_base in self.vectorstores:
+                print(f"向知识库 '{knowledge_base}' 添加文档...")
             
+            # 先批量向量化，再分批写入Qdrant
+            vectors = self.embedding_batcher.embed(texts)
+            return self.add_embeddings(texts, vectors, metadatas, knowledge_base=knowledge_base, ids=ids)
         except Exception as e:
-            print(f"RAG查询出错: {e}")
+            print(f"添加文档失败: {e}")
             import traceback
             traceback.print_exc()
-            return {
-                "agent": "RAG智能体",
-                "response": f"处理查询时出错: {str(e)}",
-                "sources": [],
-                "confidence": 0.0,
-                "knowledge_bases_used": []
-            }
+            return False
     
-    def add_documents(self, texts: List[str], metadatas: List[Dict] = None, 
-                      knowledge_base: str = None):
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]], metadatas: List[Dict] = None,
+                       knowledge_base: str = None, ids: List[str] = None) -> bool:
         """
-        添加文档到知识库
+        添加已经向量化的文档到知识库
         
         Args:
             texts: 文本列表
+            embeddings: 与文本一一对应的向量
             metadatas: 元数据列表
             knowledge_base: 要添加到的知识库名称，None表示添加到默认知识库
+            ids: 向量点ID列表，None表示随机生成；相同ID的点会被覆盖
         """
         try:
             # 确定目标知识库
-            if knowledge_base and knowledge_base in self.vectorstores:
-                vectorstore = self.vectorstores[knowledge_base]
-                print(f"向知识库 '{knowledge_base}' 添加文档...")
-            elif self.vectorstore:
-                vectorstore = self.vectorstore
-                knowledge_base = "默认知识库"
-            else:
+            knowledge_base, vectorstore = self._resolve_vectorstore(knowledge_base)
+            if vectorstore is None:
                 print("❌ 没有可用的知识库")
                 return False
             
@@ -266,7 +785,14 @@ class MedicalRAG:
             else:
                 metadatas = [{"knowledge_base": knowledge_base} for _ in texts]
             
-            vectorstore.add_texts(texts=texts, metadatas=metadatas)
+            if ids is None:
+                ids = [uuid.uuid4().hex for _ in texts]
+            
+            self._upsert_points(vectorstore, ids, texts, embeddings, metadatas)
+            if self.config.hybrid_search_enabled:
+                self._get_lexical_index(vectorstore.collection_name).add(ids, texts, metadatas)
+            self.kb_router.update(vectorstore.collection_name, embeddings)
+            self._kb_version += 1
             return True
         except Exception as e:
             print(f"添加文档失败: {e}")
@@ -274,6 +800,77 @@ class MedicalRAG:
             traceback.print_exc()
             return False
     
+    def delete_documents(self, ids: List[str], knowledge_base: str = None) -> bool:
+        """
+        按向量点ID从知识库删除文档
+        
+        Args:
+            ids: 向量点ID列表
+            knowledge_base: 知识库名称，None表示默认知识库
+        """
+        if not ids:
+            return True
+        try:
+            _, vectorstore = self._resolve_vectorstore(knowledge_base)
+            if vectorstore is None:
+                print("❌ 没有可用的知识库")
+                return False
+            self.qdrant_client.delete(
+                collection_name=vectorstore.collection_name,
+                points_selector=PointIdsList(points=ids)
+            )
+            if self.config.hybrid_search_enabled:
+                self._get_lexical_index(vectorstore.collection_name).remove(ids)
+            self._kb_version += 1
+            return True
+        except Exception as e:
+            print(f"删除文档失败: {e}")
+            return False
+    
+    def _upsert_points(self, vectorstore: QdrantVectorStore, ids: List[str], texts: List[str],
+                       vectors: List[List[float]], metadatas: List[Dict]):
+        """将预先计算好的向量批量写入Qdrant，payload格式与QdrantVectorStore保持一致"""
+        points = [
+            PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={
+                    vectorstore.content_payload_key: text,
+                    vectorstore.metadata_payload_key: metadata
+                }
+            )
+            for point_id, text, vector, metadata in zip(ids, texts, vectors, metadatas)
+        ]
+        self.bulk_loader.upsert(vectorstore.collection_name, points)
+    
+    @contextmanager
+    def bulk_load(self, knowledge_base: str = None):
+        """
+        批量导入上下文：导入期间暂停知识库的向量索引构建，退出后统一构建
+        
+        Args:
+            knowledge_base: 知识库名称，None表示默认知识库
+        """
+        collection_name = self.get_collection_name(knowledge_base)
+        if not collection_name or not self.config.bulk_load_defer_indexing:
+            yield
+            return
+        with self.bulk_loader.deferred_indexing(collection_name):
+            yield
+    
+    def get_knowledge_base_version(self) -> Tuple[int, int]:
+        """
+        获取知识库内容版本
+        
+        Returns:
+            (本进程内的写入次数, 导入清单目录的修改时间)，其他进程导入数据后清单目录会更新
+        """
+        try:
+            manifest_mtime = os.stat(self.config.ingest_manifest_dir).st_mtime_ns
+        except OSError:
+            manifest_mtime = 0
+        return self._kb_version, manifest_mtime
+    
     def get_all_knowledge_bases(self) -> Dict[str, str]:
         """获取所有知识库的信息"""
         return {
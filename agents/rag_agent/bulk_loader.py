@@ -0,0 +1,85 @@
+"""
+Qdrant批量写入器 - 并行分批写入预先计算好的向量，批量导入期间推迟构建向量索引
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List
+
+from qdrant_client.models import OptimizersConfigDiff, PointStruct
+
+
+class BulkLoader:
+    """Qdrant批量写入器"""
+
+    def __init__(self, client, batch_size: int = 256, parallelism: int = 1,
+                 indexing_threshold: int = 20000):
+        """
+        Args:
+            client: QdrantClient
+            batch_size: 每次upsert请求的点数
+            parallelism: 并行upsert请求数，本地模式的客户端不是线程安全的，应为1
+            indexing_threshold: 批量导入结束后恢复的索引阈值（KB），与collection的正常配置一致
+        """
+        self.client = client
+        self.batch_size = max(1, batch_size)
+        self.parallelism = max(1, parallelism)
+        self.indexing_threshold = indexing_threshold
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.parallelism,
+            thread_name_prefix="qdrant-upsert"
+        ) if self.parallelism > 1 else None
+        # 每个collection的嵌套批量导入计数
+        self._deferred: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, collection_name: str, points: List[PointStruct]):
+        """
+        分批写入点
+
+        前面的批次不等待写入生效（wait=False，服务端写入WAL后即返回），并行发送；
+        全部返回后再同步写入最后一批，Qdrant按WAL顺序应用更新，最后一批生效时之前的批次也已生效
+        """
+        batches = [points[i:i + self.batch_size] for i in range(0, len(points), self.batch_size)]
+        if not batches:
+            return
+
+        def send(batch):
+            self.client.upsert(collection_name=collection_name, points=batch, wait=False)
+
+        if self._executor and len(batches) > 2:
+            list(self._executor.map(send, batches[:-1]))
+        else:
+            for batch in batches[:-1]:
+                send(batch)
+        self.client.upsert(collection_name=collection_name, points=batches[-1], wait=True)
+
+    @contextmanager
+    def deferred_indexing(self, collection_name: str):
+        """
+        批量导入期间关闭collection的向量索引构建，结束后恢复，由优化器一次性构建索引
+
+        恢复时使用配置中的阈值而不是导入前读到的值，即使上次导入异常退出也不会一直停留在关闭状态
+        """
+        with self._lock:
+            depth = self._deferred.get(collection_name, 0)
+            self._deferred[collection_name] = depth + 1
+            if depth == 0:
+                self._set_indexing_threshold(collection_name, 0)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._deferred[collection_name] -= 1
+                if self._deferred[collection_name] == 0:
+                    del self._deferred[collection_name]
+                    self._set_indexing_threshold(collection_name, self.indexing_threshold)
+
+    def _set_indexing_threshold(self, collection_name: str, threshold: int):
+        try:
+            self.client.update_collection(
+                collection_name=collection_name,
+                optimizers_config=OptimizersConfigDiff(indexing_threshold=threshold)
+            )
+        except Exception as e:
+            print(f"⚠️  更新collection索引配置失败 ({collection_name}): {e}")
@@ -0,0 +1,130 @@
+"""
+Embedding批处理器 - 分批、并发、限流地调用向量模型
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from llm_limiter import BACKGROUND, llm_priority
+
+
+class TokenBucket:
+    """令牌桶限流器（线程安全）"""
+    
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate: 每秒补充的令牌数，<=0 表示不限流
+            capacity: 桶容量（允许的突发量），默认与rate相同
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens: float = 1.0):
+        """阻塞直到取得指定数量的令牌"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingBatcher:
+    """Embedding批处理器 - 控制批大小、并发数、请求速率，失败时指数退避重试"""
+    
+    def __init__(self, embedding_model, batch_size: int = 25, max_concurrency: int = 4,
+                 rate_limit: float = 10.0, max_retries: int = 3, retry_backoff: float = 1.0):
+        """
+        Args:
+            embedding_model: LangChain Embeddings对象
+            batch_size: 每次请求的文本数量
+            max_concurrency: 最大并发请求数
+            rate_limit: 每秒最多发起的请求数，<=0 表示不限流
+            max_retries: 单批最大重试次数
+            retry_backoff: 重试退避基数（秒）
+        """
+        self.embedding_model = embedding_model
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._bucket = TokenBucket(rate_limit)
+        
+        # 吞吐统计
+        self._stats_lock = threading.Lock()
+        self.total_items = 0
+        self.total_requests = 0
+        self.total_retries = 0
+        self.total_seconds = 0.0
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量向量化文本，返回顺序与输入一致
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            向量列表
+        """
+        if not texts:
+            return []
+        
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        started_at = time.monotonic()
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches)),
+                                thread_name_prefix="embedding") as executor:
+            results = list(executor.map(self._embed_batch, batches))
+        
+        with self._stats_lock:
+            self.total_items += len(texts)
+            self.total_seconds += time.monotonic() - started_at
+        
+        return [vector for batch_vectors in results for vector in batch_vectors]
+    
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """向量化单个批次，失败时按指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            self._bucket.acquire()
+            with self._stats_lock:
+                self.total_requests += 1
+            try:
+                # 导入的向量化请求在限流队列中排在交互式对话之后
+                with llm_priority(BACKGROUND):
+                    return self.embedding_model.embed_documents(batch)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt) + random.uniform(0, self.retry_backoff)
+                with self._stats_lock:
+                    self.total_retries += 1
+                print(f"⚠️  Embedding请求失败，{delay:.1f}秒后重试 ({attempt + 1}/{self.max_retries}): {e}")
+                time.sleep(delay)
+    
+    @property
+    def throughput(self) -> float:
+        """累计吞吐量（条/秒）"""
+        return self.total_items / self.total_seconds if self.total_seconds > 0 else 0.0
+    
+    def get_stats(self) -> dict:
+        """获取吞吐统计信息"""
+        return {
+            "items": self.total_items,
+            "requests": self.total_requests,
+            "retries": self.total_retries,
+            "seconds": self.total_seconds,
+            "items_per_second": self.throughput
+        }
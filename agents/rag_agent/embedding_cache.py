@@ -0,0 +1,162 @@
+"""
+Embedding缓存 - 基于sqlite的本地向量缓存，避免对相同文本重复调用向量模型
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """
+    持久化的Embedding缓存，超出容量时按最近访问时间（近似LRU）淘汰
+    
+    命中缓存只读数据库，访问时间先记在内存中，积累到一定数量、超过刷新间隔或写入新向量时才批量写回，
+    查询路径上的缓存命中不会每次都触发一次写事务；进程退出时未写回的访问时间会丢失，只影响淘汰顺序
+    """
+    
+    # sqlite单条语句的参数数量上限
+    _MAX_PARAMS = 500
+    # 内存中积累的访问时间达到该数量或超过刷新间隔（秒）时写回数据库
+    _ACCESS_FLUSH_SIZE = 256
+    _ACCESS_FLUSH_INTERVAL = 60.0
+    
+    def __init__(self, path: str, max_items: int = 200000):
+        """
+        Args:
+            path: sqlite数据库文件路径
+            max_items: 最多缓存的向量数量
+        """
+        self.path = path
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # 尚未写回数据库的访问时间 {键: 时间}
+        self._pending_access: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+    
+    @staticmethod
+    def make_key(model: str, text_type: str, text: str) -> str:
+        """缓存键：模型名 + 文本类型（query/document向量不同） + 文本哈希"""
+        return hashlib.sha256(f"{model}\0{text_type}\0{text}".encode('utf-8')).hexdigest()
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """批量读取缓存，返回命中的 {键: 向量}"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), self._MAX_PARAMS):
+                batch = keys[i:i + self._MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+                    self._pending_access[key] = now
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            if (len(self._pending_access) >= self._ACCESS_FLUSH_SIZE
+                    or time.monotonic() - self._last_flush >= self._ACCESS_FLUSH_INTERVAL):
+                self._flush_access()
+                self._conn.commit()
+        return found
+    
+    def _flush_access(self):
+        """把内存中的访问时间写回数据库（调用方持有锁并负责提交）"""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(access_time, key) for key, access_time in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+        self._last_flush = time.monotonic()
+    
+    def put_many(self, items: Dict[str, List[float]]):
+        """批量写入缓存，超出容量时淘汰最久未访问的条目"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            # 与新向量在同一个事务中写回访问时间，淘汰时按最新的访问时间排序
+            self._flush_access()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, array('f', vector).tobytes(), now) for key, vector in items.items()]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_items:
+                # 一次多淘汰10%，避免每次写入都触发淘汰
+                excess = count - int(self.max_items * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)", (excess,)
+                )
+                self.evictions += excess
+            self._conn.commit()
+    
+    def get_stats(self) -> Dict:
+        """获取缓存命中统计"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """带缓存的Embeddings包装器，文档向量和查询向量都会经过缓存"""
+    
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """向量化文档，只对未命中缓存的文本调用底层模型"""
+        keys = [EmbeddingCache.make_key(self.model_name, "document", text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        
+        # 同一批次内的重复文本只请求一次
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(new_items)
+            vectors.update(new_items)
+        
+        return [vectors[key] for key in keys]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """向量化查询"""
+        key = EmbeddingCache.make_key(self.model_name, "query", text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            return cached[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
@@ -0,0 +1,190 @@
+"""
+知识库向量路由 - 导入时为每个知识库维护向量中心和代表样本，查询时按向量相似度选择知识库，不调用LLM
+"""
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class KnowledgeBaseProfile:
+    """单个知识库的向量画像：所有文本块向量的中心 + 蓄水池抽样的代表向量"""
+
+    def __init__(self, sample_size: int = 64, seed: int = 0):
+        """
+        Args:
+            sample_size: 代表向量数量
+            seed: 抽样随机种子
+        """
+        self.sample_size = sample_size
+        self.vector_sum: Optional[np.ndarray] = None
+        self.count = 0
+        self.samples: Optional[np.ndarray] = None
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+    def add(self, vectors: List[List[float]]):
+        """加入一批文本块向量"""
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        if not len(vectors):
+            return
+        if self.vector_sum is None:
+            self.vector_sum = np.zeros(vectors.shape[1], dtype=np.float64)
+            self.samples = np.empty((0, vectors.shape[1]), dtype=np.float32)
+        self.vector_sum += vectors.sum(axis=0)
+        self.count += len(vectors)
+
+        # 蓄水池抽样：每个向量被保留为代表样本的概率相同
+        for vector in vectors:
+            self.seen += 1
+            if len(self.samples) < self.sample_size:
+                self.samples = np.vstack([self.samples, vector])
+            else:
+                slot = self._rng.integers(0, self.seen)
+                if slot < self.sample_size:
+                    self.samples[slot] = vector
+
+    def similarity(self, query: np.ndarray, top_n: int = 3) -> float:
+        """
+        查询与知识库的相似度：取向量中心相似度和最相似的 top_n 个代表样本平均相似度中较大的一个
+
+        Args:
+            query: 归一化后的查询向量
+        """
+        if not self.count:
+            return 0.0
+        centroid = self._normalize(self.vector_sum.astype(np.float32))
+        score = float(centroid @ query)
+        if len(self.samples):
+            sample_scores = np.sort(self.samples @ query)[::-1][:top_n]
+            score = max(score, float(sample_scores.mean()))
+        return score
+
+    def save(self, path: str):
+        """原子写入画像文件"""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, vector_sum=self.vector_sum, count=self.count, samples=self.samples, seen=self.seen)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, sample_size: int = 64) -> "KnowledgeBaseProfile":
+        profile = cls(sample_size)
+        with np.load(path) as data:
+            profile.vector_sum = data["vector_sum"]
+            profile.count = int(data["count"])
+            profile.samples = data["samples"][:sample_size]
+            profile.seen = int(data["seen"])
+        return profile
+
+
+class KnowledgeBaseRouter:
+    """
+    按查询向量与各知识库画像的相似度选择知识库
+
+    画像随导入增量更新（删除文档不会从画像中减去，可用 rebuild-index 重建），
+    知识库数量增加时只多一次向量运算，提示词长度不变；
+    画像文件被其他进程（命令行导入、rebuild-index）更新后，下次使用时重新读取
+    """
+
+    def __init__(self, profile_dir: str, sample_size: int = 64, threshold: float = 0.5, margin: float = 0.05):
+        """
+        Args:
+            profile_dir: 画像文件目录，每个collection一个 .npz 文件
+            sample_size: 每个知识库的代表向量数量
+            threshold: 选中知识库所需的最小相似度，最相似的知识库也达不到时交给LLM决策
+            margin: 与最相似知识库的相似度差在该范围内的知识库一并选中
+        """
+        self.profile_dir = profile_dir
+        self.sample_size = sample_size
+        self.threshold = threshold
+        self.margin = margin
+        self.profiles: Dict[str, KnowledgeBaseProfile] = {}
+        # 读取或保存画像时画像文件的 (修改时间, inode)，文件不存在时为None
+        self._file_stamps: Dict[str, Optional[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, collection_name: str) -> str:
+        return os.path.join(self.profile_dir, f"{collection_name}.npz")
+
+    def _file_stamp(self, collection_name: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(self._path(collection_name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino
+
+    def _get_profile(self, collection_name: str) -> KnowledgeBaseProfile:
+        """获取画像（调用方持有锁），画像文件在其他进程中被更新或删除时重新读取"""
+        stamp = self._file_stamp(collection_name)
+        profile = self.profiles.get(collection_name)
+        if profile is None or stamp != self._file_stamps.get(collection_name):
+            path = self._path(collection_name)
+            profile = KnowledgeBaseProfile(self.sample_size)
+            if stamp is not None:
+                try:
+                    profile = KnowledgeBaseProfile.load(path, self.sample_size)
+                except Exception as e:
+                    print(f"⚠️  知识库画像 {path} 读取失败，将重新累计: {e}")
+            self.profiles[collection_name] = profile
+            self._file_stamps[collection_name] = stamp
+        return profile
+
+    def update(self, collection_name: str, vectors: List[List[float]]):
+        """导入文本块后更新知识库画像并保存"""
+        if not len(vectors):
+            return
+        with self._lock:
+            profile = self._get_profile(collection_name)
+            profile.add(vectors)
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profile.save(self._path(collection_name))
+            self._file_stamps[collection_name] = self._file_stamp(collection_name)
+
+    def reset(self, collection_name: str):
+        """清空知识库画像（重建前调用）"""
+        with self._lock:
+            self.profiles[collection_name] = KnowledgeBaseProfile(self.sample_size)
+            path = self._path(collection_name)
+            if os.path.exists(path):
+                os.remove(path)
+            self._file_stamps[collection_name] = None
+
+    def score(self, query_vector: List[float], collections: Dict[str, str]) -> Dict[str, float]:
+        """
+        Args:
+            query_vector: 查询向量
+            collections: {知识库名称: collection名称}
+
+        Returns:
+            {知识库名称: 相似度}，没有画像的知识库不在结果中
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+        scores = {}
+        with self._lock:
+            for kb_name, collection_name in collections.items():
+                profile = self._get_profile(collection_name)
+                if profile.count:
+                    scores[kb_name] = profile.similarity(query)
+        return scores
+
+    def route(self, query_vector: List[float], collections: Dict[str, str]) -> Dict:
+        """
+        选择知识库
+
+        Returns:
+            {"knowledge_bases": 选中的知识库（不够确定时为空列表）, "scores": {知识库名称: 相似度}}
+        """
+        scores = self.score(query_vector, collections)
+        selected = []
+        if scores:
+            best = max(scores.values())
+            if best >= self.threshold:
+                selected = [kb_name for kb_name, score in sorted(scores.items(), key=lambda item: -item[1])
+                            if score >= self.threshold and score >= best - self.margin]
+        return {"knowledge_bases": selected, "scores": {kb: round(score, 4) for kb, score in scores.items()}}
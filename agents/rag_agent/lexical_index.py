@@ -0,0 +1,213 @@
+"""
+BM25词法索引 - 基于sqlite的本地倒排索引，中文按字符二元组切分，与向量检索结果做倒数排名融合
+"""
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# 英文单词、数字、药品编号等整体作为一个词，如 "h1n1"、"0.5mg"、"icd-10"
+_WORD_PATTERN = re.compile(r'[a-z0-9]+(?:[.\-_/][a-z0-9]+)*')
+_CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词：中文连续片段切分为字符二元组（单字片段保留单字），英文和数字按整词切分
+    """
+    text = text.lower()
+    tokens = _WORD_PATTERN.findall(text)
+    for run in _CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> Dict[str, float]:
+    """
+    倒数排名融合（RRF）
+
+    Args:
+        rankings: 多个按相关性从高到低排列的ID列表
+        k: 平滑常数，越大排名靠后的结果权重越接近靠前的结果
+
+    Returns:
+        {ID: 融合分数}，分数越大越相关
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+class BM25Index:
+    """持久化的BM25倒排索引，每个collection一个sqlite文件"""
+
+    # sqlite单条语句的参数数量上限
+    _MAX_PARAMS = 500
+    # 文档数较少时词频统计不可靠，不跳过高频词
+    _STOPWORD_MIN_DOCS = 100
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75, max_df_ratio: float = 0.5):
+        """
+        Args:
+            path: sqlite数据库文件路径
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+            max_df_ratio: 出现在超过该比例文档中的词视为停用词，检索时跳过
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "point_id TEXT PRIMARY KEY, length INTEGER NOT NULL, content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, point_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, point_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_point ON postings(point_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL)")
+        self._conn.commit()
+
+        # 文档总数和总长度常驻内存，用于计算idf和平均文档长度
+        self._doc_count, self._total_length = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+        ).fetchone()
+
+    def __len__(self):
+        return self._doc_count
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict] = None):
+        """添加或覆盖文档"""
+        if not ids:
+            return
+        ids = [normalize_point_id(point_id) for point_id in ids]
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            self._remove_locked(ids)
+            doc_rows, posting_rows = [], []
+            df_delta = Counter()
+            for point_id, text, metadata in zip(ids, texts, metadatas):
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                doc_rows.append((point_id, length, text, json.dumps(metadata, ensure_ascii=False)))
+                posting_rows.extend((term, point_id, tf) for term, tf in counts.items())
+                df_delta.update(counts.keys())
+                self._doc_count += 1
+                self._total_length += length
+            self._conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", doc_rows)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", posting_rows)
+            self._conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                list(df_delta.items())
+            )
+            self._conn.commit()
+
+    def remove(self, ids: Iterable[str]):
+        """删除文档"""
+        with self._lock:
+            self._remove_locked([normalize_point_id(point_id) for point_id in ids])
+            self._conn.commit()
+
+    def _remove_locked(self, ids: List[str]):
+        for i in range(0, len(ids), self._MAX_PARAMS):
+            batch = ids[i:i + self._MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            removed = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE point_id IN ({placeholders})", batch
+            ).fetchone()
+            if not removed[0]:
+                continue
+            self._doc_count -= removed[0]
+            self._total_length -= removed[1]
+            df_delta = self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE point_id IN ({placeholders}) GROUP BY term", batch
+            ).fetchall()
+            self._conn.executemany("UPDATE terms SET df = df - ? WHERE term = ?",
+                                   [(count, term) for term, count in df_delta])
+            self._conn.execute("DELETE FROM terms WHERE df <= 0")
+            self._conn.execute(f"DELETE FROM postings WHERE point_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM docs WHERE point_id IN ({placeholders})", batch)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, str, Dict, float]]:
+        """
+        BM25检索
+
+        Returns:
+            [(向量点ID, 文本, 元数据, BM25分数)]，按分数从高到低排列
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            doc_count = self._doc_count
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+            scores: Dict[str, float] = {}
+            for term in terms:
+                row = self._conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+                if not row:
+                    continue
+                if doc_count >= self._STOPWORD_MIN_DOCS and row[0] > self.max_df_ratio * doc_count:
+                    continue
+                df = row[0]
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                postings = self._conn.execute(
+                    "SELECT p.point_id, p.tf, d.length FROM postings p JOIN docs d ON d.point_id = p.point_id "
+                    "WHERE p.term = ?", (term,)
+                )
+                for point_id, tf, length in postings:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[point_id] = scores.get(point_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            if not top:
+                return []
+            placeholders = ",".join("?" * len(top))
+            rows = {
+                point_id: (content, json.loads(metadata))
+                for point_id, content, metadata in self._conn.execute(
+                    f"SELECT point_id, content, metadata FROM docs WHERE point_id IN ({placeholders})",
+                    [point_id for point_id, _ in top]
+                )
+            }
+        return [(point_id, rows[point_id][0], rows[point_id][1], score) for point_id, score in top]
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            for table in ("docs", "postings", "terms"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.commit()
+            self._doc_count, self._total_length = 0, 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def normalize_point_id(point_id) -> str:
+    """向量点ID统一为Qdrant返回的格式（UUID带连字符的字符串）"""
+    try:
+        return str(uuid.UUID(str(point_id)))
+    except ValueError:
+        return str(point_id)
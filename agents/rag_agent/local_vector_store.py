@@ -0,0 +1,661 @@
+"""
+进程内向量库 - 用内存映射的float32矩阵存储向量，小知识库向量化暴力检索，大知识库使用HNSW图索引
+
+LocalVectorClient 实现了 MedicalRAG 用到的 QdrantClient 接口子集，
+LocalVectorStore 实现了 QdrantVectorStore 的检索接口，可以直接替换本地模式的Qdrant
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .lexical_index import normalize_point_id
+
+try:
+    import hnswlib
+except ImportError:  # 可选依赖，未安装时只能使用暴力检索
+    hnswlib = None
+
+
+def _check_index_config(index_type: str, quantization: str):
+    """HNSW在内存中保存一份float32向量，与int8量化同时使用时量化不再节省内存"""
+    if quantization == "int8" and index_type == "hnsw":
+        raise ValueError("int8量化不能与HNSW索引同时使用（HNSW会常驻一份float32向量），"
+                         "请设置 LOCAL_INDEX_TYPE=flat 或 auto")
+
+
+class LocalCollection:
+    """
+    单个collection：vectors.f32 为按行存储的归一化向量矩阵（内存映射），points.sqlite 记录点ID、行号和payload
+
+    删除或覆盖的点只做标记，行号不复用；已删除的行达到 compact_threshold 比例时压缩：
+    未删除的行按原顺序写入新一代向量文件（vectors.f32.<代数>），行号映射和代数在同一个sqlite事务中提交，
+    再重建HNSW索引；HNSW索引保存在 hnsw.bin，启动时补齐上次保存后新增的行
+
+    int8量化模式下另存一份 vectors.i8，暴力检索先在int8矩阵上粗排，
+    再用普通文件读取候选行的float32向量精排（不经过内存映射，缺页时不会把相邻页一起映射进来），
+    常驻内存的向量数据约为原来的1/4；
+    此时auto模式不构建HNSW（hnswlib会在内存中复制一份float32向量）
+    """
+
+    _INITIAL_CAPACITY = 1024
+    # 粗排时每次转换为float32计算的行数
+    _COARSE_BLOCK_ROWS = 65536
+    # sqlite单条语句的参数数量上限
+    _MAX_PARAMS = 500
+    # 已删除的行少于该数量时不自动压缩
+    _COMPACT_MIN_ROWS = 1024
+    # 压缩时每次复制的行数
+    _COPY_BLOCK_ROWS = 8192
+
+    def __init__(self, path: str, dim: int, index_type: str = "auto", hnsw_min_points: int = 50000,
+                 hnsw_m: int = 16, hnsw_ef_construction: int = 200, hnsw_ef: int = 64,
+                 quantization: str = "none", oversampling: float = 3.0, compact_threshold: float = 0.3):
+        """
+        Args:
+            path: collection目录
+            dim: 向量维度
+            index_type: flat（暴力检索）、hnsw 或 auto（未开启int8量化时，点数达到 hnsw_min_points 后自动构建HNSW）
+            hnsw_min_points: auto模式下构建HNSW的最少点数
+            hnsw_m: HNSW每个节点的连接数
+            hnsw_ef_construction: HNSW构建时的候选集大小
+            hnsw_ef: HNSW检索时的候选集大小
+            quantization: none 或 int8（暴力检索时先在int8向量上粗排），不能与 index_type=hnsw 同时使用
+            oversampling: int8粗排的候选数为 k 的多少倍，候选再用原始向量精排
+            compact_threshold: 已删除的行占总行数的比例达到该值时自动压缩，<=0 表示只手动压缩
+        """
+        _check_index_config(index_type, quantization)
+        self.path = path
+        self.dim = dim
+        self.index_type = index_type
+        self.hnsw_min_points = hnsw_min_points
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef = hnsw_ef
+        self.quantized = quantization == "int8"
+        self.oversampling = max(1.0, oversampling)
+        self.compact_threshold = compact_threshold
+        # 批量导入期间暂停向HNSW添加新行，结束后一次性补齐
+        self.defer_indexing = False
+        self._lock = threading.RLock()
+
+        os.makedirs(path, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(path, "points.sqlite"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS points (point_id TEXT PRIMARY KEY, row INTEGER NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        # 内存中的行号映射：row_ids[行号] 为点ID，已删除的行为None
+        row_count = int(self._get_meta("row_count", "0"))
+        self.row_ids: List[Optional[str]] = [None] * row_count
+        self.id_to_row: Dict[str, int] = {}
+        for point_id, row in self._conn.execute("SELECT point_id, row FROM points"):
+            self.row_ids[row] = point_id
+            self.id_to_row[point_id] = row
+        self.alive = np.zeros(max(row_count, self._INITIAL_CAPACITY), dtype=bool)
+        for row in self.id_to_row.values():
+            self.alive[row] = True
+
+        self.generation = int(self._get_meta("generation", "0"))
+        self._vectors_path, self._quantized_path = self._data_paths(self.generation)
+        if self.generation:
+            # 上次压缩提交后没来得及删除的旧文件
+            self._remove_files(self._data_paths(self.generation - 1))
+        self.int8_scale = float(self._get_meta("int8_scale", "0")) or None
+        self._open_matrix(max(row_count, self._INITIAL_CAPACITY))
+        self._vectors_file = None
+        if self.quantized:
+            self._quantize_pending_rows()
+            self._vectors_file = open(self._vectors_path, 'rb', buffering=0)
+
+        self.hnsw = None
+        self._hnsw_rows = 0  # 已加入HNSW的行数
+        self._load_hnsw()
+
+    def _get_meta(self, key: str, default: str) -> str:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def row_count(self) -> int:
+        return len(self.row_ids)
+
+    def __len__(self):
+        return len(self.id_to_row)
+
+    def _open_memmap(self, path: str, dtype, capacity: int) -> np.memmap:
+        """按容量打开（必要时扩大）向量文件的内存映射"""
+        size = capacity * self.dim * np.dtype(dtype).itemsize
+        mode = "r+" if os.path.exists(path) else "w+"
+        if mode == "r+" and os.path.getsize(path) < size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode=mode, shape=(capacity, self.dim))
+
+    def _data_paths(self, generation: int) -> Tuple[str, str]:
+        """第 generation 代的float32和int8向量文件路径（第0代为 vectors.f32 / vectors.i8）"""
+        suffix = f".{generation}" if generation else ""
+        return os.path.join(self.path, f"vectors.f32{suffix}"), os.path.join(self.path, f"vectors.i8{suffix}")
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                # 不存在，或其他进程仍在映射（Windows）
+                pass
+
+    def _open_matrix(self, capacity: int):
+        self.capacity = capacity
+        self.matrix = self._open_memmap(self._vectors_path, np.float32, capacity)
+        self.qmatrix = self._open_memmap(self._quantized_path, np.int8, capacity) if self.quantized else None
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < rows:
+            capacity *= 2
+        self.matrix.flush()
+        if self.qmatrix is not None:
+            self.qmatrix.flush()
+        del self.matrix, self.qmatrix
+        self._open_matrix(capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive
+        self.alive = alive
+        if self.hnsw is not None:
+            self.hnsw.resize_index(capacity)
+
+    # ---------- HNSW ----------
+
+    def _wants_hnsw(self) -> bool:
+        if hnswlib is None or self.index_type == "flat" or self.quantized:
+            return False
+        return self.index_type == "hnsw" or len(self) >= self.hnsw_min_points
+
+    def _hnsw_path(self) -> str:
+        return os.path.join(self.path, "hnsw.bin")
+
+    def _load_hnsw(self):
+        if not self._wants_hnsw():
+            return
+        self.hnsw = hnswlib.Index(space="ip", dim=self.dim)
+        saved_rows = int(self._get_meta("hnsw_rows", "0"))
+        if saved_rows and os.path.exists(self._hnsw_path()):
+            self.hnsw.load_index(self._hnsw_path(), max_elements=self.capacity)
+            self._hnsw_rows = saved_rows
+            # 保存之后删除的行
+            for row in range(saved_rows):
+                if not self.alive[row]:
+                    try:
+                        self.hnsw.mark_deleted(row)
+                    except RuntimeError:
+                        pass
+        else:
+            self.hnsw.init_index(max_elements=self.capacity, M=self.hnsw_m, ef_construction=self.hnsw_ef_construction)
+            self._hnsw_rows = 0
+        self.hnsw.set_ef(self.hnsw_ef)
+        self._index_pending_rows()
+
+    def _index_pending_rows(self):
+        """把尚未加入HNSW的行加入索引"""
+        if self.hnsw is None or self._hnsw_rows >= self.row_count:
+            return
+        rows = np.arange(self._hnsw_rows, self.row_count)
+        self.hnsw.add_items(np.asarray(self.matrix[self._hnsw_rows:self.row_count]), rows)
+        for row in rows[~self.alive[rows]]:
+            self.hnsw.mark_deleted(int(row))
+        self._hnsw_rows = self.row_count
+
+    def build_index(self):
+        """按当前配置构建或补齐HNSW索引并保存（需要时先压缩）"""
+        with self._lock:
+            self._maybe_compact()
+            if self.hnsw is None:
+                self._load_hnsw()
+            else:
+                self._index_pending_rows()
+            self.save_index()
+
+    def save_index(self):
+        """保存HNSW索引"""
+        with self._lock:
+            if self.hnsw is None:
+                return
+            self.hnsw.save_index(self._hnsw_path())
+            self._set_meta("hnsw_rows", self._hnsw_rows)
+            self._conn.commit()
+
+    # ---------- int8量化 ----------
+
+    def _quantize(self, matrix: np.ndarray) -> np.ndarray:
+        """对称int8量化，缩放系数由第一批向量的分布确定并持久化"""
+        if self.int8_scale is None:
+            self.int8_scale = max(float(np.quantile(np.abs(matrix), 0.999)), 1e-6) / 127
+            self._set_meta("int8_scale", self.int8_scale)
+        return np.clip(np.rint(matrix / self.int8_scale), -127, 127).astype(np.int8)
+
+    def _quantize_pending_rows(self):
+        """量化尚未量化的行（新开启量化或上次写入中断时）"""
+        quantized_rows = int(self._get_meta("quantized_rows", "0"))
+        for start in range(quantized_rows, self.row_count, self._COARSE_BLOCK_ROWS):
+            end = min(start + self._COARSE_BLOCK_ROWS, self.row_count)
+            self.qmatrix[start:end] = self._quantize(np.asarray(self.matrix[start:end]))
+        if quantized_rows < self.row_count:
+            self.qmatrix.flush()
+            self._set_meta("quantized_rows", self.row_count)
+            self._conn.commit()
+
+    def _read_rows(self, rows: np.ndarray) -> np.ndarray:
+        """从文件读取指定行的float32向量（调用方持有锁）"""
+        row_bytes = self.dim * 4
+        vectors = np.empty((len(rows), self.dim), dtype=np.float32)
+        for i, row in enumerate(rows):
+            self._vectors_file.seek(int(row) * row_bytes)
+            self._vectors_file.readinto(memoryview(vectors[i]).cast("B"))
+        return vectors
+
+    def _coarse_scores(self, query: np.ndarray) -> np.ndarray:
+        """在int8矩阵上分块计算近似内积（缩放系数对排序没有影响，省略）"""
+        scores = np.empty(self.row_count, dtype=np.float32)
+        for start in range(0, self.row_count, self._COARSE_BLOCK_ROWS):
+            end = min(start + self._COARSE_BLOCK_ROWS, self.row_count)
+            scores[start:end] = self.qmatrix[start:end].astype(np.float32) @ query
+        return scores
+
+    # ---------- 压缩 ----------
+
+    def _maybe_compact(self):
+        """已删除的行达到阈值时自动压缩（批量导入期间推迟到导入结束）"""
+        dead = self.row_count - len(self)
+        if (self.compact_threshold > 0 and not self.defer_indexing and dead >= self._COMPACT_MIN_ROWS
+                and dead >= self.row_count * self.compact_threshold):
+            print(f"🧹 {os.path.basename(self.path)} 有 {dead}/{self.row_count} 行已删除，开始压缩")
+            self.compact()
+
+    def compact(self) -> int:
+        """
+        压缩：未删除的行按原顺序写入新一代向量文件，回收已删除的行，并按当前配置重建HNSW索引
+
+        提交sqlite事务之前中断时仍使用旧文件，下次压缩时覆盖未完成的新文件
+
+        Returns:
+            int: 回收的行数
+        """
+        with self._lock:
+            dead = self.row_count - len(self)
+            if dead == 0:
+                return 0
+            live_rows = np.flatnonzero(self.alive[:self.row_count])
+            capacity = max(len(live_rows), self._INITIAL_CAPACITY)
+            generation = self.generation + 1
+            new_paths = self._data_paths(generation)
+            self._remove_files(new_paths)
+            matrix = self._open_memmap(new_paths[0], np.float32, capacity)
+            qmatrix = self._open_memmap(new_paths[1], np.int8, capacity) if self.quantized else None
+            for start in range(0, len(live_rows), self._COPY_BLOCK_ROWS):
+                rows = live_rows[start:start + self._COPY_BLOCK_ROWS]
+                matrix[start:start + len(rows)] = self.matrix[rows]
+                if qmatrix is not None:
+                    qmatrix[start:start + len(rows)] = self.qmatrix[rows]
+            matrix.flush()
+            if qmatrix is not None:
+                qmatrix.flush()
+            del matrix, qmatrix
+
+            row_ids = [self.row_ids[row] for row in live_rows]
+            self._conn.executemany(
+                "UPDATE points SET row = ? WHERE point_id = ?", [(row, point_id) for row, point_id in enumerate(row_ids)]
+            )
+            self._set_meta("generation", generation)
+            self._set_meta("row_count", len(row_ids))
+            self._set_meta("quantized_rows", len(row_ids) if self.quantized else 0)
+            self._set_meta("hnsw_rows", 0)
+            self._conn.commit()
+
+            old_paths = (self._vectors_path, self._quantized_path, self._hnsw_path())
+            del self.matrix, self.qmatrix
+            if self._vectors_file is not None:
+                self._vectors_file.close()
+            self.generation = generation
+            self._vectors_path, self._quantized_path = new_paths
+            self._open_matrix(capacity)
+            if self.quantized:
+                self._vectors_file = open(self._vectors_path, 'rb', buffering=0)
+            self.row_ids = row_ids
+            self.id_to_row = {point_id: row for row, point_id in enumerate(row_ids)}
+            self.alive = np.zeros(capacity, dtype=bool)
+            self.alive[:len(row_ids)] = True
+            self.hnsw = None
+            self._hnsw_rows = 0
+            self._remove_files(old_paths)
+            if not self.defer_indexing:
+                self._load_hnsw()
+                self.save_index()
+            return dead
+
+    # ---------- 读写 ----------
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict]):
+        """写入点，已存在的点会被覆盖"""
+        ids = [normalize_point_id(point_id) for point_id in ids]
+        if len(set(ids)) != len(ids):
+            # 同一批次内重复的ID只保留最后一个
+            last = {point_id: i for i, point_id in enumerate(ids)}
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            vectors = [vectors[i] for i in keep]
+            payloads = [payloads[i] for i in keep]
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        # 余弦相似度 = 归一化向量的内积
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1.0)
+        with self._lock:
+            self._delete_rows([point_id for point_id in ids if point_id in self.id_to_row])
+            start = self.row_count
+            self._ensure_capacity(start + len(ids))
+            self.matrix[start:start + len(ids)] = matrix
+            self.matrix.flush()
+            if self.quantized:
+                self.qmatrix[start:start + len(ids)] = self._quantize(matrix)
+                self.qmatrix.flush()
+            self.alive[start:start + len(ids)] = True
+            for offset, point_id in enumerate(ids):
+                self.row_ids.append(point_id)
+                self.id_to_row[point_id] = start + offset
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO points (point_id, row, payload) VALUES (?, ?, ?)",
+                [(point_id, start + offset, json.dumps(payload or {}, ensure_ascii=False))
+                 for offset, (point_id, payload) in enumerate(zip(ids, payloads))]
+            )
+            self._set_meta("row_count", self.row_count)
+            if self.quantized:
+                self._set_meta("quantized_rows", self.row_count)
+            self._conn.commit()
+
+            self._maybe_compact()
+            if self.hnsw is None and self._wants_hnsw() and not self.defer_indexing:
+                print(f"🔧 {os.path.basename(self.path)} 达到 {len(self)} 个点，开始构建HNSW索引")
+                self.build_index()
+            elif self.hnsw is not None and not self.defer_indexing:
+                self._index_pending_rows()
+
+    def _delete_rows(self, ids: List[str]):
+        for point_id in ids:
+            row = self.id_to_row.pop(point_id, None)
+            if row is None:
+                continue
+            self.alive[row] = False
+            self.row_ids[row] = None
+            if self.hnsw is not None and row < self._hnsw_rows:
+                self.hnsw.mark_deleted(row)
+
+    def delete(self, ids: List[str]):
+        """删除点"""
+        ids = [normalize_point_id(point_id) for point_id in ids]
+        with self._lock:
+            self._delete_rows(ids)
+            for i in range(0, len(ids), self._MAX_PARAMS):
+                batch = ids[i:i + self._MAX_PARAMS]
+                self._conn.execute(f"DELETE FROM points WHERE point_id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+            self._maybe_compact()
+
+    def search(self, query_vector: List[float], k: int) -> List[Tuple[str, float]]:
+        """
+        检索最相似的点
+
+        Returns:
+            [(点ID, 余弦相似度)]，按相似度从高到低排列
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        with self._lock:
+            if not self.id_to_row:
+                return []
+            k = min(k, len(self))
+            if self.hnsw is not None and self._hnsw_rows == self.row_count:
+                self.hnsw.set_ef(max(self.hnsw_ef, k))
+                labels, distances = self.hnsw.knn_query(query, k=k)
+                # ip空间的距离为 1 - 内积
+                return [(self.row_ids[row], float(1 - distance)) for row, distance in zip(labels[0], distances[0])]
+
+            if self.quantized:
+                # int8粗排取 k×oversampling 个候选，再只读取候选行的原始向量精排
+                scores = self._coarse_scores(query)
+                scores[~self.alive[:self.row_count]] = -np.inf
+                n_candidates = min(len(self), max(k, int(k * self.oversampling)))
+                candidates = np.sort(np.argpartition(-scores, n_candidates - 1)[:n_candidates])
+                exact = self._read_rows(candidates) @ query
+                order = np.argsort(-exact)[:k]
+                return [(self.row_ids[candidates[i]], float(exact[i])) for i in order]
+
+            scores = self.matrix[:self.row_count] @ query
+            scores[~self.alive[:self.row_count]] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.row_ids[row], float(scores[row])) for row in top]
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, List[float]]:
+        """获取点的（归一化）向量"""
+        with self._lock:
+            return {
+                point_id: self.matrix[self.id_to_row[point_id]].tolist()
+                for point_id in map(normalize_point_id, ids) if point_id in self.id_to_row
+            }
+
+    def get_payloads(self, ids: List[str]) -> Dict[str, Dict]:
+        """获取点的payload"""
+        ids = [normalize_point_id(point_id) for point_id in ids]
+        payloads = {}
+        with self._lock:
+            for i in range(0, len(ids), self._MAX_PARAMS):
+                batch = ids[i:i + self._MAX_PARAMS]
+                for point_id, payload in self._conn.execute(
+                    f"SELECT point_id, payload FROM points WHERE point_id IN ({','.join('?' * len(batch))})", batch
+                ):
+                    payloads[point_id] = json.loads(payload)
+        return payloads
+
+    def scroll(self, limit: int, offset: int = 0) -> Tuple[List[str], Optional[int]]:
+        """按行号顺序分页列出点ID"""
+        with self._lock:
+            ids, row = [], offset or 0
+            while row < self.row_count and len(ids) < limit:
+                if self.row_ids[row] is not None:
+                    ids.append(self.row_ids[row])
+                row += 1
+            return ids, row if row < self.row_count else None
+
+    def close(self):
+        with self._lock:
+            self.save_index()
+            self.matrix.flush()
+            if self.qmatrix is not None:
+                self.qmatrix.flush()
+            if self._vectors_file is not None:
+                self._vectors_file.close()
+            self._conn.close()
+
+
+class LocalVectorClient:
+    """进程内向量库客户端，提供 MedicalRAG 使用的 QdrantClient 接口子集"""
+
+    def __init__(self, path: str, index_type: str = "auto", hnsw_min_points: int = 50000,
+                 quantization: str = "none", oversampling: float = 3.0, compact_threshold: float = 0.3):
+        """
+        Args:
+            path: 数据目录，每个collection一个子目录
+            index_type: flat、hnsw 或 auto
+            hnsw_min_points: auto模式下构建HNSW的最少点数
+            quantization: none 或 int8（不能与 index_type=hnsw 同时使用）
+            oversampling: int8粗排的候选倍数
+            compact_threshold: 已删除的行达到该比例时自动压缩，<=0 表示只手动压缩
+        """
+        _check_index_config(index_type, quantization)
+        self.path = path
+        self.index_type = index_type
+        self.hnsw_min_points = hnsw_min_points
+        self.quantization = quantization
+        self.oversampling = oversampling
+        self.compact_threshold = compact_threshold
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        if index_type != "flat" and quantization != "int8" and hnswlib is None:
+            print("⚠️  未安装hnswlib，本地向量库只使用暴力检索（pip install hnswlib）")
+
+    def _collection_dir(self, collection_name: str) -> str:
+        return os.path.join(self.path, collection_name)
+
+    def _get(self, collection_name: str) -> LocalCollection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                config_path = os.path.join(self._collection_dir(collection_name), "config.json")
+                if not os.path.exists(config_path):
+                    raise ValueError(f"Collection {collection_name} not found")
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    dim = json.load(f)["size"]
+                collection = LocalCollection(
+                    self._collection_dir(collection_name), dim,
+                    index_type=self.index_type, hnsw_min_points=self.hnsw_min_points,
+                    quantization=self.quantization, oversampling=self.oversampling,
+                    compact_threshold=self.compact_threshold
+                )
+                self._collections[collection_name] = collection
+            return collection
+
+    def get_collections(self):
+        names = sorted(
+            name for name in os.listdir(self.path)
+            if os.path.exists(os.path.join(self._collection_dir(name), "config.json"))
+        )
+        return SimpleNamespace(collections=[SimpleNamespace(name=name) for name in names])
+
+    def create_collection(self, collection_name: str, vectors_config, **kwargs) -> bool:
+        os.makedirs(self._collection_dir(collection_name), exist_ok=True)
+        with open(os.path.join(self._collection_dir(collection_name), "config.json"), 'w', encoding='utf-8') as f:
+            json.dump({"size": vectors_config.size, "distance": "Cosine"}, f)
+        return True
+
+    def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+        if collection:
+            collection.close()
+        shutil.rmtree(self._collection_dir(collection_name), ignore_errors=True)
+        return True
+
+    def get_collection(self, collection_name: str):
+        collection = self._get(collection_name)
+        return SimpleNamespace(
+            vectors_count=len(collection),
+            points_count=len(collection),
+            indexed_vectors_count=collection._hnsw_rows if collection.hnsw is not None else 0,
+            status="green"
+        )
+
+    def update_collection(self, collection_name: str, optimizers_config=None, **kwargs) -> bool:
+        """indexing_threshold 为0时暂停向HNSW添加新点，恢复后一次性补齐（对应Qdrant的推迟索引构建）"""
+        threshold = getattr(optimizers_config, "indexing_threshold", None)
+        if threshold is None:
+            return True
+        collection = self._get(collection_name)
+        collection.defer_indexing = threshold == 0
+        if not collection.defer_indexing:
+            collection.build_index()
+        return True
+
+    def compact(self, collection_name: str) -> int:
+        """压缩collection，返回回收的行数"""
+        return self._get(collection_name).compact()
+
+    def upsert(self, collection_name: str, points, wait: bool = True, **kwargs):
+        self._get(collection_name).upsert(
+            [point.id for point in points],
+            [point.vector for point in points],
+            [point.payload for point in points]
+        )
+        return SimpleNamespace(status="completed")
+
+    def delete(self, collection_name: str, points_selector, wait: bool = True, **kwargs):
+        self._get(collection_name).delete(list(points_selector.points))
+        return SimpleNamespace(status="completed")
+
+    def _records(self, collection: LocalCollection, ids: List[str], with_payload: bool, with_vectors: bool):
+        payloads = collection.get_payloads(ids) if with_payload else {}
+        vectors = collection.get_vectors(ids) if with_vectors else {}
+        return [
+            SimpleNamespace(id=point_id, payload=payloads.get(point_id), vector=vectors.get(point_id))
+            for point_id in map(normalize_point_id, ids) if point_id in collection.id_to_row
+        ]
+
+    def retrieve(self, collection_name: str, ids: List[str], with_payload: bool = True,
+                 with_vectors: bool = False, **kwargs):
+        return self._records(self._get(collection_name), ids, with_payload, with_vectors)
+
+    def scroll(self, collection_name: str, limit: int = 10, offset: int = None, with_payload: bool = True,
+               with_vectors: bool = False, **kwargs):
+        collection = self._get(collection_name)
+        ids, next_offset = collection.scroll(limit, offset)
+        return self._records(collection, ids, with_payload, with_vectors), next_offset
+
+    def search(self, collection_name: str, query_vector: List[float], limit: int = 10,
+               with_payload: bool = True, **kwargs):
+        collection = self._get(collection_name)
+        hits = collection.search(query_vector, limit)
+        payloads = collection.get_payloads([point_id for point_id, _ in hits]) if with_payload else {}
+        return [
+            SimpleNamespace(id=point_id, score=score, payload=payloads.get(point_id))
+            for point_id, score in hits
+        ]
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
+
+
+class LocalVectorStore:
+    """提供 QdrantVectorStore 检索接口的进程内向量库"""
+
+    content_payload_key = "page_content"
+    metadata_payload_key = "metadata"
+
+    def __init__(self, client: LocalVectorClient, collection_name: str, embedding=None):
+        self.client = client
+        self.collection_name = collection_name
+        self.embeddings = embedding
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs):
+        """按向量检索，返回 (文档, 余弦相似度) 列表"""
+        results = []
+        for point in self.client.search(self.collection_name, embedding, limit=k):
+            payload = point.payload or {}
+            metadata = dict(payload.get(self.metadata_payload_key) or {})
+            metadata["_id"] = point.id
+            metadata["_collection_name"] = self.collection_name
+            results.append((Document(page_content=payload.get(self.content_payload_key, ""), metadata=metadata),
+                            point.score))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k=k)
@@ -0,0 +1,29 @@
+"""
+加锁的向量库客户端 - 本地模式的QdrantClient不是线程安全的，所有调用串行执行
+"""
+import functools
+import threading
+
+
+class LockedClient:
+    """
+    包装QdrantClient，每次方法调用都持有同一把锁
+
+    本地模式（QdrantClient(path=...)）下检索线程池、推测检索、文件夹监听的导入线程共用一个客户端，
+    需要串行访问；云端模式的客户端可以并发使用，不需要包装
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
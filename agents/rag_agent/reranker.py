@@ -0,0 +1,144 @@
+"""
+重排序 - 在多知识库合并后的候选文档上做CPU重排序，只把少量更相关的文本块交给LLM
+"""
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from .lexical_index import tokenize
+
+
+class RerankBudgetExceeded(Exception):
+    """重排序超出时间预算"""
+
+
+def _check_deadline(deadline: Optional[float]):
+    if deadline is not None and time.monotonic() > deadline:
+        raise RerankBudgetExceeded()
+
+
+class Reranker:
+    """重排序器基类，保持检索顺序直接截断"""
+
+    name = "none"
+
+    def rerank(self, query: str, candidates: List[Tuple], top_k: int,
+               deadline: Optional[float] = None) -> List[Tuple]:
+        """
+        Args:
+            query: 用户查询
+            candidates: 按检索顺序排列的 (文档, 分数) 列表
+            top_k: 保留数量
+            deadline: time.monotonic() 截止时间，超出时抛出 RerankBudgetExceeded
+
+        Returns:
+            重排序后的 (文档, 分数) 列表，分数仍为检索分数
+        """
+        return candidates[:top_k]
+
+
+class LexicalReranker(Reranker):
+    """按查询词覆盖率和检索排名加权打分"""
+
+    name = "lexical"
+
+    def __init__(self, coverage_weight: float = 0.6):
+        """
+        Args:
+            coverage_weight: 查询词覆盖率的权重，其余权重给检索排名
+        """
+        self.coverage_weight = coverage_weight
+
+    def score(self, query: str, candidates: List[Tuple], deadline: Optional[float] = None) -> List[float]:
+        """计算每个候选文档的相关性分数（0-1，越大越相关）"""
+        query_tokens = set(tokenize(query))
+        total = len(candidates)
+        scores = []
+        for rank, (doc, _) in enumerate(candidates):
+            _check_deadline(deadline)
+            prior = (total - rank) / total
+            if query_tokens:
+                coverage = len(query_tokens & set(tokenize(doc.page_content))) / len(query_tokens)
+            else:
+                coverage = prior
+            scores.append(self.coverage_weight * coverage + (1 - self.coverage_weight) * prior)
+        return scores
+
+    def rerank(self, query: str, candidates: List[Tuple], top_k: int,
+               deadline: Optional[float] = None) -> List[Tuple]:
+        scores = self.score(query, candidates, deadline)
+        order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+        return [candidates[i] for i in order[:top_k]]
+
+
+class MMRReranker(LexicalReranker):
+    """最大边际相关性（MMR）：在相关性之外惩罚与已选文档内容重复的候选，提高上下文多样性"""
+
+    name = "mmr"
+
+    def __init__(self, coverage_weight: float = 0.6, diversity: float = 0.3):
+        """
+        Args:
+            coverage_weight: 查询词覆盖率的权重
+            diversity: 多样性权重，0表示只看相关性
+        """
+        super().__init__(coverage_weight)
+        self.diversity = diversity
+
+    @staticmethod
+    def _similarity(a: Set[str], b: Set[str]) -> float:
+        return len(a & b) / len(a | b) if a and b else 0.0
+
+    def rerank(self, query: str, candidates: List[Tuple], top_k: int,
+               deadline: Optional[float] = None) -> List[Tuple]:
+        relevance = self.score(query, candidates, deadline)
+        token_sets = [set(tokenize(doc.page_content)) for doc, _ in candidates]
+        selected: List[int] = []
+        remaining = list(range(len(candidates)))
+        while remaining and len(selected) < top_k:
+            _check_deadline(deadline)
+            best = max(
+                remaining,
+                key=lambda i: (1 - self.diversity) * relevance[i] - self.diversity * max(
+                    (self._similarity(token_sets[i], token_sets[j]) for j in selected), default=0.0
+                )
+            )
+            selected.append(best)
+            remaining.remove(best)
+        return [candidates[i] for i in selected]
+
+
+# 可用的重排序器，可通过 register_reranker 注册其他实现（如本地ONNX交叉编码器）
+RERANKERS: Dict[str, type] = {
+    Reranker.name: Reranker,
+    LexicalReranker.name: LexicalReranker,
+    MMRReranker.name: MMRReranker,
+}
+
+
+def register_reranker(reranker_class: type):
+    """注册重排序器，按类的 name 属性选择"""
+    RERANKERS[reranker_class.name] = reranker_class
+
+
+def create_reranker(name: str) -> Reranker:
+    """按名称创建重排序器，未知名称时不重排序"""
+    reranker_class = RERANKERS.get(name)
+    if reranker_class is None:
+        print(f"⚠️  未知的重排序器 '{name}'，将按检索顺序截断")
+        reranker_class = Reranker
+    return reranker_class()
+
+
+def rerank_with_budget(reranker: Reranker, query: str, candidates: List[Tuple], top_k: int,
+                       budget_ms: float) -> Tuple[List[Tuple], bool]:
+    """
+    在时间预算内重排序，超时则退回检索顺序
+
+    Returns:
+        (重排序结果, 是否超时)
+    """
+    deadline = time.monotonic() + budget_ms / 1000 if budget_ms > 0 else None
+    try:
+        return reranker.rerank(query, candidates, top_k, deadline), False
+    except RerankBudgetExceeded:
+        return candidates[:top_k], True
@@ -1,10 +1,12 @@
 """
 网络搜索智能体 - 搜索最新医学研究信息
 """
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Tuple
 from langchain_core.prompts import PromptTemplate
 from duckduckgo_search import DDGS
 from config import WebSearchConfig
+from llm_limiter import ProviderOverloadedError
+from ..executor import run_blocking
 import re
 
 class WebSearchAgent:
@@ -42,6 +44,76 @@ class WebSearchAgent:
 
 你的回答:"""
     
+    def _search_web(self, query: str) -> List[Dict]:
+        """使用DuckDuckGo搜索（同步网络请求）"""
+        with DDGS() as ddgs:
+            return list(ddgs.text(
+                query,
+                max_results=self.config.max_results
+            ))
+    
+    def _build_prompt(self, query: str, search_results: List[Dict],
+                      conversation_history: List[Dict] = None) -> Tuple[str, List[Dict]]:
+        """
+        格式化搜索结果和对话历史
+        
+        Returns:
+            (提示词, 来源列表)
+        """
+        formatted_results = ""
+        sources = []
+        for idx, result in enumerate(search_results, 1):
+            title = result.get('title', '无标题')
+            body = result.get('body', '无内容')
+            link = result.get('href', '')
+            
+            formatted_results += f"\n[结果{idx}]\n标题: {title}\n内容: {body}\n链接: {link}\n"
+            
+            sources.append({
+                "title": title,
+                "snippet": body[:200] + "...",
+                "url": link
+            })
+        
+        history_text = ""
+        if conversation_history:
+            recent_history = conversation_history[-4:]
+            for msg in recent_history:
+                role = msg.get("role", "")
+                content = msg.get("content", "")
+                history_text += f"{role}: {content}\n"
+        
+        prompt = self.response_prompt.format(
+            query=query,
+            search_results=formatted_results,
+            conversation_history=history_text if history_text else "无"
+        )
+        return prompt, sources
+    
+    def _no_results_response(self) -> Dict:
+        return {
+            "agent": "网络搜索智能体",
+            "response": "抱歉,没有找到相关的搜索结果。请尝试重新表述您的问题。",
+            "sources": []
+        }
+    
+    def _make_response(self, content: str, sources: List[Dict]) -> Dict:
+        agent_name = self.config_manager.get_config("system_name") if self.config_manager else "网络搜索智能体"
+        return {
+            "agent": agent_name,
+            "response": content,
+            "sources": sources
+        }
+    
+    def _error_response(self, e: Exception) -> Dict:
+        print(f"网络搜索出错: {e}")
+        return {
+            "agent": "网络搜索智能体",
+            "response": f"搜索时出错: {str(e)}。请稍后重试。",
+            "sources": [],
+            "error": str(e)
+        }
+    
     def search(self, query: str, conversation_history: List[Dict] = None) -> Dict:
         """
         执行网络搜索并生成响应
@@ -54,71 +126,63 @@ class WebSearchAgent:
             response_dict: 包含回答和搜索结果的字典
         """
         try:
-            # 直接使用用户的查询
-            search_query = query
-            
-            # 使用DuckDuckGo搜索
-            with DDGS() as ddgs:
-                search_results = list(ddgs.text(
-                    search_query,
-                    max_results=self.config.max_results
-                ))
-            
+            search_results = self._search_web(query)
             if not search_results:
-                return {
-                    "agent": "网络搜索智能体",
-                    "response": "抱歉,没有找到相关的搜索结果。请尝试重新表述您的问题。",
-                    "sources": []
-                }
+                return self._no_results_response()
             
-            # 格式化搜索结果
-            formatted_results = ""
-            sources = []
-            for idx, result in enumerate(search_results, 1):
-                title = result.get('title', '无标题')
-                body = result.get('body', '无内容')
-                link = result.get('href', '')
-                
-                formatted_results += f"\n[结果{idx}]\n标题: {title}\n内容: {body}\n链接: {link}\n"
-                
-                sources.append({
-                    "title": title,
-                    "snippet": body[:200] + "...",
-                    "url": link
-                })
+            prompt, sources = self._build_prompt(query, search_results, conversation_history)
+            response = self.llm.invoke(prompt)
+            return self._make_response(response.content, sources)
             
-            # 格式化对话历史
-            history_text = ""
-            if conversation_history:
-                recent_history = conversation_history[-4:]
-                for msg in recent_history:
-                    role = msg.get("role", "")
-                    content = msg.get("content", "")
-                    history_text += f"{role}: {content}\n"
+        except ProviderOverloadedError:
+            # 限流排队失败交给Web层返回429/503
+            raise
+        except Exception as e:
+            return self._error_response(e)
+    
+    async def asearch(self, query: str, conversation_history: List[Dict] = None) -> Dict:
+        """执行网络搜索并生成响应（异步版本，搜索请求在共享线程池中执行）"""
+        try:
+            search_results = await run_blocking(self._search_web, query)
+            if not search_results:
+                return self._no_results_response()
             
-            # 生成响应
-            prompt = self.response_prompt.format(
-                query=query,
-                search_results=formatted_results,
-                conversation_history=history_text if history_text else "无"
-            )
+            prompt, sources = self._build_prompt(query, search_results, conversation_history)
+            response = await self.llm.ainvoke(prompt)
+            return self._make_response(response.content, sources)
             
-            response = self.llm.invoke(prompt)
+        except ProviderOverloadedError:
+            raise
+        except Exception as e:
+            return self._error_response(e)
+    
+    async def astream_search(self, query: str, conversation_history: List[Dict] = None) -> AsyncIterator[Dict]:
+        """
+        流式执行网络搜索：先产出搜索来源，再逐段产出回答
+        
+        Yields:
+            {"event": "sources", "data": 来源列表}、{"event": "token", "data": 文本片段}，
+            最后是 {"event": "result", "data": 回答字典}
+        """
+        try:
+            search_results = await run_blocking(self._search_web, query)
+            if not search_results:
+                yield {"event": "result", "data": self._no_results_response()}
+                return
             
-            agent_name = self.config_manager.get_config("system_name") if self.config_manager else "网络搜索智能体"
-            return {
-                "agent": agent_name,
-                "response": response.content,
-                "sources": sources
-            }
+            prompt, sources = self._build_prompt(query, search_results, conversation_history)
+            yield {"event": "sources", "data": sources}
+            parts = []
+            async for chunk in self.llm.astream(prompt):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield {"event": "token", "data": chunk.content}
+            yield {"event": "result", "data": self._make_response("".join(parts), sources)}
             
+        except ProviderOverloadedError:
+            raise
         except Exception as e:
-            print(f"网络搜索出错: {e}")
-            return {
-                "agent": "网络搜索智能体",
-                "response": f"搜索时出错: {str(e)}。请稍后重试。",
-                "sources": []
-            }
+            yield {"event": "result", "data": self._error_response(e)}
     
     def is_medical_query(self, query: str) -> bool:
         """判断是否为医学相关查询"""
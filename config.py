@@ -3,8 +3,7 @@
 """
 import os
 from dotenv import load_dotenv
-from langchain_community.chat_models.tongyi import ChatTongyi
-from langchain_community.embeddings import DashScopeEmbeddings
+from llm_clients import get_chat_model, get_embeddings
 
 # 加载环境变量
 load_dotenv()
@@ -13,37 +12,66 @@ class AgentDecisionConfig:
     """Agent决策配置"""
     def __init__(self):
         self.model_name = os.getenv("DASHSCOPE_MODEL_NAME", "qwen-plus")
-        self.llm = ChatTongyi(
-            model=self.model_name,
-            dashscope_api_key=os.getenv("DASHSCOPE_API_KEY"),
-            temperature=0.1,  # 低温度以确保决策准确性
-            top_p=0.8
-        )
+        self.llm = get_chat_model(self.model_name, temperature=0.1, top_p=0.8)  # 低温度以确保决策准确性
+        # 一次调用同时决定智能体和知识库（JSON输出），关闭后分两次调用
+        self.combined_routing = os.getenv("COMBINED_ROUTING", "true").lower() == "true"
+        # 本地快速路由：关键词规则 + 示例问题向量中心，置信度高时不调用LLM
+        self.fast_router_enabled = os.getenv("FAST_ROUTER_ENABLED", "true").lower() == "true"
+        self.fast_router_examples_path = os.getenv("FAST_ROUTER_EXAMPLES_PATH", "./data/router_examples.json")
+        self.fast_router_min_similarity = float(os.getenv("FAST_ROUTER_MIN_SIMILARITY", "0.6"))
+        self.fast_router_min_margin = float(os.getenv("FAST_ROUTER_MIN_MARGIN", "0.08"))  # 与第二名的最小相似度差
 
 class ConversationConfig:
     """对话配置"""
     def __init__(self):
         self.model_name = os.getenv("DASHSCOPE_MODEL_NAME", "qwen-plus")
-        self.llm = ChatTongyi(
-            model=self.model_name,
-            dashscope_api_key=os.getenv("DASHSCOPE_API_KEY"),
-            temperature=0.7,  # 适度创造性
-            top_p=0.8
-        )
+        self.llm = get_chat_model(self.model_name, temperature=0.7, top_p=0.8)  # 适度创造性
         self.context_limit = 20  # 保留最近20条消息
 
 class WebSearchConfig:
     """网络搜索配置"""
     def __init__(self):
         self.model_name = os.getenv("DASHSCOPE_MODEL_NAME", "qwen-plus")
-        self.llm = ChatTongyi(
-            model=self.model_name,
-            dashscope_api_key=os.getenv("DASHSCOPE_API_KEY"),
-            temperature=0.3,
-            top_p=0.8
-        )
+        self.llm = get_chat_model(self.model_name, temperature=0.3, top_p=0.8)
         self.max_results = 5  # 最多搜索结果数
 
+class LLMClientConfig:
+    """LLM客户端配置（所有智能体共用）"""
+    def __init__(self):
+        # 传输方式：openai（百炼OpenAI兼容接口，共享长连接池） 或 dashscope（DashScope SDK，每次请求新建连接）
+        self.transport = os.getenv("LLM_TRANSPORT", "openai")
+        self.api_key = os.getenv("DASHSCOPE_API_KEY")
+        self.base_url = os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+        self.max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))  # 连接池最大连接数
+        self.max_keepalive_connections = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))  # 保持的空闲长连接数
+        self.keepalive_expiry = 30.0  # 空闲长连接保持时间（秒）
+        self.timeout = float(os.getenv("LLM_TIMEOUT", "60"))  # 单次请求超时（秒）
+        self.max_retries = 2
+        # 同时进行的相同请求（相同模型参数和完整提示词）合并为一次上游调用
+        self.coalesce_requests = os.getenv("LLM_COALESCE_REQUESTS", "true").lower() == "true"
+        # 供应商限流：所有智能体的LLM和向量化调用共用，超出时排队（交互式对话优先于后台导入）
+        self.max_in_flight = int(os.getenv("LLM_MAX_IN_FLIGHT", "32"))  # 同时进行的最大请求数
+        self.requests_per_second = float(os.getenv("LLM_RPS", "20"))  # 每秒请求数，0表示不限
+        self.tokens_per_minute = float(os.getenv("LLM_TPM", "1000000"))  # 每分钟token数（按字符数估算），0表示不限
+        self.completion_token_estimate = 500  # 每次对话调用预估的输出token数
+        self.max_queue = int(os.getenv("LLM_MAX_QUEUE", "200"))  # 排队上限，超出返回429
+        self.queue_timeout = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))  # 交互式请求最长排队时间（秒），超出返回503
+        self.background_queue_timeout = float(os.getenv("LLM_BACKGROUND_QUEUE_TIMEOUT", "300"))  # 导入请求最长排队时间（秒）
+
+class ExecutorConfig:
+    """异步执行配置"""
+    def __init__(self):
+        # 同步调用（检索、网络搜索、向量化以及LLM客户端内部的同步请求）共用的线程池大小，决定单个进程能同时处理的对话数
+        self.blocking_workers = int(os.getenv("AGENT_BLOCKING_WORKERS", "256"))
+
+class SemanticCacheConfig:
+    """语义答案缓存配置"""
+    def __init__(self):
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        self.similarity_threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # 命中所需的最小余弦相似度
+        self.ttl_seconds = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # 缓存有效期（秒）
+        self.max_entries = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))  # 超出后按LRU淘汰
+
 class RAGConfig:
     """RAG系统配置"""
     def __init__(self):
@@ -54,6 +82,18 @@ class RAGConfig:
         self.use_local = os.getenv("QDRANT_USE_LOCAL", "true").lower() == "true"
         self.vector_local_path = os.getenv("QDRANT_LOCAL_PATH", "./data/qdrant_db")
         
+        # 向量库后端：qdrant，或 local（进程内内存映射矩阵 + HNSW，不占用Qdrant文件锁）
+        self.vector_backend = os.getenv("VECTOR_BACKEND", "qdrant")
+        self.local_vector_path = os.getenv("LOCAL_VECTOR_PATH", "./data/local_vectors")
+        self.local_index_type = os.getenv("LOCAL_INDEX_TYPE", "auto")  # flat / hnsw / auto（int8量化时auto不构建HNSW，hnsw会报错）
+        self.hnsw_min_points = int(os.getenv("HNSW_MIN_POINTS", "50000"))  # auto模式下超过该点数使用HNSW
+        self.local_compact_threshold = float(os.getenv("LOCAL_COMPACT_THRESHOLD", "0.3"))  # 已删除的行达到该比例时压缩local向量库，<=0只手动压缩
+        
+        # 向量量化：none / int8（Qdrant标量量化，local后端int8粗排） / pq（Qdrant乘积量化，仅云端Qdrant）
+        # 先用量化向量粗排 oversampling×k 个候选，再用原始向量精排
+        self.vector_quantization = os.getenv("VECTOR_QUANTIZATION", "none")
+        self.quantization_oversampling = float(os.getenv("QUANTIZATION_OVERSAMPLING", "3"))
+        
         # 多知识库配置 - 每个文件夹对应一个知识库
         self.knowledge_bases = {
             "医疗知识库": {
@@ -74,24 +114,67 @@ class RAGConfig:
         self.chunk_overlap = 50
         
         # Embedding模型 - 使用阿里云百炼平台的文本向量模型
-        self.embedding_model = DashScopeEmbeddings(
-            model=os.getenv("DASHSCOPE_EMBEDDING_MODEL", "text-embedding-v2"),
-            dashscope_api_key=os.getenv("DASHSCOPE_API_KEY")
-        )
+        self.embedding_model_name = os.getenv("DASHSCOPE_EMBEDDING_MODEL", "text-embedding-v2")
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "25"))  # DashScope单次请求最多25条
+        self.embedding_model = get_embeddings(self.embedding_model_name, self.embedding_batch_size)
+        
+        # Embedding本地缓存配置（按模型名+文本哈希缓存向量）
+        self.embedding_cache_enabled = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+        self.embedding_cache_path = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite")
+        self.embedding_cache_max_items = int(os.getenv("EMBEDDING_CACHE_MAX_ITEMS", "200000"))
+        
+        # Embedding批处理配置
+        self.embedding_max_concurrency = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))  # 最大并发请求数
+        self.embedding_rate_limit = float(os.getenv("EMBEDDING_RATE_LIMIT", "10"))  # 每秒请求数，0表示不限流
+        self.embedding_max_retries = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+        self.upsert_batch_size = 256  # 每次写入Qdrant的点数
+        self.upsert_parallelism = int(os.getenv("QDRANT_UPSERT_PARALLELISM", "4"))  # 并行写入请求数（仅云端模式）
+        self.bulk_write_size = 2048  # 导入管道攒够多少个点再批量写入
+        self.bulk_load_defer_indexing = os.getenv("BULK_LOAD_DEFER_INDEXING", "true").lower() == "true"
+        self.indexing_threshold = int(os.getenv("QDRANT_INDEXING_THRESHOLD", "20000"))  # collection正常的索引阈值（KB）
+        
+        # 增量导入清单目录（每个collection一个清单文件）
+        self.ingest_manifest_dir = os.getenv("INGEST_MANIFEST_DIR", "./data/ingest_manifest")
+        self.ingest_queue_size = 8  # 导入管道各阶段之间队列的最大批次数
+        self.ingest_checkpoint_interval = 5.0  # 导入清单的保存间隔（秒），间隔内的进度记录在检查点中
+        
+        # 近似重复文本块去重（SimHash）
+        self.dedup_enabled = os.getenv("INGEST_DEDUP_ENABLED", "true").lower() == "true"
+        self.dedup_max_distance = int(os.getenv("INGEST_DEDUP_MAX_DISTANCE", "3"))  # 指纹汉明距离阈值
+        self.dedup_scope = os.getenv("INGEST_DEDUP_SCOPE", "knowledge_base")  # knowledge_base 或 global
+        
+        # 知识库文件夹监听（ingest_data.py --watch，或随Web服务启动）
+        self.watch_enabled = os.getenv("INGEST_WATCH_ENABLED", "false").lower() == "true"  # 是否随Web服务启动
+        self.watch_folder = os.getenv("INGEST_WATCH_FOLDER", "./text")
+        self.watch_interval = float(os.getenv("INGEST_WATCH_INTERVAL", "2"))  # 轮询间隔（秒）
+        self.watch_settle_seconds = 1.0  # 文件夹内容保持不变多久后才导入
         
         # LLM模型
         self.model_name = os.getenv("DASHSCOPE_MODEL_NAME", "qwen-plus")
-        self.llm = ChatTongyi(
-            model=self.model_name,
-            dashscope_api_key=os.getenv("DASHSCOPE_API_KEY"),
-            temperature=0.3,
-            top_p=0.8
-        )
+        self.llm = get_chat_model(self.model_name, temperature=0.3, top_p=0.8)
         
         # 检索配置
-        self.top_k = 5  # 检索结果数量
+        self.top_k = 10  # 每个知识库的检索结果数量（检索宽一些，由重排序挑选）
         self.min_retrieval_confidence = 1.0  # 最大距离阈值（余弦距离，越小越相似，0-2范围）
         self.reranker_top_k = 3  # 重排序后保留数量
+        self.reranker = os.getenv("RERANKER", "lexical")  # none / lexical / mmr
+        self.rerank_budget_ms = float(os.getenv("RERANK_BUDGET_MS", "50"))  # 重排序时间预算，超时按检索顺序截断
+        # 推测检索：路由决策的同时检索所有知识库，决策为RAG时直接使用结果
+        self.speculative_retrieval = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+        self.speculative_workers = 4  # 同时进行的推测检索数
+        
+        # 混合检索：BM25词法检索与向量检索的结果做倒数排名融合（RRF）
+        self.hybrid_search_enabled = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+        self.lexical_index_dir = os.getenv("LEXICAL_INDEX_DIR", "./data/lexical_index")  # 每个collection一个索引文件
+        self.bm25_top_k = 5  # 每个知识库BM25检索结果数量
+        self.rrf_k = 60  # RRF平滑常数
+        
+        # 知识库路由：embedding（按导入时累计的知识库向量画像选择，不够确定时交给LLM） 或 llm
+        self.kb_routing = os.getenv("KB_ROUTING", "embedding")
+        self.kb_profile_dir = os.getenv("KB_PROFILE_DIR", "./data/kb_profiles")  # 每个collection一个画像文件
+        self.kb_profile_samples = 64  # 每个知识库保留的代表向量数
+        self.kb_routing_threshold = float(os.getenv("KB_ROUTING_THRESHOLD", "0.5"))  # 选中知识库的最小相似度
+        self.kb_routing_margin = float(os.getenv("KB_ROUTING_MARGIN", "0.05"))  # 与最相似知识库相差在此范围内的一并选中
         self.include_sources = True  # 是否包含来源
         self.context_limit = 20
 
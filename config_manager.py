@@ -1,6 +1,7 @@
 """
 配置管理器 - 管理用户自定义的系统配置
 """
+import hashlib
 import json
 import os
 from typing import Dict, Any
@@ -165,4 +166,12 @@ class ConfigManager:
         """获取指定类型的提示词"""
         prompt_key = f"{prompt_type}_prompt"
         return self.config.get(prompt_key, self.default_config.get(prompt_key, ""))
-
+    
+    def get_prompt_version(self) -> str:
+        """获取提示词版本（所有提示词和RAG开关的哈希），提示词修改后版本随之变化"""
+        versioned = {
+            key: value for key, value in self.config.items()
+            if key.endswith("_prompt") or key == "rag_enabled"
+        }
+        content = json.dumps(versioned, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
@@ -4,139 +4,58 @@
 """
 import argparse
 import os
+import time
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Optional
 from agents.rag_agent import MedicalRAG
+from config import RAGConfig
+from ingestion.dedup import NearDuplicateFilter
+from ingestion.pipeline import IngestionPipeline
+from ingestion.text_splitter import TextSplitter
+from ingestion.watcher import KnowledgeBaseWatcher
 
-def read_txt_file(file_path: str) -> str:
-    """读取TXT文件内容"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except UnicodeDecodeError:
-        # 如果UTF-8失败，尝试其他编码
-        try:
-            with open(file_path, 'r', encoding='gbk') as f:
-                return f.read()
-        except Exception as e:
-            print(f"⚠️  无法读取文件 {file_path}: {e}")
-            return ""
+def create_text_splitter() -> TextSplitter:
+    """根据RAGConfig的分块配置创建分块器"""
+    config = RAGConfig()
+    return TextSplitter(config.chunk_size, config.chunk_overlap)
 
-def read_pdf_file(file_path: str) -> str:
-    """读取PDF文件内容"""
-    try:
-        import PyPDF2
-        text = ""
-        with open(file_path, 'rb') as f:
-            pdf_reader = PyPDF2.PdfReader(f)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
-    except ImportError:
-        print("⚠️  需要安装PyPDF2来读取PDF文件: pip install PyPDF2")
-        return ""
-    except Exception as e:
-        print(f"⚠️  无法读取PDF文件 {file_path}: {e}")
-        return ""
+def create_dedup_filter(config: RAGConfig, enabled: bool = True) -> Optional[NearDuplicateFilter]:
+    """根据RAGConfig的去重配置创建近似重复过滤器，未启用时返回None"""
+    if not (enabled and config.dedup_enabled):
+        return None
+    return NearDuplicateFilter(config.dedup_max_distance, config.dedup_scope)
 
-def read_file(file_path: str) -> Tuple[str, str]:
-    """
-    根据文件类型读取文件内容
-    返回: (文件内容, 文件类型)
-    """
-    file_ext = Path(file_path).suffix.lower()
-    
-    if file_ext == '.txt':
-        content = read_txt_file(file_path)
-        return content, 'txt'
-    elif file_ext == '.pdf':
-        content = read_pdf_file(file_path)
-        return content, 'pdf'
-    else:
-        print(f"⚠️  不支持的文件格式: {file_ext}")
-        return "", 'unknown'
-
-def load_documents_from_folder(folder_path: str = "./text") -> Tuple[List[str], List[dict]]:
-    """
-    从指定文件夹加载所有支持的文档
-    返回: (文本列表, 元数据列表)
+def ingest_folder(rag_agent: MedicalRAG, folder_path: str, knowledge_base: str = None,
+                  splitter: Optional[TextSplitter] = None, force: bool = False,
+                  workers: int = 1, resume: bool = False,
+                  dedup: Optional[NearDuplicateFilter] = None) -> Dict[str, int]:
     """
-    texts = []
-    metadatas = []
-    
-    # 支持的文件扩展名
-    supported_extensions = {'.txt', '.pdf'}
-    
-    # 确保文件夹存在
-    if not os.path.exists(folder_path):
-        print(f"❌ 文件夹不存在: {folder_path}")
-        return texts, metadatas
-    
-    # 遍历文件夹中的所有文件
-    folder = Path(folder_path)
-    files = list(folder.glob('*'))
-    
-    if not files:
-        print(f"⚠️  文件夹 {folder_path} 中没有文件")
-        return texts, metadatas
-    
-    print(f"📂 正在扫描文件夹: {folder_path}")
-    
-    for file_path in files:
-        if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-            print(f"  📄 读取文件: {file_path.name}")
-            content, file_type = read_file(str(file_path))
-            
-            if content and content.strip():
-                texts.append(content)
-                metadatas.append({
-                    "source": file_path.name,
-                    "file_type": file_type,
-                    "file_path": str(file_path)
-                })
-                print(f"    ✓ 成功读取 ({len(content)} 字符)")
-            else:
-                print(f"    ✗ 文件内容为空或读取失败")
-    
-    return texts, metadatas
-
-def load_documents_from_knowledge_bases(base_folder: str = "./text") -> dict:
-    """
-    从知识库文件夹结构加载文档
-    每个子文件夹代表一个知识库
+    通过流式管道增量导入文件夹中的文档
     
     Args:
-        base_folder: 基础文件夹路径
+        rag_agent: RAG智能体
+        folder_path: 文件夹路径
+        knowledge_base: 目标知识库名称，None表示默认知识库
+        splitter: 文本分块器，None表示按RAGConfig创建
+        force: 是否忽略清单强制重新导入所有文件
+        workers: 并行提取文件内容的进程数
+        resume: 是否从上次中断时的检查点继续
+        dedup: 近似重复过滤器，None表示不去重
         
     Returns:
-        dict: {知识库名称: (文本列表, 元数据列表)}
+        dict: 导入统计
     """
-    knowledge_base_docs = {}
-    
-    # 确保基础文件夹存在
-    if not os.path.exists(base_folder):
-        print(f"❌ 文件夹不存在: {base_folder}")
-        return knowledge_base_docs
-    
-    base_path = Path(base_folder)
-    
-    # 遍历所有子文件夹
-    for kb_folder in base_path.iterdir():
-        if kb_folder.is_dir():
-            kb_name = kb_folder.name
-            print(f"\n📚 正在处理知识库: {kb_name}")
-            texts, metadatas = load_documents_from_folder(str(kb_folder))
-            
-            if texts:
-                # 为每个元数据添加知识库信息
-                for metadata in metadatas:
-                    metadata["knowledge_base"] = kb_name
-                knowledge_base_docs[kb_name] = (texts, metadatas)
-                print(f"  ✅ 从 '{kb_name}' 加载了 {len(texts)} 个文档")
-            else:
-                print(f"  ⚠️  '{kb_name}' 中没有找到有效文档")
-    
-    return knowledge_base_docs
+    pipeline = IngestionPipeline(rag_agent, splitter or create_text_splitter(), workers=workers, dedup=dedup)
+    return pipeline.run(folder_path, knowledge_base=knowledge_base, force=force, resume=resume)
+
+def print_ingest_stats(stats: Dict[str, int]):
+    """打印增量导入统计"""
+    print(f"  新增文件: {stats['added_files']}, 更新文件: {stats['updated_files']}, "
+          f"未变化文件: {stats['unchanged_files']}, 删除文件: {stats['deleted_files']}, "
+          f"失败文件: {stats['failed_files']}")
+    print(f"  新向量化文本块: {stats['embedded_chunks']}, 移除向量: {stats['deleted_points']}")
+    if stats["duplicate_chunks"]:
+        print(f"  去重丢弃文本块: {stats['duplicate_chunks']} ({stats['duplicate_bytes'] / 1024:.1f} KB)")
 
 def ingest_text_data(texts, metadatas=None, knowledge_base=None):
     """导入文本数据到知识库"""
@@ -163,8 +82,9 @@ def ingest_text_data(texts, metadatas=None, knowledge_base=None):
         import traceback
         traceback.print_exc()
 
-def ingest_all_knowledge_bases(base_folder: str = "./text"):
-    """导入所有知识库的文档"""
+def ingest_all_knowledge_bases(base_folder: str = "./text", force: bool = False, workers: int = 1,
+                               resume: bool = False, dedup: bool = True):
+    """增量导入所有知识库的文档，每个子文件夹代表一个知识库"""
     try:
         from config_manager import ConfigManager
         
@@ -172,10 +92,9 @@ def ingest_all_knowledge_bases(base_folder: str = "./text"):
         print("📚 开始批量导入知识库文档...")
         print(f"{'='*60}\n")
         
-        # 加载所有知识库的文档
-        kb_docs = load_documents_from_knowledge_bases(base_folder)
+        kb_folders = sorted(p for p in Path(base_folder).iterdir() if p.is_dir()) if os.path.exists(base_folder) else []
         
-        if not kb_docs:
+        if not kb_folders:
             print(f"\n❌ 没有找到知识库文件夹")
             print(f"\n💡 提示:")
             print(f"  - 请确保在 {base_folder} 下创建知识库文件夹")
@@ -186,6 +105,9 @@ def ingest_all_knowledge_bases(base_folder: str = "./text"):
         # 初始化RAG agent
         config_manager = ConfigManager()
         rag_agent = MedicalRAG(config_manager)
+        splitter = TextSplitter(rag_agent.config.chunk_size, rag_agent.config.chunk_overlap)
+        # 所有知识库共用一个过滤器，dedup_scope为global时可跨知识库去重
+        dedup_filter = create_dedup_filter(rag_agent.config, dedup)
         
         # 显示已配置的知识库
         configured_kbs = rag_agent.get_all_knowledge_bases()
@@ -195,32 +117,45 @@ def ingest_all_knowledge_bases(base_folder: str = "./text"):
         print()
         
         # 导入每个知识库的文档
-        total_docs = 0
-        for kb_name, (texts, metadatas) in kb_docs.items():
+        total_chunks = 0
+        started_at = time.monotonic()
+        for kb_folder in kb_folders:
+            kb_name = kb_folder.name
             print(f"\n{'='*60}")
             print(f"📥 正在导入知识库: {kb_name}")
             print(f"{'='*60}")
-            print(f"文档数量: {len(texts)}")
-            print(f"总字符数: {sum(len(t) for t in texts)}")
             
             # 检查知识库是否已配置
             if kb_name not in configured_kbs:
                 print(f"⚠️  警告: 知识库 '{kb_name}' 未在配置中，将使用默认知识库")
                 kb_name = None
             
-            success = rag_agent.add_documents(texts, metadatas, knowledge_base=kb_name)
-            
-            if success:
-                total_docs += len(texts)
-                print(f"✅ 成功导入 {len(texts)} 个文档")
-            else:
-                print(f"❌ 导入失败")
+            stats = ingest_folder(rag_agent, str(kb_folder), knowledge_base=kb_name,
+                                  splitter=splitter, force=force, workers=workers, resume=resume,
+                                  dedup=dedup_filter)
+            print_ingest_stats(stats)
+            total_chunks += stats["embedded_chunks"]
         
         # 显示最终统计
         print(f"\n{'='*60}")
         print(f"📊 导入完成统计")
         print(f"{'='*60}")
-        print(f"总共导入文档数: {total_docs}")
+        print(f"总共导入文本块数: {total_chunks}")
+        
+        # 吞吐量统计
+        elapsed = time.monotonic() - started_at
+        embedding_stats = rag_agent.embedding_batcher.get_stats()
+        print(f"总耗时: {elapsed:.1f} 秒, 整体吞吐: {total_chunks / elapsed if elapsed > 0 else 0:.1f} 条/秒")
+        print(f"Embedding: {embedding_stats['items']} 条, {embedding_stats['requests']} 次请求, "
+              f"{embedding_stats['retries']} 次重试, {embedding_stats['items_per_second']:.1f} 条/秒")
+        if rag_agent.embedding_cache:
+            cache_stats = rag_agent.embedding_cache.get_stats()
+            print(f"Embedding缓存: 命中 {cache_stats['hits']}, 未命中 {cache_stats['misses']}, "
+                  f"命中率 {cache_stats['hit_rate']:.1%}, 缓存条数 {cache_stats['size']}")
+        if dedup_filter:
+            dedup_stats = dedup_filter.get_stats()
+            print(f"去重: 丢弃 {dedup_stats['duplicate_chunks']} 个近似重复文本块, "
+                  f"节省 {dedup_stats['duplicate_chunks']} 次向量化和 {dedup_stats['duplicate_bytes'] / 1024:.1f} KB 文本")
         
         # 显示各知识库的文档数量
         stats = rag_agent.get_knowledge_base_stats()
@@ -234,6 +169,27 @@ def ingest_all_knowledge_bases(base_folder: str = "./text"):
         import traceback
         traceback.print_exc()
 
+def watch_knowledge_bases(base_folder: str = "./text", interval: float = None, workers: int = 1,
+                          dedup: bool = True):
+    """监听知识库文件夹，文件新增、修改、删除后自动增量导入，按 Ctrl+C 退出"""
+    from config_manager import ConfigManager
+    
+    rag_agent = MedicalRAG(ConfigManager())
+    config = rag_agent.config
+    watcher = KnowledgeBaseWatcher(
+        rag_agent,
+        base_folder,
+        TextSplitter(config.chunk_size, config.chunk_overlap),
+        interval=interval or config.watch_interval,
+        settle_seconds=config.watch_settle_seconds,
+        workers=workers,
+        dedup=create_dedup_filter(config, dedup)
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("\n👋 已停止监听")
+
 def main():
     parser = argparse.ArgumentParser(description="导入知识库数据 - 支持多知识库")
     parser.add_argument("--text", type=str, help="导入单条文本")
@@ -241,6 +197,12 @@ def main():
     parser.add_argument("--kb", type=str, help="指定知识库名称（与--folder配合使用）")
     parser.add_argument("--all", action="store_true", help="从text文件夹批量导入所有知识库")
     parser.add_argument("--base-folder", type=str, default="./text", help="知识库基础文件夹 (默认: ./text)")
+    parser.add_argument("--force", action="store_true", help="忽略导入清单，重新导入所有文件")
+    parser.add_argument("--workers", type=int, default=1, help="并行提取文档内容的进程数 (默认: 1)")
+    parser.add_argument("--resume", action="store_true", help="从上次中断时的检查点继续导入")
+    parser.add_argument("--no-dedup", action="store_true", help="关闭近似重复文本块去重")
+    parser.add_argument("--watch", action="store_true", help="监听知识库文件夹，文件变化后自动增量导入")
+    parser.add_argument("--interval", type=float, help="--watch 的轮询间隔秒数 (默认: 2)")
     
     args = parser.parse_args()
     
@@ -248,25 +210,31 @@ def main():
         # 导入单条文本
         print(f"正在导入文本: {args.text[:50]}...")
         ingest_text_data([args.text], knowledge_base=args.kb)
+    elif args.watch:
+        # 持续监听所有知识库文件夹
+        watch_knowledge_bases(args.base_folder, interval=args.interval, workers=args.workers,
+                              dedup=not args.no_dedup)
+        return
     elif args.all:
         # 批量导入所有知识库
-        ingest_all_knowledge_bases(args.base_folder)
+        ingest_all_knowledge_bases(args.base_folder, force=args.force, workers=args.workers,
+                                   resume=args.resume, dedup=not args.no_dedup)
     elif args.folder:
-        # 从指定文件夹导入文档
+        # 从指定文件夹增量导入文档
         print(f"\n{'='*60}")
         print(f"📚 开始从文件夹导入文档...")
         if args.kb:
             print(f"目标知识库: {args.kb}")
         print(f"{'='*60}\n")
         
-        texts, metadatas = load_documents_from_folder(args.folder)
-        
-        if texts:
+        if os.path.exists(args.folder):
+            from config_manager import ConfigManager
+            rag_agent = MedicalRAG(ConfigManager())
+            stats = ingest_folder(rag_agent, args.folder, knowledge_base=args.kb,
+                                  force=args.force, workers=args.workers, resume=args.resume,
+                                  dedup=create_dedup_filter(rag_agent.config, not args.no_dedup))
             print(f"\n📊 统计信息:")
-            print(f"  - 共找到 {len(texts)} 个有效文档")
-            print(f"  - 总字符数: {sum(len(t) for t in texts)}")
-            print(f"\n开始导入到知识库...\n")
-            ingest_text_data(texts, metadatas, knowledge_base=args.kb)
+            print_ingest_stats(stats)
         else:
             print(f"\n❌ 没有找到可导入的文档")
             print("\n💡 提示:")
@@ -277,7 +245,8 @@ def main():
         # 默认行为：批量导入所有知识库
         print("未指定操作，默认批量导入所有知识库...")
         print("如需其他操作，请使用 --help 查看帮助\n")
-        ingest_all_knowledge_bases(args.base_folder)
+        ingest_all_knowledge_bases(args.base_folder, force=args.force, workers=args.workers,
+                                   resume=args.resume, dedup=not args.no_dedup)
     
     print("\n💡 使用示例:")
     print("  1. 批量导入所有知识库:")
@@ -286,6 +255,8 @@ def main():
     print("     python ingest_data.py --folder ./my_docs --kb 医疗知识库")
     print("  3. 导入单条文本:")
     print("     python ingest_data.py --text '这是一段知识...' --kb 商业知识库")
+    print("  4. 监听知识库文件夹并自动导入:")
+    print("     python ingest_data.py --watch")
     print("=" * 60)
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+# 数据导入工具包
@@ -0,0 +1,178 @@
+"""
+导入检查点 - 记录导入过程中已写入向量库、但尚未保存到导入清单的进度
+
+导入清单按时间间隔批量保存，两次保存之间的进度（已写入的文本块批次、已完成的文件）
+先记录在检查点中，中断后可以用 --resume 从检查点继续，不会重复向量化已写入的文本块。
+
+检查点由快照（.checkpoint.json）和追加日志（.checkpoint.jsonl）组成：每次保存只把新的进度追加到日志，
+日志超过快照大小、或清单保存后已完成的文件移出检查点时，才把当前状态重写为快照并清空日志。
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from .manifest import normalize_file_key
+
+
+class IngestCheckpoint:
+    """单个知识库的导入检查点"""
+
+    # 日志小于该大小时不因日志过大而压缩
+    _COMPACT_MIN_BYTES = 1 << 20
+
+    def __init__(self, path: str):
+        self.path = path
+        self.log_path = str(Path(path).with_suffix(".jsonl"))
+        self.files: Dict[str, Dict] = {}
+        # 快照的代数，日志第一行记录它所接续的快照代数
+        self._generation = 0
+        # 尚未写入日志的操作
+        self._pending: List[Dict] = []
+        self._snapshot_bytes = 0
+        self._log_bytes = 0
+        self._needs_compact = False
+        self._load()
+        # 旧版本检查点的键是相对路径，改为与清单一致的绝对路径后重写为快照
+        files = {normalize_file_key(key): record for key, record in self.files.items()}
+        if list(files) != list(self.files):
+            self.files = files
+            self._needs_compact = True
+
+    def _load(self):
+        """加载快照并重放日志"""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.files = data.get("files", {})
+                self._generation = data.get("generation", 0)
+                self._snapshot_bytes = os.path.getsize(self.path)
+            except Exception as e:
+                print(f"⚠️  加载导入检查点失败，将忽略检查点: {e}")
+                self.files = {}
+                self._needs_compact = True
+                return
+        if not os.path.exists(self.log_path):
+            return
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get("generation") != self._generation:
+                    # 压缩时写入快照后、清空日志前中断，日志中的操作已包含在快照中
+                    self._needs_compact = True
+                    return
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        # 追加时中断留下的不完整记录，之后的追加不能接在它后面
+                        self._needs_compact = True
+                        break
+                    self._apply(op)
+            self._log_bytes = os.path.getsize(self.log_path)
+        except Exception as e:
+            print(f"⚠️  加载导入检查点日志失败，将忽略日志: {e}")
+            self._needs_compact = True
+
+    def save(self):
+        """保存检查点：新的进度追加到日志，需要时压缩为快照；没有未完成的进度时删除检查点文件"""
+        if not self.files:
+            for path in (self.path, self.log_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._pending.clear()
+            self._generation = self._snapshot_bytes = self._log_bytes = 0
+            self._needs_compact = False
+            return
+        if not self._needs_compact and self._pending:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                if not self._log_bytes:
+                    f.write(json.dumps({"generation": self._generation}) + "\n")
+                for op in self._pending:
+                    f.write(json.dumps(op, ensure_ascii=False) + "\n")
+                self._log_bytes = f.tell()
+            self._pending.clear()
+        if self._needs_compact or self._log_bytes >= max(self._COMPACT_MIN_BYTES, self._snapshot_bytes):
+            self._compact()
+
+    def _compact(self):
+        """把当前状态原子地写为新一代快照并清空日志（旧日志的代数与新快照不一致，不会被重放）"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._generation += 1
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"generation": self._generation, "files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._snapshot_bytes = os.path.getsize(self.path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self._log_bytes = 0
+        self._pending.clear()
+        self._needs_compact = False
+
+    def _record(self, op: Dict):
+        """执行一个操作，并在下次保存时追加到日志"""
+        self._apply(op)
+        self._pending.append(op)
+
+    def _apply(self, op: Dict):
+        kind, file_key = op["op"], op.get("file")
+        if kind == "batch":
+            record = self.files.get(file_key)
+            if record is None or record["content_hash"] != op["hash"]:
+                # 文件内容变化后，旧版本已写入的点仍保留在记录中，以便导入完成后清理
+                previous_ids = self.point_ids(file_key)
+                record = {"content_hash": op["hash"], "done_ids": [], "stale_ids": sorted(previous_ids)}
+                self.files[file_key] = record
+            record["done_ids"].extend(op["ids"])
+            record.pop("entry", None)
+        elif kind == "finished":
+            self.files[file_key] = {"content_hash": op["entry"]["content_hash"], "done_ids": [], "entry": op["entry"]}
+        elif kind == "remove":
+            self.files.pop(file_key, None)
+        elif kind == "pop_finished":
+            for key in [key for key, record in self.files.items() if "entry" in record]:
+                del self.files[key]
+
+    def mark_batch(self, file_key: str, content_hash: str, point_ids: List[str]):
+        """记录文件的一批文本块已写入向量库"""
+        self._record({"op": "batch", "file": file_key, "hash": content_hash, "ids": list(point_ids)})
+
+    def mark_finished(self, file_key: str, entry: Dict):
+        """记录文件已导入完成，entry为该文件的清单记录"""
+        self._record({"op": "finished", "file": file_key, "entry": entry})
+
+    def pop_finished(self) -> Dict[str, Dict]:
+        """取出所有已完成文件的清单记录"""
+        finished = {key: record["entry"] for key, record in self.files.items() if "entry" in record}
+        if finished:
+            self._record({"op": "pop_finished"})
+            # 剩下的只有未完成的文件，下次保存时重写为较小的快照
+            self._needs_compact = True
+        return finished
+
+    def resumable_ids(self, file_key: str, content_hash: str) -> Set[str]:
+        """获取文件当前版本已写入向量库的点ID"""
+        record = self.files.get(file_key)
+        if record is None or record["content_hash"] != content_hash:
+            return set()
+        return set(record["done_ids"])
+
+    def point_ids(self, file_key: str) -> Set[str]:
+        """获取检查点中记录的该文件所有已写入的点ID（包括旧版本）"""
+        record = self.files.get(file_key)
+        if record is None:
+            return set()
+        ids = set(record["done_ids"]) | set(record.get("stale_ids", []))
+        if "entry" in record:
+            ids |= set(record["entry"]["point_ids"])
+        return ids
+
+    def remove(self, file_key: str) -> Optional[Dict]:
+        """删除文件的检查点记录"""
+        record = self.files.get(file_key)
+        if record is not None:
+            self._record({"op": "remove", "file": file_key})
+        return record
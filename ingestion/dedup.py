@@ -0,0 +1,176 @@
+"""
+近似重复检测 - 基于SimHash在向量化之前过滤重复或近似重复的文本块
+
+每个文本块计算64位SimHash指纹，海明距离不超过阈值即视为近似重复。
+指纹按16位分为4段建立索引，距离不超过3的两个指纹至少有一段完全相同，因此只需比较同段候选。
+"""
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 计算指纹前去除的空白和标点
+_NORMALIZE_PATTERN = re.compile(r'[\s　-〿＀-／：-＠!-/:-@\[-`{-~]+')
+
+_FINGERPRINT_BITS = 64
+_NUM_BANDS = 4
+_BAND_BITS = _FINGERPRINT_BITS // _NUM_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def normalize_text(text: str) -> str:
+    """去除空白和标点并转为小写"""
+    return _NORMALIZE_PATTERN.sub('', text).lower()
+
+
+def simhash(text: str, ngram: int = 3) -> int:
+    """计算文本的64位SimHash指纹（以字符n-gram为特征，适用于中文）"""
+    normalized = normalize_text(text)
+    if len(normalized) <= ngram:
+        features = [normalized]
+    else:
+        features = [normalized[i:i + ngram] for i in range(len(normalized) - ngram + 1)]
+
+    weights = [0] * _FINGERPRINT_BITS
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(_FINGERPRINT_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个指纹的海明距离"""
+    return bin(a ^ b).count('1')
+
+
+class NearDuplicateFilter:
+    """
+    近似重复文本块过滤器
+
+    记录已保留文本块的指纹，新文本块与已有文本块近似重复时被丢弃。
+    同时记录被丢弃的文本块依赖哪个保留的文本块，保留的文本块被删除时，
+    依赖它的文件需要重新导入。
+    """
+
+    def __init__(self, max_distance: int = 3, scope: str = "knowledge_base"):
+        """
+        Args:
+            max_distance: 视为近似重复的最大海明距离（不超过3时索引可保证不漏检）
+            scope: 去重范围，"knowledge_base" 只在同一知识库内去重，"global" 跨知识库去重
+        """
+        self.max_distance = max_distance
+        self.scope = scope
+
+        # 索引: {(范围, 段序号, 段值): [点ID]}
+        self._bands: Dict[Tuple, List[str]] = {}
+        # 保留的文本块: {点ID: (范围, 指纹, 来源)}，来源为 (清单路径, 文件键, 内容哈希)
+        self._refs: Dict[str, Tuple[str, int, Tuple[str, str, str]]] = {}
+        # 依赖关系: {保留的点ID: {(清单路径, 文件键)}}
+        self._dependents: Dict[str, Set[Tuple[str, str]]] = {}
+        # 依赖的文本块已被删除、需要重新导入的文件
+        self.invalidated: Set[Tuple[str, str]] = set()
+
+        self.duplicate_chunks = 0
+        self.duplicate_bytes = 0
+
+    def _scope_key(self, collection_name: str) -> str:
+        return "*" if self.scope == "global" else collection_name
+
+    def _band_keys(self, scope_key: str, fingerprint: int) -> List[Tuple]:
+        return [(scope_key, band, fingerprint >> (band * _BAND_BITS) & _BAND_MASK) for band in range(_NUM_BANDS)]
+
+    def add(self, collection_name: str, point_id: str, fingerprint: int, source: Tuple[str, str, str]):
+        """
+        登记一个保留的文本块
+
+        Args:
+            collection_name: 所属collection
+            point_id: 向量点ID
+            fingerprint: SimHash指纹
+            source: (清单路径, 文件键, 文件内容哈希)
+        """
+        if point_id in self._refs:
+            return
+        scope_key = self._scope_key(collection_name)
+        self._refs[point_id] = (scope_key, fingerprint, source)
+        for key in self._band_keys(scope_key, fingerprint):
+            self._bands.setdefault(key, []).append(point_id)
+
+    def find(self, collection_name: str, fingerprint: int, source: Tuple[str, str, str]) -> Optional[str]:
+        """
+        查找与指纹近似重复的已保留文本块
+
+        同一文件旧版本的文本块不参与比较（它们会在新版本导入后被移除）
+
+        Returns:
+            重复的点ID，没有时返回None
+        """
+        scope_key = self._scope_key(collection_name)
+        manifest_path, file_key, content_hash = source
+        for key in self._band_keys(scope_key, fingerprint):
+            for point_id in self._bands.get(key, ()):
+                _, candidate, (ref_manifest, ref_file, ref_hash) = self._refs[point_id]
+                if ref_manifest == manifest_path and ref_file == file_key and ref_hash != content_hash:
+                    continue
+                if hamming_distance(fingerprint, candidate) <= self.max_distance:
+                    return point_id
+        return None
+
+    def record_duplicate(self, duplicate_of: str, manifest_path: str, file_key: str, text: str):
+        """记录一个被丢弃的重复文本块"""
+        self._dependents.setdefault(duplicate_of, set()).add((manifest_path, file_key))
+        self.duplicate_chunks += 1
+        self.duplicate_bytes += len(text.encode('utf-8'))
+
+    def seed(self, manifest_path: str, collection_name: str, files: Dict[str, Dict],
+             is_current=lambda file_key, entry: True):
+        """
+        用导入清单中已导入文件的指纹初始化索引
+
+        Args:
+            manifest_path: 清单路径
+            collection_name: 所属collection
+            files: 清单中的文件记录
+            is_current: 判断文件是否仍与清单记录一致，只有一致的文件参与去重
+        """
+        for file_key, entry in files.items():
+            for point_id in entry.get("duplicate_of", []):
+                self._dependents.setdefault(point_id, set()).add((manifest_path, file_key))
+            fingerprints = entry.get("fingerprints")
+            if not fingerprints or not is_current(file_key, entry):
+                continue
+            source = (manifest_path, file_key, entry["content_hash"])
+            for point_id, fingerprint in zip(entry["point_ids"], fingerprints):
+                self.add(collection_name, point_id, int(fingerprint, 16), source)
+
+    def remove(self, point_ids: Iterable[str]) -> Set[Tuple[str, str]]:
+        """
+        移除已删除的文本块
+
+        Returns:
+            依赖这些文本块、需要重新导入的文件 {(清单路径, 文件键)}
+        """
+        affected = set()
+        for point_id in point_ids:
+            ref = self._refs.pop(point_id, None)
+            if ref is not None:
+                scope_key, fingerprint, _ = ref
+                for key in self._band_keys(scope_key, fingerprint):
+                    bucket = self._bands.get(key)
+                    if bucket and point_id in bucket:
+                        bucket.remove(point_id)
+            affected |= self._dependents.pop(point_id, set())
+        self.invalidated |= affected
+        return affected
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取去重统计"""
+        return {
+            "duplicate_chunks": self.duplicate_chunks,
+            "duplicate_bytes": self.duplicate_bytes
+        }
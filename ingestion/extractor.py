@@ -0,0 +1,111 @@
+"""
+文档提取工具 - 从TXT/PDF文件中提取文本，支持多进程并行提取
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 支持的文件扩展名
+SUPPORTED_EXTENSIONS = {'.txt', '.pdf'}
+
+
+def read_txt_file(file_path: str) -> str:
+    """读取TXT文件内容，UTF-8解码失败时尝试GBK，读取失败时抛出异常"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        # 如果UTF-8失败，尝试其他编码
+        with open(file_path, 'r', encoding='gbk') as f:
+            return f.read()
+
+
+def read_pdf_pages(file_path: str) -> List[Tuple[int, str]]:
+    """
+    逐页读取PDF文件内容，读取失败（包括未安装PyPDF2）时抛出异常
+    返回: [(页码(从1开始), 页面文本)]
+    """
+    try:
+        import PyPDF2
+    except ImportError:
+        raise ImportError("需要安装PyPDF2来读取PDF文件: pip install PyPDF2")
+    pages = []
+    with open(file_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        for page_number, page in enumerate(pdf_reader.pages, 1):
+            pages.append((page_number, page.extract_text() or ""))
+    return pages
+
+
+def extract_file(file_path: str) -> Dict:
+    """
+    根据文件类型提取文件内容（可在子进程中执行）
+
+    Returns:
+        dict: {"file_path": 文件路径, "file_type": 文件类型, "pages": [(页码, 文本)], "error": 错误信息}
+              TXT文件只有一页，页码为None；读取成功时 error 为None，
+              读取失败时 pages 为空且 error 为错误信息（与内容为空的文件区分）
+    """
+    file_ext = Path(file_path).suffix.lower()
+    file_type = file_ext.lstrip('.') if file_ext in SUPPORTED_EXTENSIONS else 'unknown'
+    result = {"file_path": file_path, "file_type": file_type, "pages": [], "error": None}
+
+    try:
+        if file_ext == '.txt':
+            result["pages"] = [(None, read_txt_file(file_path))]
+        elif file_ext == '.pdf':
+            result["pages"] = read_pdf_pages(file_path)
+        else:
+            result["error"] = f"不支持的文件格式: {file_ext}"
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+
+    if result["error"]:
+        print(f"⚠️  无法读取文件 {file_path}: {result['error']}")
+    return result
+
+
+def list_supported_files(folder_path: str) -> List[Path]:
+    """列出文件夹中所有支持的文件（不含子文件夹）"""
+    return sorted(
+        file_path for file_path in Path(folder_path).glob('*')
+        if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS
+    )
+
+
+def iter_extracted_files(file_paths: Iterable[str], workers: int = 1,
+                         max_pending: Optional[int] = None) -> Iterator[Dict]:
+    """
+    提取一批文件，按完成顺序流式返回结果
+
+    Args:
+        file_paths: 文件路径
+        workers: 进程数，<=1 时在当前进程中顺序提取
+        max_pending: 同时在途的文件数上限，默认为进程数的2倍
+
+    Yields:
+        extract_file 的返回结果
+    """
+    if workers <= 1:
+        for file_path in file_paths:
+            yield extract_file(file_path)
+        return
+
+    max_pending = max_pending or workers * 2
+    file_iter = iter(file_paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for file_path in file_iter:
+            pending.add(executor.submit(extract_file, file_path))
+            if len(pending) >= max_pending:
+                break
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # 补充新任务，保持在途数量有上限
+            for file_path in file_iter:
+                pending.add(executor.submit(extract_file, file_path))
+                if len(pending) >= max_pending:
+                    break
+            for future in done:
+                yield future.result()
@@ -0,0 +1,119 @@
+"""
+导入清单 - 记录每个知识库已导入文件的状态，用于增量导入
+"""
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 生成确定性向量点ID的命名空间
+POINT_ID_NAMESPACE = uuid.UUID("6f1c9a52-3d4b-4e8a-9b8e-2a7d5c1f0e93")
+
+
+def normalize_file_key(file_path: str) -> str:
+    """
+    将文件路径规范化为清单中的键（绝对路径）
+
+    点ID由文件键生成，同一个文件无论从哪个工作目录、用 --folder 还是 --all 导入都得到相同的键
+    """
+    return Path(os.path.abspath(file_path)).as_posix()
+
+
+def compute_file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """流式计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_point_id(collection_name: str, file_key: str, chunk_index: int, text: str) -> str:
+    """
+    生成确定性的向量点ID
+
+    同一文件同一位置的相同文本始终得到相同ID，重复写入只会覆盖而不会产生重复向量
+    """
+    text_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{collection_name}:{file_key}:{chunk_index}:{text_hash}"))
+
+
+class IngestManifest:
+    """单个知识库的导入清单"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        """从文件加载清单"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                files = json.load(f).get("files", {})
+            # 旧版本清单的键是相对于当时工作目录的路径（导入脚本在项目根目录运行）
+            return {normalize_file_key(key): entry for key, entry in files.items()}
+        except Exception as e:
+            print(f"⚠️  加载导入清单失败，将视为首次导入: {e}")
+            return {}
+
+    def save(self):
+        """原子地保存清单（先写临时文件再替换）"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, file_key: str) -> Optional[Dict]:
+        """获取文件记录"""
+        return self.files.get(file_key)
+
+    def is_unchanged(self, file_key: str, size: int, mtime: float) -> bool:
+        """文件大小和修改时间都未变化时视为未修改，无需读取内容"""
+        entry = self.files.get(file_key)
+        return bool(entry) and entry["size"] == size and entry["mtime"] == mtime
+
+    def update(self, file_key: str, size: int, mtime: float, content_hash: str, point_ids: List[str],
+               fingerprints: List[str] = None, duplicate_of: List[str] = None):
+        """
+        更新文件记录
+
+        Args:
+            fingerprints: 与point_ids一一对应的文本块SimHash指纹（十六进制）
+            duplicate_of: 本文件中被去重丢弃的文本块所依赖的点ID
+        """
+        entry = {
+            "size": size,
+            "mtime": mtime,
+            "content_hash": content_hash,
+            "point_ids": point_ids
+        }
+        if fingerprints is not None:
+            entry["fingerprints"] = fingerprints
+        if duplicate_of:
+            entry["duplicate_of"] = duplicate_of
+        self.files[file_key] = entry
+
+    def set_entry(self, file_key: str, entry: Dict):
+        """直接写入完整的文件记录"""
+        self.files[file_key] = entry
+
+    def invalidate(self, file_key: str):
+        """使文件记录失效，下次导入时会重新处理该文件"""
+        entry = self.files.get(file_key)
+        if entry:
+            entry["mtime"] = -1
+            entry["content_hash"] = ""
+
+    def remove(self, file_key: str) -> Optional[Dict]:
+        """删除文件记录，返回被删除的记录"""
+        return self.files.pop(file_key, None)
+
+    def file_keys_in(self, folder_path: str) -> List[str]:
+        """获取直接位于指定文件夹下的所有文件键"""
+        folder_key = normalize_file_key(folder_path)
+        return [key for key in self.files if Path(key).parent.as_posix() == folder_key]
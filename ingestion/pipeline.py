@@ -0,0 +1,542 @@
+"""
+流式导入管道 - 发现 → 读取 → 分块 → 向量化 → 写入
+
+各阶段运行在独立线程中，之间用有界队列连接：
+读取和分块在生产者线程中进行，向量化在单独线程中进行，写入Qdrant和更新清单在调用线程中进行。
+队列满时上游阶段会阻塞等待，因此内存占用只与队列容量有关，与文档总量无关。
+"""
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from .checkpoint import IngestCheckpoint
+from .dedup import NearDuplicateFilter, simhash
+from .extractor import iter_extracted_files, list_supported_files
+from .manifest import IngestManifest, compute_file_hash, make_point_id, normalize_file_key
+from .text_splitter import TextSplitter
+
+# 阶段结束标记
+_DONE = object()
+
+
+class _PipelineStopped(Exception):
+    """管道因其他阶段出错而停止"""
+
+
+def iter_file_chunks(extracted: Dict, splitter: TextSplitter) -> Iterator[Tuple[str, Dict]]:
+    """
+    将提取出的文件内容流式切分为文本块
+    PDF按页切分，元数据中保留页码，偏移量相对于所在页
+
+    Args:
+        extracted: extract_file 的返回结果
+        splitter: 文本分块器
+
+    Yields:
+        (文本块, 元数据)
+    """
+    file_path = Path(extracted["file_path"])
+    chunk_index = 0
+
+    for page_number, content in extracted["pages"]:
+        if not content or not content.strip():
+            continue
+        for chunk in splitter.split(content):
+            metadata = {
+                "source": file_path.name,
+                "file_type": extracted["file_type"],
+                "file_path": str(file_path),
+                "chunk_index": chunk_index,
+                "start_offset": chunk["start"],
+                "end_offset": chunk["end"]
+            }
+            if page_number is not None:
+                metadata["page"] = page_number
+            yield chunk["text"], metadata
+            chunk_index += 1
+
+
+def load_manifest(rag_agent, knowledge_base: str = None) -> IngestManifest:
+    """加载知识库对应的导入清单（每个collection一个清单文件）"""
+    collection_name = rag_agent.get_collection_name(knowledge_base)
+    manifest_path = os.path.join(rag_agent.config.ingest_manifest_dir, f"{collection_name}.json")
+    return IngestManifest(manifest_path)
+
+
+def load_checkpoint(manifest: IngestManifest) -> IngestCheckpoint:
+    """加载与导入清单对应的检查点"""
+    return IngestCheckpoint(str(Path(manifest.path).with_suffix(".checkpoint.json")))
+
+
+def new_ingest_stats() -> Dict[str, int]:
+    """创建空的导入统计"""
+    return {
+        "added_files": 0,
+        "updated_files": 0,
+        "unchanged_files": 0,
+        "deleted_files": 0,
+        "failed_files": 0,
+        "embedded_chunks": 0,
+        "deleted_points": 0,
+        "duplicate_chunks": 0,
+        "duplicate_bytes": 0
+    }
+
+
+class IngestionPipeline:
+    """增量、流式的知识库导入管道"""
+
+    def __init__(self, rag_agent, splitter: TextSplitter, workers: int = 1,
+                 queue_size: int = None, batch_size: int = None,
+                 dedup: Optional[NearDuplicateFilter] = None, bulk_load: bool = True):
+        """
+        Args:
+            rag_agent: RAG智能体
+            splitter: 文本分块器
+            workers: 并行提取文件内容的进程数
+            queue_size: 阶段间队列的最大批次数
+            batch_size: 每个向量化批次的文本块数量，默认为单次请求条数×最大并发数
+            dedup: 近似重复过滤器，跨知识库去重时多个管道共用同一个过滤器；None表示不去重
+            bulk_load: 是否以批量导入方式写入（导入期间暂停向量索引构建）
+        """
+        config = rag_agent.config
+        self.rag_agent = rag_agent
+        self.splitter = splitter
+        self.workers = workers
+        self.dedup = dedup
+        self.bulk_load = bulk_load
+        self.write_size = config.bulk_write_size
+        self.queue_size = queue_size or config.ingest_queue_size
+        self.batch_size = batch_size or config.embedding_batch_size * config.embedding_max_concurrency
+        self.checkpoint_interval = config.ingest_checkpoint_interval
+        self._last_manifest_save = 0.0
+
+    def run(self, folder_path: str, knowledge_base: str = None, force: bool = False,
+            resume: bool = False) -> Dict[str, int]:
+        """
+        增量导入文件夹中的文档
+
+        只有新增或内容发生变化的文件会被重新读取和向量化，
+        已修改文件的过期向量和已删除文件的向量会被移除
+
+        Args:
+            folder_path: 文件夹路径
+            knowledge_base: 目标知识库名称，None表示默认知识库
+            force: 是否忽略清单强制重新导入所有文件
+            resume: 是否从上次中断时的检查点继续
+
+        Returns:
+            dict: 导入统计
+        """
+        stats = new_ingest_stats()
+        if not os.path.exists(folder_path):
+            print(f"❌ 文件夹不存在: {folder_path}")
+            return stats
+
+        print(f"📂 正在扫描文件夹: {folder_path}")
+
+        manifest = load_manifest(self.rag_agent, knowledge_base)
+        checkpoint = load_checkpoint(manifest)
+        collection_name = self.rag_agent.get_collection_name(knowledge_base)
+        seen_keys = set()
+        self._last_manifest_save = time.monotonic()
+
+        if resume and checkpoint.files:
+            finished = checkpoint.pop_finished()
+            for file_key, entry in finished.items():
+                manifest.set_entry(file_key, entry)
+            print(f"♻️  从检查点继续: {len(finished)} 个已完成文件, {len(checkpoint.files)} 个未完成文件")
+
+        if self.dedup:
+            self.dedup.seed(manifest.path, collection_name, manifest.files, is_current=self._is_file_current)
+
+        stop_event = threading.Event()
+        errors = []
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        upsert_queue = queue.Queue(maxsize=self.queue_size)
+
+        producer = threading.Thread(
+            target=self._run_stage,
+            args=(self._produce, embed_queue, stop_event, errors,
+                  folder_path, manifest, checkpoint, collection_name, force, resume, seen_keys, stats),
+            name="ingest-read",
+            daemon=True
+        )
+        embedder = threading.Thread(
+            target=self._run_stage,
+            args=(self._embed, upsert_queue, stop_event, errors, embed_queue, stop_event),
+            name="ingest-embed",
+            daemon=True
+        )
+        producer.start()
+        embedder.start()
+
+        try:
+            with self.rag_agent.bulk_load(knowledge_base) if self.bulk_load else nullcontext():
+                self._consume(upsert_queue, embedder, stop_event, manifest, checkpoint, knowledge_base, stats)
+        finally:
+            stop_event.set()
+            producer.join()
+            embedder.join()
+
+        if errors:
+            self._save_progress(manifest, checkpoint)
+            raise errors[0]
+
+        self._remove_deleted_files(folder_path, manifest, checkpoint, seen_keys, knowledge_base, stats)
+        self._save_progress(manifest, checkpoint)
+        return stats
+
+    @staticmethod
+    def _is_file_current(file_key: str, entry: Dict) -> bool:
+        """文件仍存在且大小、修改时间与清单记录一致"""
+        try:
+            file_stat = os.stat(file_key)
+        except OSError:
+            return False
+        return file_stat.st_size == entry["size"] and file_stat.st_mtime == entry["mtime"]
+
+    def _invalidate_dependents(self, point_ids: Iterable[str], manifest: IngestManifest):
+        """删除文本块后，因与其重复而被丢弃文本块的文件需要在下次导入时重新处理"""
+        if not self.dedup:
+            return
+        for manifest_path, file_key in self.dedup.remove(point_ids):
+            target = manifest if manifest_path == manifest.path else IngestManifest(manifest_path)
+            if not target.get(file_key):
+                continue
+            target.invalidate(file_key)
+            if target is not manifest:
+                target.save()
+            print(f"  ⚠️  {file_key} 中的重复文本块所依赖的内容已删除，将在下次导入时重新处理")
+
+    def _save_progress(self, manifest: IngestManifest, checkpoint: IngestCheckpoint):
+        """保存导入清单，已完成的文件随之从检查点中移除"""
+        manifest.save()
+        checkpoint.pop_finished()
+        checkpoint.save()
+        self._last_manifest_save = time.monotonic()
+
+    def _maybe_save_progress(self, manifest: IngestManifest, checkpoint: IngestCheckpoint):
+        """清单较大时每次保存代价较高，按时间间隔保存，间隔内的进度由检查点记录"""
+        if time.monotonic() - self._last_manifest_save >= self.checkpoint_interval:
+            self._save_progress(manifest, checkpoint)
+        else:
+            checkpoint.save()
+
+    @staticmethod
+    def _put(out_queue: queue.Queue, item, stop_event: threading.Event):
+        """向下游队列放入数据，队列满时阻塞，管道停止时抛出异常"""
+        while True:
+            if stop_event.is_set():
+                raise _PipelineStopped()
+            try:
+                out_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    @staticmethod
+    def _put_done(out_queue: queue.Queue, stop_event: threading.Event):
+        """
+        向下游发送结束标记，管道停止时也必须送达，否则下游会一直等待
+
+        管道停止后下游可能已不再读取，队列满时丢弃队列中的数据腾出位置
+        """
+        while True:
+            try:
+                out_queue.put(_DONE, timeout=0.5)
+                return
+            except queue.Full:
+                if stop_event.is_set():
+                    try:
+                        out_queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _run_stage(self, stage, out_queue: queue.Queue, stop_event: threading.Event, errors: list, *args):
+        """运行一个管道阶段，结束（或出错）时向下游发送结束标记"""
+        try:
+            stage(lambda item: self._put(out_queue, item, stop_event), *args)
+        except _PipelineStopped:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+        finally:
+            self._put_done(out_queue, stop_event)
+
+    def _produce(self, put, folder_path: str, manifest: IngestManifest, checkpoint: IngestCheckpoint,
+                 collection_name: str, force: bool, resume: bool, seen_keys: set, stats: Dict[str, int]):
+        """发现、读取、分块阶段：按批次输出待向量化的文本块，文件全部分块输出后再输出完成标记"""
+        tasks = {}
+        buffer = []
+        finished = []
+
+        def flush():
+            if buffer:
+                put(("chunks", list(buffer)))
+                buffer.clear()
+            for task in finished:
+                put(("file_done", task))
+            finished.clear()
+
+        def discover():
+            for file_path in list_supported_files(folder_path):
+                file_key = normalize_file_key(str(file_path))
+                seen_keys.add(file_key)
+                file_stat = file_path.stat()
+                entry = manifest.get(file_key)
+
+                # 大小和修改时间未变化，直接跳过，无需读取文件
+                if not force and manifest.is_unchanged(file_key, file_stat.st_size, file_stat.st_mtime):
+                    stats["unchanged_files"] += 1
+                    continue
+
+                content_hash = compute_file_hash(str(file_path))
+                imported_ids = set(entry["point_ids"]) if entry else set()
+                task = {
+                    "file_key": file_key,
+                    "name": file_path.name,
+                    "size": file_stat.st_size,
+                    "mtime": file_stat.st_mtime,
+                    "content_hash": content_hash,
+                    # 清单和检查点中记录的所有已写入的点，导入完成后不再需要的会被移除
+                    "old_ids": imported_ids | checkpoint.point_ids(file_key),
+                    # 已在向量库中、无需重新向量化的点
+                    "skip_ids": set() if force else (
+                        imported_ids | (checkpoint.resumable_ids(file_key, content_hash) if resume else set())
+                    ),
+                    "is_new": entry is None,
+                    "embedded": 0
+                }
+
+                # 修改时间变化但内容未变化，只更新清单
+                if not force and entry and entry["content_hash"] == task["content_hash"]:
+                    task["point_ids"] = entry["point_ids"]
+                    task["fingerprints"] = entry.get("fingerprints")
+                    task["duplicate_of"] = entry.get("duplicate_of", [])
+                    task["unchanged"] = True
+                    if self.dedup and task["fingerprints"]:
+                        source = (manifest.path, file_key, content_hash)
+                        for point_id, fingerprint in zip(task["point_ids"], task["fingerprints"]):
+                            self.dedup.add(collection_name, point_id, int(fingerprint, 16), source)
+                    finished.append(task)
+                    continue
+
+                tasks[str(file_path)] = task
+                yield str(file_path)
+
+        for extracted in iter_extracted_files(discover(), workers=self.workers):
+            task = tasks.pop(extracted["file_path"])
+            if extracted.get("error"):
+                # 读取失败与内容为空不同：保留已导入的向量，不更新清单，下次运行时重试
+                task["read_error"] = extracted["error"]
+                finished.append(task)
+                continue
+            task["point_ids"] = []
+            task["fingerprints"] = [] if self.dedup else None
+            task["duplicate_of"] = []
+            task["duplicate_chunks"] = 0
+            task["duplicate_bytes"] = 0
+            source = (manifest.path, task["file_key"], task["content_hash"])
+            for text, metadata in iter_file_chunks(extracted, self.splitter):
+                point_id = make_point_id(collection_name, task["file_key"], metadata["chunk_index"], text)
+
+                if self.dedup:
+                    fingerprint = simhash(text)
+                    # 已在库中的文本块保留；新文本块与已保留的文本块近似重复时丢弃
+                    if point_id not in task["skip_ids"]:
+                        duplicate_of = self.dedup.find(collection_name, fingerprint, source)
+                        if duplicate_of:
+                            self.dedup.record_duplicate(duplicate_of, manifest.path, task["file_key"], text)
+                            task["duplicate_of"].append(duplicate_of)
+                            task["duplicate_chunks"] += 1
+                            task["duplicate_bytes"] += len(text.encode('utf-8'))
+                            continue
+                    self.dedup.add(collection_name, point_id, fingerprint, source)
+                    task["fingerprints"].append(f"{fingerprint:016x}")
+
+                task["point_ids"].append(point_id)
+
+                # 位置和内容都未变化的文本块已在库中，无需重新向量化
+                if point_id not in task["skip_ids"]:
+                    buffer.append({
+                        "file_key": task["file_key"],
+                        "content_hash": task["content_hash"],
+                        "id": point_id,
+                        "text": text,
+                        "metadata": metadata
+                    })
+                    task["embedded"] += 1
+                    if len(buffer) >= self.batch_size:
+                        flush()
+
+            finished.append(task)
+            if len(finished) >= self.batch_size:
+                flush()
+
+        flush()
+
+    def _embed(self, put, in_queue: queue.Queue, stop_event: threading.Event):
+        """向量化阶段：向量化失败的批次会把所属文件标记为失败"""
+        while True:
+            if stop_event.is_set():
+                raise _PipelineStopped()
+            try:
+                item = in_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            if item[0] != "chunks":
+                put(item)
+                continue
+
+            records = item[1]
+            try:
+                vectors = self.rag_agent.embedding_batcher.embed([record["text"] for record in records])
+                put(("points", records, vectors))
+            except _PipelineStopped:
+                raise
+            except Exception as e:
+                print(f"    ✗ 向量化失败: {e}")
+                put(("failed", {record["file_key"] for record in records}))
+
+    def _consume(self, in_queue: queue.Queue, upstream: threading.Thread, stop_event: threading.Event,
+                 manifest: IngestManifest, checkpoint: IngestCheckpoint, knowledge_base: str, stats: Dict[str, int]):
+        """写入阶段：攒批写入向量，文件完成后移除过期向量并更新清单；上游出错停止时写入已到达的点后退出"""
+        failed_files = set()
+        # 待写入的点，以及点已全部到达、等待写入后更新清单的文件
+        pending_records, pending_vectors, pending_files = [], [], []
+
+        def flush():
+            keep = [i for i, record in enumerate(pending_records) if record["file_key"] not in failed_files]
+            records = [pending_records[i] for i in keep]
+            vectors = [pending_vectors[i] for i in keep]
+            pending_records.clear()
+            pending_vectors.clear()
+            if records:
+                if self.rag_agent.add_embeddings(
+                    [record["text"] for record in records],
+                    vectors,
+                    [record["metadata"] for record in records],
+                    knowledge_base=knowledge_base,
+                    ids=[record["id"] for record in records]
+                ):
+                    self._checkpoint_batch(checkpoint, records)
+                else:
+                    failed_files.update(record["file_key"] for record in records)
+            for task in pending_files:
+                self._finish_file(task, failed_files, manifest, checkpoint, knowledge_base, stats)
+            pending_files.clear()
+
+        while not stop_event.is_set():
+            # 上游暂时没有数据时先写入已攒的点，避免向量在内存中滞留
+            if (pending_records or pending_files) and in_queue.empty():
+                flush()
+            try:
+                item = in_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not upstream.is_alive():
+                    break
+                continue
+            if item is _DONE:
+                break
+
+            kind = item[0]
+            if kind == "points":
+                pending_records.extend(item[1])
+                pending_vectors.extend(item[2])
+                if len(pending_records) >= self.write_size:
+                    flush()
+            elif kind == "failed":
+                failed_files.update(item[1])
+            elif kind == "file_done":
+                # 文件的所有文本块写入后才能更新清单
+                pending_files.append(item[1])
+        flush()
+
+    @staticmethod
+    def _checkpoint_batch(checkpoint: IngestCheckpoint, records: list):
+        """把已写入的文本块按文件记录到检查点"""
+        by_file = {}
+        for record in records:
+            by_file.setdefault((record["file_key"], record["content_hash"]), []).append(record["id"])
+        for (file_key, content_hash), point_ids in by_file.items():
+            checkpoint.mark_batch(file_key, content_hash, point_ids)
+        checkpoint.save()
+
+    def _finish_file(self, task: Dict, failed_files: set, manifest: IngestManifest,
+                     checkpoint: IngestCheckpoint, knowledge_base: str, stats: Dict[str, int]):
+        """文件的所有文本块写入后：移除过期向量并记录到清单"""
+        file_key = task["file_key"]
+        if task.get("unchanged"):
+            manifest.update(file_key, task["size"], task["mtime"], task["content_hash"], task["point_ids"],
+                            task["fingerprints"], task["duplicate_of"])
+            self._check_invalidated(manifest, file_key)
+            stats["unchanged_files"] += 1
+            return
+
+        if task.get("read_error"):
+            print(f"  ✗ {task['name']}: 读取失败，保留已导入的内容，下次运行时将重试: {task['read_error']}")
+            stats["failed_files"] += 1
+            return
+
+        # 失败文件已写入的部分保留在检查点中，下次 --resume 时无需重新向量化
+        if file_key in failed_files:
+            print(f"  ✗ {task['name']}: 导入失败，下次运行时将重试")
+            stats["failed_files"] += 1
+            # 未成功写入的文本块不能作为去重依据
+            self._invalidate_dependents(set(task["point_ids"]) - task["skip_ids"], manifest)
+            return
+
+        # 内容为空且未导入过，不记录到清单，下次运行时会重新尝试读取（已导入过的文件内容清空时移除其向量）
+        if not task["point_ids"] and task["is_new"]:
+            print(f"  ✗ {task['name']}: 文件内容为空")
+            stats["failed_files"] += 1
+            return
+
+        stale_ids = list(task["old_ids"] - set(task["point_ids"]))
+        if stale_ids and self.rag_agent.delete_documents(stale_ids, knowledge_base=knowledge_base):
+            stats["deleted_points"] += len(stale_ids)
+            self._invalidate_dependents(stale_ids, manifest)
+
+        manifest.update(file_key, task["size"], task["mtime"], task["content_hash"], task["point_ids"],
+                        task["fingerprints"], task["duplicate_of"])
+        self._check_invalidated(manifest, file_key)
+        checkpoint.mark_finished(file_key, manifest.get(file_key))
+        self._maybe_save_progress(manifest, checkpoint)
+        stats["embedded_chunks"] += task["embedded"]
+        stats["duplicate_chunks"] += task["duplicate_chunks"]
+        stats["duplicate_bytes"] += task["duplicate_bytes"]
+        stats["added_files" if task["is_new"] else "updated_files"] += 1
+        duplicate_info = f", 去重丢弃 {task['duplicate_chunks']} 个" if task["duplicate_chunks"] else ""
+        print(f"  ✓ {task['name']}: {len(task['point_ids'])} 个分块, "
+              f"新向量化 {task['embedded']} 个, 移除过期向量 {len(stale_ids)} 个{duplicate_info}")
+
+    def _check_invalidated(self, manifest: IngestManifest, file_key: str):
+        """本次导入过程中所依赖的文本块已被删除的文件，记录为需要重新处理"""
+        if self.dedup and (manifest.path, file_key) in self.dedup.invalidated:
+            manifest.invalidate(file_key)
+
+    def _remove_deleted_files(self, folder_path: str, manifest: IngestManifest, checkpoint: IngestCheckpoint,
+                              seen_keys: set, knowledge_base: str, stats: Dict[str, int]):
+        """清理已删除文件的向量（包括中断时只导入了一部分的文件）"""
+        folder_key = normalize_file_key(folder_path)
+        checkpoint_keys = [key for key in checkpoint.files if Path(key).parent.as_posix() == folder_key]
+        for file_key in set(manifest.file_keys_in(folder_path)) | set(checkpoint_keys):
+            if file_key in seen_keys:
+                continue
+            entry = manifest.get(file_key)
+            point_ids = (set(entry["point_ids"]) if entry else set()) | checkpoint.point_ids(file_key)
+            if self.rag_agent.delete_documents(list(point_ids), knowledge_base=knowledge_base):
+                manifest.remove(file_key)
+                checkpoint.remove(file_key)
+                self._invalidate_dependents(point_ids, manifest)
+                stats["deleted_files"] += 1
+                stats["deleted_points"] += len(point_ids)
+                print(f"  🗑️  文件已删除，移除 {len(point_ids)} 个向量: {file_key}")
@@ -0,0 +1,93 @@
+"""
+文本分块工具 - 按句子边界切分长文本，支持中文标点
+"""
+import re
+from typing import Dict, Iterator, Tuple
+
+# 句子边界：中英文句末标点（可带后引号/括号）或换行
+_SENTENCE_BOUNDARY = re.compile(
+    r'(?:[。！？!?；;]+|…+|\.(?=\s))[”’"\'」』）)\]]*\s*|\n+'
+)
+
+
+class TextSplitter:
+    """句子感知的文本分块器"""
+
+    def __init__(self, chunk_size: int = 512, chunk_overlap: int = 50):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size 必须大于0")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap 必须在 [0, chunk_size) 范围内")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split(self, text: str) -> Iterator[Dict]:
+        """
+        流式切分文本
+
+        Args:
+            text: 原始文本
+
+        Yields:
+            分块字典: {"text": 分块内容, "start": 起始偏移, "end": 结束偏移, "index": 分块序号}
+        """
+        index = 0
+        chunk_start = None
+        chunk_end = None
+        boundaries = []  # 当前分块内各句子的结束位置（即下一句的起始位置）
+
+        for start, end in self._iter_sentence_spans(text):
+            if chunk_start is None:
+                chunk_start = start
+
+            if chunk_end is not None and end - chunk_start > self.chunk_size:
+                chunk = self._make_chunk(text, chunk_start, chunk_end, index)
+                if chunk:
+                    yield chunk
+                    index += 1
+
+                # 重叠部分优先从句子边界开始，找不到时退化为按字符重叠（不早于上一个分块的起点）
+                candidates = [b for b in boundaries if b < chunk_end and chunk_end - b <= self.chunk_overlap]
+                chunk_start = min(candidates) if candidates else max(chunk_start, chunk_end - self.chunk_overlap)
+                boundaries = [b for b in boundaries if b >= chunk_start]
+
+            boundaries.append(end)
+            chunk_end = end
+
+        if chunk_start is not None:
+            chunk = self._make_chunk(text, chunk_start, chunk_end, index)
+            if chunk:
+                yield chunk
+
+    def _iter_sentence_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """按句子边界切出连续的区间，超长句子再按固定长度切开"""
+        pos = 0
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            if match.end() > pos:
+                yield from self._split_long_span(pos, match.end())
+                pos = match.end()
+        if pos < len(text):
+            yield from self._split_long_span(pos, len(text))
+
+    def _split_long_span(self, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """将超过分块容量的句子切成多段，保证加上重叠部分后不超过chunk_size"""
+        step = self.chunk_size - self.chunk_overlap
+        while end - start > step:
+            yield start, start + step
+            start += step
+        yield start, end
+
+    @staticmethod
+    def _make_chunk(text: str, start: int, end: int, index: int) -> Dict:
+        """去除首尾空白并修正偏移量，空白分块返回None"""
+        raw = text[start:end]
+        stripped = raw.strip()
+        if not stripped:
+            return None
+        start += len(raw) - len(raw.lstrip())
+        return {
+            "text": stripped,
+            "start": start,
+            "end": start + len(stripped),
+            "index": index
+        }
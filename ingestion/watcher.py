@@ -0,0 +1,125 @@
+"""
+知识库文件夹监听 - 轮询知识库文件夹，文件变化稳定后增量导入对应的知识库
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .dedup import NearDuplicateFilter
+from .extractor import list_supported_files
+from .pipeline import IngestionPipeline
+from .text_splitter import TextSplitter
+
+
+def snapshot_folder(folder_path: str) -> Dict[str, Tuple[int, float]]:
+    """获取文件夹中所有支持文件的 {文件名: (大小, 修改时间)}"""
+    snapshot = {}
+    for file_path in list_supported_files(folder_path):
+        try:
+            file_stat = file_path.stat()
+        except OSError:
+            # 扫描过程中被删除
+            continue
+        snapshot[file_path.name] = (file_stat.st_size, file_stat.st_mtime)
+    return snapshot
+
+
+class KnowledgeBaseWatcher:
+    """知识库文件夹监听器，每个子文件夹代表一个知识库"""
+
+    def __init__(self, rag_agent, base_folder: str, splitter: TextSplitter,
+                 interval: float = 2.0, settle_seconds: float = 1.0, workers: int = 1,
+                 dedup: Optional[NearDuplicateFilter] = None):
+        """
+        Args:
+            rag_agent: RAG智能体
+            base_folder: 知识库基础文件夹
+            splitter: 文本分块器
+            interval: 轮询间隔（秒）
+            settle_seconds: 文件夹内容保持不变多久后才导入，避免导入正在写入的文件
+            workers: 并行提取文件内容的进程数
+            dedup: 近似重复过滤器，在多次导入之间共用；None表示不去重
+        """
+        self.rag_agent = rag_agent
+        self.base_folder = base_folder
+        self.splitter = splitter
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.workers = workers
+        self.dedup = dedup
+        # 每个知识库文件夹上次导入时的快照，以及尚未导入的变化 {文件夹: (快照, 发现时间)}
+        self._ingested: Dict[str, Dict] = {}
+        self._changed: Dict[str, Tuple[Dict, float]] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _kb_folders(self):
+        if not os.path.isdir(self.base_folder):
+            return []
+        return sorted(p for p in Path(self.base_folder).iterdir() if p.is_dir())
+
+    def _knowledge_base_for(self, kb_folder: Path) -> Optional[str]:
+        """文件夹名对应的知识库，未配置的知识库导入到默认知识库"""
+        return kb_folder.name if kb_folder.name in self.rag_agent.vectorstores else None
+
+    def ingest(self, kb_folder: Path, snapshot: Dict) -> Optional[Dict[str, int]]:
+        """增量导入一个知识库文件夹，所有文件都导入成功后记录快照"""
+        knowledge_base = self._knowledge_base_for(kb_folder)
+        print(f"🔄 正在增量导入知识库文件夹: {kb_folder.name}")
+        try:
+            # 小批量更新不暂停索引构建，避免影响正在运行的检索
+            pipeline = IngestionPipeline(self.rag_agent, self.splitter, workers=self.workers,
+                                         dedup=self.dedup, bulk_load=False)
+            stats = pipeline.run(str(kb_folder), knowledge_base=knowledge_base)
+        except Exception as e:
+            print(f"❌ 知识库 {kb_folder.name} 导入失败，稍后重试: {e}")
+            return None
+        # 有文件导入失败时不记录快照，下次检查时重试（否则文件不再变化就永远不会重试）
+        if not stats["failed_files"]:
+            self._ingested[str(kb_folder)] = snapshot
+        print(f"✅ 知识库 {kb_folder.name} 已更新: 新增 {stats['added_files']}, 更新 {stats['updated_files']}, "
+              f"删除 {stats['deleted_files']}, 失败 {stats['failed_files']}")
+        return stats
+
+    def poll_once(self, now: float = None):
+        """检查一次所有知识库文件夹，导入内容已稳定的变化"""
+        now = time.monotonic() if now is None else now
+        for kb_folder in self._kb_folders():
+            key = str(kb_folder)
+            snapshot = snapshot_folder(key)
+            if snapshot == self._ingested.get(key):
+                self._changed.pop(key, None)
+                continue
+            pending = self._changed.get(key)
+            if pending is None or pending[0] != snapshot:
+                # 新的变化，等待文件写入完成
+                self._changed[key] = (snapshot, now)
+                continue
+            if now - pending[1] >= self.settle_seconds:
+                del self._changed[key]
+                self.ingest(kb_folder, snapshot)
+
+    def run(self):
+        """持续轮询，直到调用 stop()"""
+        print(f"👀 开始监听知识库文件夹: {self.base_folder} (每 {self.interval:g} 秒检查一次)")
+        # 启动时先做一次增量导入，补上未监听期间的变化
+        for kb_folder in self._kb_folders():
+            self.ingest(kb_folder, snapshot_folder(str(kb_folder)))
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"❌ 检查知识库文件夹失败: {e}")
+
+    def start(self):
+        """在后台线程中监听"""
+        self._thread = threading.Thread(target=self.run, name="kb-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监听"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
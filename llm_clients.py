@@ -0,0 +1,178 @@
+"""
+LLM客户端注册表 - 进程内所有智能体共用LLM和向量化客户端及其HTTP连接池
+
+openai 传输方式（默认）通过百炼的OpenAI兼容接口调用，所有模型实例共用一个保持长连接的httpx连接池，
+不同用途只是温度、top_p等参数不同；dashscope 传输方式使用DashScope SDK（每次请求新建连接），
+只共享模型实例；两种方式下同时进行的相同请求都会合并为一次上游调用，合并后的请求再经过共享的供应商限流
+"""
+import threading
+from typing import Dict, Optional
+
+import httpx
+
+from llm_coalescing import CoalescingChatModel, CoalescingEmbeddings, SingleFlight
+from llm_limiter import LimitedChatModel, LimitedEmbeddings, ProviderLimiter
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+class ClientRegistry:
+    """按模型和参数缓存LLM/向量化客户端，共用同一组HTTP连接池"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: LLMClientConfig
+        """
+        self.config = config
+        self._chat_models: Dict[tuple, object] = {}
+        self._embeddings: Dict[tuple, object] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._async_http_client: Optional[httpx.AsyncClient] = None
+        self.single_flight = SingleFlight()
+        self.limiter = ProviderLimiter(
+            max_in_flight=config.max_in_flight,
+            requests_per_second=config.requests_per_second,
+            tokens_per_minute=config.tokens_per_minute,
+            max_queue=config.max_queue,
+            queue_timeout=config.queue_timeout,
+            background_queue_timeout=config.background_queue_timeout
+        )
+        self._lock = threading.Lock()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.config.max_connections,
+            max_keepalive_connections=self.config.max_keepalive_connections,
+            keepalive_expiry=self.config.keepalive_expiry
+        )
+
+    def _get_http_clients(self):
+        """共享的同步/异步HTTP客户端（调用方持有锁）"""
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=self._limits(), timeout=self.config.timeout)
+            self._async_http_client = httpx.AsyncClient(limits=self._limits(), timeout=self.config.timeout)
+        return self._http_client, self._async_http_client
+
+    def get_chat_model(self, model_name: str, temperature: float, top_p: float):
+        """
+        获取对话模型，相同模型和参数的调用方共用同一个实例
+
+        Args:
+            model_name: 模型名称
+            temperature: 温度
+            top_p: 核采样概率
+        """
+        key = (model_name, temperature, top_p)
+        with self._lock:
+            llm = self._chat_models.get(key)
+            if llm is None:
+                if self.config.transport == "dashscope":
+                    from langchain_community.chat_models.tongyi import ChatTongyi
+                    llm = ChatTongyi(
+                        model=model_name,
+                        dashscope_api_key=self.config.api_key,
+                        temperature=temperature,
+                        top_p=top_p
+                    )
+                else:
+                    from langchain_openai import ChatOpenAI
+                    http_client, async_http_client = self._get_http_clients()
+                    llm = ChatOpenAI(
+                        model=model_name,
+                        api_key=self.config.api_key,
+                        base_url=self.config.base_url,
+                        temperature=temperature,
+                        top_p=top_p,
+                        timeout=self.config.timeout,
+                        max_retries=self.config.max_retries,
+                        http_client=http_client,
+                        http_async_client=async_http_client
+                    )
+                llm = LimitedChatModel(llm, self.limiter, self.config.completion_token_estimate)
+                if self.config.coalesce_requests:
+                    llm = CoalescingChatModel(llm, key, self.single_flight)
+                self._chat_models[key] = llm
+            return llm
+
+    def get_embeddings(self, model_name: str, batch_size: int = 25):
+        """
+        获取向量化模型，进程内共用（CLI每条命令重新创建RAG智能体时也不会新建客户端）
+
+        Args:
+            model_name: 向量模型名称
+            batch_size: 单次请求的最大文本数
+        """
+        key = (model_name, batch_size)
+        with self._lock:
+            embeddings = self._embeddings.get(key)
+            if embeddings is None:
+                if self.config.transport == "dashscope":
+                    from langchain_community.embeddings import DashScopeEmbeddings
+                    embeddings = DashScopeEmbeddings(model=model_name, dashscope_api_key=self.config.api_key)
+                else:
+                    from langchain_openai import OpenAIEmbeddings
+                    http_client, async_http_client = self._get_http_clients()
+                    embeddings = OpenAIEmbeddings(
+                        model=model_name,
+                        api_key=self.config.api_key,
+                        base_url=self.config.base_url,
+                        chunk_size=batch_size,
+                        # 兼容接口只接受原始文本和float格式的向量
+                        check_embedding_ctx_length=False,
+                        model_kwargs={"encoding_format": "float"},
+                        timeout=self.config.timeout,
+                        max_retries=self.config.max_retries,
+                        http_client=http_client,
+                        http_async_client=async_http_client
+                    )
+                embeddings = LimitedEmbeddings(embeddings, self.limiter)
+                if self.config.coalesce_requests:
+                    embeddings = CoalescingEmbeddings(embeddings, key, self.single_flight)
+                self._embeddings[key] = embeddings
+            return embeddings
+
+    async def aclose(self):
+        """关闭HTTP连接池（Web服务关闭时调用）"""
+        with self._lock:
+            http_client, async_http_client = self._http_client, self._async_http_client
+            self._http_client = self._async_http_client = None
+            self._chat_models.clear()
+            self._embeddings.clear()
+        if http_client is not None:
+            http_client.close()
+            await async_http_client.aclose()
+
+    def get_stats(self) -> Dict:
+        """获取客户端统计"""
+        return {
+            "transport": self.config.transport,
+            "chat_models": len(self._chat_models),
+            "embeddings": len(self._embeddings),
+            "max_connections": self.config.max_connections if self.config.transport != "dashscope" else None,
+            "coalescing": self.single_flight.get_stats() if self.config.coalesce_requests else None,
+            "limiter": self.limiter.get_stats()
+        }
+
+
+def get_client_registry() -> ClientRegistry:
+    """获取进程内共享的客户端注册表（首次使用时创建）"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                # config.py 在创建各配置时导入本模块，这里延迟导入避免循环依赖
+                from config import LLMClientConfig
+                _registry = ClientRegistry(LLMClientConfig())
+    return _registry
+
+
+def get_chat_model(model_name: str, temperature: float, top_p: float):
+    """获取共享的对话模型"""
+    return get_client_registry().get_chat_model(model_name, temperature, top_p)
+
+
+def get_embeddings(model_name: str, batch_size: int = 25):
+    """获取共享的向量化模型"""
+    return get_client_registry().get_embeddings(model_name, batch_size)
@@ -0,0 +1,220 @@
+"""
+LLM请求合并 - 同时进行的相同请求（相同模型参数 + 相同的完整提示词）只向上游发送一次，结果共享给所有调用方
+"""
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class _Call:
+    """进行中的同步请求"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _Broadcast:
+    """进行中的流式请求：已收到的片段按顺序重放给后加入的调用方"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+
+class SingleFlight:
+    """
+    按键合并进行中的调用
+
+    请求完成后立即移除，不缓存结果；失败时所有等待的调用方都收到同一个异常
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._sync_calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Task] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """同步调用：相同键的请求进行中时等待它的结果"""
+        with self._lock:
+            self.calls += 1
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync_calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = func()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._sync_calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def ado(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        异步调用：相同键的请求进行中时等待它的结果
+
+        上游请求在独立的任务中执行，发起请求的调用方被取消（如客户端断开）不会影响其他等待的调用方
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.calls += 1
+            task = self._async_calls.get(key)
+            if task is not None and task.get_loop() is loop:
+                self.coalesced += 1
+            else:
+                task = loop.create_task(factory())
+                self._async_calls[key] = task
+                task.add_done_callback(lambda finished: self._forget(self._async_calls, key, finished))
+        return await asyncio.shield(task)
+
+    async def astream(self, key: Hashable, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """流式调用：相同键的流进行中时从头重放已收到的片段，再跟随后续片段"""
+        with self._lock:
+            self.calls += 1
+            broadcast = self._streams.get(key)
+            if broadcast is None:
+                broadcast = self._streams[key] = _Broadcast()
+                asyncio.get_running_loop().create_task(self._pump(key, broadcast, factory))
+            else:
+                self.coalesced += 1
+
+        index = 0
+        while True:
+            async with broadcast.changed:
+                await broadcast.changed.wait_for(lambda: index < len(broadcast.chunks) or broadcast.finished)
+                chunks = broadcast.chunks[index:]
+                finished, error = broadcast.finished, broadcast.error
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if finished and index >= len(broadcast.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    async def _pump(self, key: Hashable, broadcast: _Broadcast, factory: Callable[[], AsyncIterator]):
+        """读取上游流并分发给所有调用方"""
+        try:
+            async for chunk in factory():
+                async with broadcast.changed:
+                    broadcast.chunks.append(chunk)
+                    broadcast.changed.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            with self._lock:
+                # 流结束后新的请求重新发起，不会重放已结束的流
+                self._streams.pop(key, None)
+            async with broadcast.changed:
+                broadcast.finished = True
+                broadcast.changed.notify_all()
+
+    def _forget(self, calls: Dict, key: Hashable, finished):
+        with self._lock:
+            if calls.get(key) is finished:
+                del calls[key]
+
+    def get_stats(self) -> Dict:
+        """获取合并统计"""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / self.calls if self.calls else 0.0
+        }
+
+
+def _prompt_key(prompt) -> Hashable:
+    """完整提示词的键（字符串提示词直接使用，消息列表使用其内容表示）"""
+    return prompt if isinstance(prompt, str) else repr(prompt)
+
+
+class CoalescingChatModel:
+    """
+    对话模型包装器：invoke / ainvoke / astream 经过请求合并，其他属性透传给底层模型
+
+    带额外参数（stop、config等）的调用不合并
+    """
+
+    def __init__(self, llm, params: tuple, single_flight: SingleFlight):
+        """
+        Args:
+            llm: LangChain对话模型
+            params: 模型参数（模型名称、温度、top_p），作为合并键的一部分
+            single_flight: 共享的请求合并器
+        """
+        self.llm = llm
+        self.params = params
+        self.single_flight = single_flight
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def invoke(self, prompt, *args, **kwargs):
+        if args or kwargs:
+            return self.llm.invoke(prompt, *args, **kwargs)
+        return self.single_flight.do(("invoke", self.params, _prompt_key(prompt)), lambda: self.llm.invoke(prompt))
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        if args or kwargs:
+            return await self.llm.ainvoke(prompt, *args, **kwargs)
+        return await self.single_flight.ado(("invoke", self.params, _prompt_key(prompt)),
+                                            lambda: self.llm.ainvoke(prompt))
+
+    async def astream(self, prompt, *args, **kwargs):
+        if args or kwargs:
+            async for chunk in self.llm.astream(prompt, *args, **kwargs):
+                yield chunk
+            return
+        async for chunk in self.single_flight.astream(("stream", self.params, _prompt_key(prompt)),
+                                                      lambda: self.llm.astream(prompt)):
+            yield chunk
+
+
+class CoalescingEmbeddings(Embeddings):
+    """向量化模型包装器：相同文本的同时请求只向上游发送一次"""
+
+    def __init__(self, embeddings: Embeddings, params: tuple, single_flight: SingleFlight):
+        """
+        Args:
+            embeddings: LangChain Embeddings对象
+            params: 模型参数（模型名称、批大小），作为合并键的一部分
+            single_flight: 共享的请求合并器
+        """
+        self.embeddings = embeddings
+        self.params = params
+        self.single_flight = single_flight
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.single_flight.do(("documents", self.params, tuple(texts)),
+                                     lambda: self.embeddings.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.single_flight.do(("query", self.params, text), lambda: self.embeddings.embed_query(text))
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.single_flight.ado(("documents", self.params, tuple(texts)),
+                                            lambda: self.embeddings.aembed_documents(texts))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.single_flight.ado(("query", self.params, text),
+                                            lambda: self.embeddings.aembed_query(text))
@@ -0,0 +1,353 @@
+"""
+LLM供应商限流 - 所有智能体的LLM和向量化调用共用的并发数、每秒请求数、每分钟token数限制
+
+超出限制的请求按优先级排队（交互式对话优先于后台导入），排队超过期限或队列已满时抛出
+ProviderOverloadedError，由Web层返回 429/503 和 Retry-After，而不是让请求一直等到超时
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# 请求优先级，数值越小越优先
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """在当前上下文（线程或异步任务）中设置LLM请求优先级"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class ProviderOverloadedError(Exception):
+    """供应商调用排队失败：队列已满（429）或排队超过期限（503）"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    """令牌桶（由限流器的锁保护），rate<=0 表示不限"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def cost(self, amount: float) -> float:
+        # 超过桶容量的请求按容量计，否则永远取不到令牌
+        return min(amount, self.capacity)
+
+    def wait_time(self, amount: float) -> float:
+        """取得 amount 个令牌还需等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        return max(0.0, (self.cost(amount) - self.tokens) / self.rate)
+
+    def take(self, amount: float):
+        if self.rate > 0:
+            self.tokens -= self.cost(amount)
+
+
+class _Waiter:
+    def __init__(self, priority: int, tokens: float, deadline: float, notify):
+        self.priority = priority
+        self.tokens = tokens
+        self.deadline = deadline
+        self.notify = notify
+        self.granted = False
+        self.abandoned = False
+
+
+class ProviderLimiter:
+    """
+    供应商限流器（线程和事件循环都可使用）
+
+    请求先按优先级、再按到达顺序排队，只有队首请求能取得额度，避免大请求被小请求饿死；
+    后台请求最多占用 background_max_in_flight 个并发，给交互式请求留出余量
+    """
+
+    def __init__(self, max_in_flight: int = 32, requests_per_second: float = 0, tokens_per_minute: float = 0,
+                 max_queue: int = 200, queue_timeout: float = 10.0, background_queue_timeout: float = 300.0,
+                 background_max_in_flight: int = None):
+        """
+        Args:
+            max_in_flight: 同时进行的最大请求数
+            requests_per_second: 每秒请求数，<=0 表示不限
+            tokens_per_minute: 每分钟token数（按提示词长度估算），<=0 表示不限
+            max_queue: 排队请求数上限，超出时立即拒绝（429）
+            queue_timeout: 交互式请求的最长排队时间（秒），超出时拒绝（503）
+            background_queue_timeout: 后台请求的最长排队时间（秒）
+            background_max_in_flight: 后台请求最多占用的并发数，默认为 max_in_flight 的一半
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        self.background_max_in_flight = max(1, background_max_in_flight or self.max_in_flight // 2)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.background_queue_timeout = background_queue_timeout
+        self._requests = _Bucket(requests_per_second, max(1.0, requests_per_second))
+        self._tokens = _Bucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self._in_flight = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._queue: List[tuple] = []
+        self._queued = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+        self.granted = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+        self.total_wait_seconds = 0.0
+
+    # ---------- 调度（调用方持有锁） ----------
+
+    def _can_start(self, waiter: _Waiter) -> bool:
+        if sum(self._in_flight.values()) >= self.max_in_flight:
+            return False
+        if waiter.priority != INTERACTIVE and self._in_flight[waiter.priority] >= self.background_max_in_flight:
+            return False
+        return self._requests.wait_time(1) <= 0 and self._tokens.wait_time(waiter.tokens) <= 0
+
+    def _dispatch(self):
+        """按顺序放行队首能开始的请求"""
+        now = time.monotonic()
+        self._requests.refill(now)
+        self._tokens.refill(now)
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.abandoned:
+                heapq.heappop(self._queue)
+                continue
+            if not self._can_start(waiter):
+                return
+            heapq.heappop(self._queue)
+            self._queued -= 1
+            self._start(waiter)
+            waiter.notify()
+
+    def _start(self, waiter: _Waiter):
+        waiter.granted = True
+        self._in_flight[waiter.priority] += 1
+        self._requests.take(1)
+        self._tokens.take(waiter.tokens)
+        self.granted += 1
+
+    def _next_wake(self) -> Optional[float]:
+        """队首请求因速率限制等待时，令牌补足所需的秒数（因并发数等待时由释放唤醒，返回None）"""
+        for _, _, waiter in self._queue:
+            if not waiter.abandoned:
+                if sum(self._in_flight.values()) >= self.max_in_flight:
+                    return None
+                return max(self._requests.wait_time(1), self._tokens.wait_time(waiter.tokens)) or None
+        return None
+
+    def _retry_after(self, tokens: float = 0) -> int:
+        """建议客户端重试的秒数：按当前排队数和放行速率、以及token额度补足所需时间估算"""
+        rate = self._requests.rate if self._requests.rate > 0 else self.max_in_flight
+        return max(1, math.ceil(max(self._queued / rate, self._tokens.wait_time(tokens))))
+
+    def _enqueue(self, tokens: float, notify) -> _Waiter:
+        priority = _priority.get()
+        timeout = self.queue_timeout if priority == INTERACTIVE else self.background_queue_timeout
+        waiter = _Waiter(priority, tokens, time.monotonic() + timeout, notify)
+        self._dispatch()
+        if not self._queue and self._can_start(waiter):
+            self._start(waiter)
+            return waiter
+        if self._queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise ProviderOverloadedError("LLM请求排队已满，请稍后重试", 429, self._retry_after(tokens))
+        heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+        self._queued += 1
+        return waiter
+
+    def _check(self, waiter: _Waiter) -> Optional[float]:
+        """
+        检查排队状态
+
+        Returns:
+            已放行返回None，否则返回本次最多等待的秒数；超过期限时抛出 ProviderOverloadedError
+        """
+        self._dispatch()
+        if waiter.granted:
+            return None
+        remaining = waiter.deadline - time.monotonic()
+        if remaining <= 0:
+            self._abandon(waiter)
+            self.rejected_deadline += 1
+            raise ProviderOverloadedError("LLM服务繁忙，排队超时", 503, self._retry_after(waiter.tokens))
+        wake = self._next_wake()
+        return min(remaining, wake) if wake else remaining
+
+    def _abandon(self, waiter: _Waiter):
+        if not waiter.abandoned:
+            waiter.abandoned = True
+            self._queued -= 1
+
+    def _cancel(self, waiter: _Waiter):
+        """排队时出错或被取消（如客户端断开）：放弃排队，已放行的额度归还"""
+        with self._lock:
+            if waiter.granted:
+                self._in_flight[waiter.priority] -= 1
+                self._dispatch()
+            else:
+                self._abandon(waiter)
+
+    def _release(self, waiter: _Waiter):
+        with self._lock:
+            self._in_flight[waiter.priority] -= 1
+            self._dispatch()
+
+    # ---------- 获取额度 ----------
+
+    @contextmanager
+    def slot(self, tokens: float = 0):
+        """同步获取一次调用的额度，调用结束后释放"""
+        event = threading.Event()
+        started_at = time.monotonic()
+        with self._lock:
+            waiter = self._enqueue(tokens, event.set)
+        try:
+            while True:
+                with self._lock:
+                    event.clear()
+                    wait = self._check(waiter)
+                if wait is None:
+                    break
+                event.wait(wait)
+        except BaseException:
+            self._cancel(waiter)
+            raise
+        with self._lock:
+            self.total_wait_seconds += time.monotonic() - started_at
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    @asynccontextmanager
+    async def aslot(self, tokens: float = 0):
+        """异步获取一次调用的额度，等待时不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        started_at = time.monotonic()
+        with self._lock:
+            waiter = self._enqueue(tokens, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while True:
+                with self._lock:
+                    event.clear()
+                    wait = self._check(waiter)
+                if wait is None:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._cancel(waiter)
+            raise
+        with self._lock:
+            self.total_wait_seconds += time.monotonic() - started_at
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def get_stats(self) -> Dict:
+        """获取限流统计"""
+        with self._lock:
+            return {
+                "in_flight": sum(self._in_flight.values()),
+                "background_in_flight": self._in_flight[BACKGROUND],
+                "queued": self._queued,
+                "granted": self.granted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_deadline": self.rejected_deadline,
+                "avg_wait_ms": self.total_wait_seconds / self.granted * 1000 if self.granted else 0.0
+            }
+
+
+def _estimate_tokens(prompt) -> float:
+    """按字符数粗略估算token数（中文约每字一个token，偏保守）"""
+    return float(len(prompt if isinstance(prompt, str) else repr(prompt)))
+
+
+class LimitedChatModel:
+    """对话模型包装器：invoke / ainvoke / astream 先取得限流额度，其他属性透传给底层模型"""
+
+    def __init__(self, llm, limiter: ProviderLimiter, completion_tokens: int = 500):
+        """
+        Args:
+            llm: LangChain对话模型
+            limiter: 共享的限流器
+            completion_tokens: 每次调用预估的输出token数，计入每分钟token数
+        """
+        self.llm = llm
+        self.limiter = limiter
+        self.completion_tokens = completion_tokens
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _cost(self, prompt) -> float:
+        return _estimate_tokens(prompt) + self.completion_tokens
+
+    def invoke(self, prompt, *args, **kwargs):
+        with self.limiter.slot(self._cost(prompt)):
+            return self.llm.invoke(prompt, *args, **kwargs)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        async with self.limiter.aslot(self._cost(prompt)):
+            return await self.llm.ainvoke(prompt, *args, **kwargs)
+
+    async def astream(self, prompt, *args, **kwargs):
+        # 流式输出期间一直占用并发额度
+        async with self.limiter.aslot(self._cost(prompt)):
+            async for chunk in self.llm.astream(prompt, *args, **kwargs):
+                yield chunk
+
+
+class LimitedEmbeddings(Embeddings):
+    """向量化模型包装器：每次请求先取得限流额度"""
+
+    def __init__(self, embeddings: Embeddings, limiter: ProviderLimiter):
+        self.embeddings = embeddings
+        self.limiter = limiter
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.limiter.slot(sum(len(text) for text in texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.limiter.slot(len(text)):
+            return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        async with self.limiter.aslot(sum(len(text) for text in texts)):
+            return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async with self.limiter.aslot(len(text)):
+            return await self.embeddings.aembed_query(text)
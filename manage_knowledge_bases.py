@@ -102,6 +102,27 @@ def search_knowledge_base(query, kb_name=None):
         import traceback
         traceback.print_exc()
 
+def rebuild_lexical_index(kb_name=None):
+    """压缩本地向量库，并从向量库重建知识库的BM25索引和路由画像"""
+    try:
+        config_manager = ConfigManager()
+        rag_agent = MedicalRAG(config_manager)
+        
+        kb_names = [kb_name] if kb_name else list(rag_agent.get_all_knowledge_bases().keys())
+        for name in kb_names:
+            if rag_agent.config.vector_backend == "local":
+                count = rag_agent.compact_vector_store(name)
+                print(f"✅ {name}: 本地向量库已压缩，回收 {count} 行")
+            count = rag_agent.rebuild_lexical_index(name)
+            print(f"✅ {name}: 已索引 {count} 个文本块")
+            count = rag_agent.rebuild_kb_profile(name)
+            print(f"✅ {name}: 已用 {count} 个文本块重建知识库路由画像")
+        
+    except Exception as e:
+        print(f"❌ 重建索引失败: {e}")
+        import traceback
+        traceback.print_exc()
+
 def main():
     parser = argparse.ArgumentParser(description="知识库管理工具")
     
@@ -119,6 +140,10 @@ def main():
     search_parser.add_argument("query", type=str, help="搜索查询")
     search_parser.add_argument("--kb", type=str, help="指定知识库名称")
     
+    # 重建BM25索引
+    index_parser = subparsers.add_parser("rebuild-index", help="压缩本地向量库，从向量库重建BM25索引和知识库路由画像")
+    index_parser.add_argument("--kb", type=str, help="指定知识库名称")
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -131,6 +156,8 @@ def main():
         show_knowledge_base_stats(args.kb if hasattr(args, 'kb') else None)
     elif args.command == "search":
         search_knowledge_base(args.query, args.kb if hasattr(args, 'kb') else None)
+    elif args.command == "rebuild-index":
+        rebuild_lexical_index(args.kb)
     
     print("\n💡 使用示例:")
     print("  1. 列出所有知识库:")
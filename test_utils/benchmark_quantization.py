@@ -0,0 +1,164 @@
+"""
+向量量化基准测试 - 比较本地向量库int8量化+精排与float32暴力检索/HNSW的召回率、延迟和内存占用（含实测RSS）
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import numpy as np
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.rag_agent.local_vector_store import LocalCollection
+
+
+def make_vectors(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """生成带聚类结构的随机向量，近似真实文本向量的分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_collection(path: str, dim: int, vectors: np.ndarray, quantization: str, index_type: str,
+                    hnsw_min_points: int):
+    collection = LocalCollection(path, dim, index_type=index_type, hnsw_min_points=hnsw_min_points,
+                                 quantization=quantization)
+    batch_size = 10000
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        collection.upsert([str(i) for i in range(start, start + len(batch))], batch, [{} for _ in batch])
+    collection.close()
+
+
+def process_memory() -> Optional[Dict[str, int]]:
+    """当前进程的常驻内存（字节）：VmRSS 及其中的匿名内存 RssAnon，读取 /proc/self/status，非Linux返回None"""
+    memory = {}
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                key = line.split(":")[0]
+                if key in ("VmRSS", "RssAnon"):
+                    memory[key] = int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return memory if len(memory) == 2 else None
+
+
+def run_queries(path: str, dim: int, queries: np.ndarray, k: int, quantization: str, index_type: str,
+                hnsw_min_points: int, oversampling: float):
+    """在子进程中打开collection并检索，返回结果、平均延迟和打开+检索带来的常驻内存增量"""
+    memory_before = process_memory()
+    collection = LocalCollection(path, dim, index_type=index_type, hnsw_min_points=hnsw_min_points,
+                                 quantization=quantization, oversampling=oversampling)
+    results, started_at = [], time.perf_counter()
+    for query in queries:
+        results.append([point_id for point_id, _ in collection.search(query, k)])
+    latency = (time.perf_counter() - started_at) * 1000 / len(queries)
+    memory_after = process_memory()
+    uses_hnsw = collection.hnsw is not None
+    collection.close()
+    rss = None
+    if memory_before and memory_after:
+        rss = {key: memory_after[key] - memory_before[key] for key in memory_before}
+    return results, latency, rss, uses_hnsw
+
+
+def measure(*args):
+    """每个方案使用新进程，内存映射的页面和HNSW索引不会互相影响"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_queries, *args).result()
+
+
+def recall_at_k(results, ground_truth) -> float:
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(results, ground_truth))
+    return hits / sum(len(expected) for expected in ground_truth)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量量化召回率/内存基准测试")
+    parser.add_argument("--count", type=int, default=50000, help="向量数量 (默认: 50000)")
+    parser.add_argument("--dim", type=int, default=1536, help="向量维度 (默认: 1536)")
+    parser.add_argument("--clusters", type=int, default=200, help="聚类数量 (默认: 200)")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量 (默认: 200)")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k (默认: 10)")
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1, 2, 3, 5],
+                        help="要测试的粗排候选倍数 (默认: 1 2 3 5)")
+    parser.add_argument("--index-type", default="auto", choices=["flat", "auto"],
+                        help="本地向量库索引类型，与 LOCAL_INDEX_TYPE 相同 (默认: auto)")
+    parser.add_argument("--hnsw-min-points", type=int, default=50000,
+                        help="auto模式下构建HNSW的最少点数，与 HNSW_MIN_POINTS 相同 (默认: 50000)")
+    args = parser.parse_args()
+
+    print("\n" + "=" * 60)
+    print(f"📐 向量量化基准测试: {args.count} 个 {args.dim} 维向量, {args.queries} 个查询, recall@{args.k}")
+    print("=" * 60 + "\n")
+
+    vectors = make_vectors(args.count, args.dim, args.clusters)
+    # 查询取库中向量加噪声，模拟相似问题
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, args.count, size=args.queries)]
+    queries = queries + 0.3 * rng.normal(size=queries.shape).astype(np.float32) / np.sqrt(args.dim)
+
+    work_dir = tempfile.mkdtemp(prefix="quant_bench_")
+    float_bytes = args.count * args.dim * 4
+    rows = []
+    try:
+        flat_path = os.path.join(work_dir, "float32_flat")
+        load_collection(flat_path, args.dim, vectors, "none", "flat", args.hnsw_min_points)
+        ground_truth, latency, rss, _ = measure(flat_path, args.dim, queries, args.k, "none", "flat",
+                                                args.hnsw_min_points, 1.0)
+        rows.append(SimpleNamespace(name="float32 暴力检索", recall=1.0, latency=latency,
+                                    memory=float_bytes, rss=rss))
+
+        if args.index_type != "flat":
+            path = os.path.join(work_dir, "float32_default")
+            load_collection(path, args.dim, vectors, "none", args.index_type, args.hnsw_min_points)
+            results, latency, rss, uses_hnsw = measure(path, args.dim, queries, args.k, "none", args.index_type,
+                                                       args.hnsw_min_points, 1.0)
+            rows.append(SimpleNamespace(
+                name=f"float32 {args.index_type}" + (" (HNSW)" if uses_hnsw else " (暴力)"),
+                recall=recall_at_k(results, ground_truth), latency=latency,
+                # HNSW索引内保存一份float32向量，检索时不再读取内存映射的矩阵
+                memory=float_bytes, rss=rss
+            ))
+
+        # int8量化使用同一索引配置（auto模式下不构建HNSW）
+        int8_path = os.path.join(work_dir, "int8")
+        load_collection(int8_path, args.dim, vectors, "int8", args.index_type, args.hnsw_min_points)
+        for oversampling in args.oversampling:
+            results, latency, rss, _ = measure(int8_path, args.dim, queries, args.k, "int8",
+                                               args.index_type, args.hnsw_min_points, oversampling)
+            rows.append(SimpleNamespace(
+                name=f"int8 {args.index_type} ×{oversampling:g} + 精排",
+                recall=recall_at_k(results, ground_truth),
+                latency=latency,
+                # 常驻内存的是int8矩阵，float32只读取候选行
+                memory=args.count * args.dim,
+                rss=rss
+            ))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'方案':<28}{'recall@' + str(args.k):>12}{'平均延迟(ms)':>14}{'向量内存(MB)':>14}"
+          f"{'实测RSS增量(MB)':>18}{'其中匿名内存(MB)':>18}")
+    for row in rows:
+        rss = f"{row.rss['VmRSS'] / 1024 / 1024:.1f}" if row.rss else "-"
+        anon = f"{row.rss['RssAnon'] / 1024 / 1024:.1f}" if row.rss else "-"
+        print(f"{row.name:<28}{row.recall:>12.4f}{row.latency:>14.2f}{row.memory / 1024 / 1024:>14.1f}"
+              f"{rss:>18}{anon:>18}")
+    print("\n💾 向量内存为按矩阵大小计算的常驻向量数据；实测RSS增量为子进程打开collection并完成所有查询后增加的常驻内存，"
+          "其余部分为内存映射的文件页")
+    print("=" * 60 + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Agent决策测试 - 使用桩LLM，不调用模型
+"""
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# 只用于创建LLM客户端，测试中不会发出请求
+os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+from agents.agent_decision import AgentDecision, parse_route_decision
+from config_manager import ConfigManager
+
+KNOWLEDGE_BASES = {"医疗知识库": "医疗、健康、疾病相关的专业知识"}
+
+
+class RecordingLLM:
+    """记录提示词并返回固定输出的LLM"""
+
+    def __init__(self, output: str):
+        self.output = output
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content=self.output)
+
+
+def _create_decision(tmp: str, output: str, custom_prompt: str = None) -> AgentDecision:
+    config_manager = ConfigManager(os.path.join(tmp, "config.json"))
+    if custom_prompt:
+        config_manager.update_config({"agent_decision_prompt": custom_prompt})
+    decision = AgentDecision(config_manager)
+    decision.llm = RecordingLLM(output)
+    return decision
+
+
+def test_combined_routing_uses_configured_prompt():
+    """合并决策使用配置页面中修改过的决策提示词"""
+    custom_prompt = "自定义规则: 所有用药问题都交给RAG。\n历史: {conversation_history}\n问题: {query}\n你的决策:"
+    with tempfile.TemporaryDirectory() as tmp:
+        decision = _create_decision(tmp, '{"agent": "RAG", "knowledge_bases": ["医疗知识库"]}', custom_prompt)
+        agent_type, kbs = decision.decide_route("布洛芬怎么吃", [], KNOWLEDGE_BASES)
+
+        assert (agent_type, kbs) == ("RAG", ["医疗知识库"])
+        prompt = decision.llm.prompts[0]
+        assert "自定义规则: 所有用药问题都交给RAG。" in prompt
+        assert "问题: 布洛芬怎么吃" in prompt
+        assert "- 医疗知识库: 医疗、健康、疾病相关的专业知识" in prompt
+        assert '"knowledge_bases"' in prompt
+        # 「你的决策:」只在追加的输出要求之后出现一次
+        assert prompt.count("你的决策") == 1 and prompt.rstrip().endswith("你的决策:")
+
+
+def test_combined_routing_falls_back_to_two_step():
+    """输出不是合法JSON时退回分步决策"""
+    with tempfile.TemporaryDirectory() as tmp:
+        decision = _create_decision(tmp, "RAG")
+        agent_type, kbs = decision.decide_route("高血压吃什么药", [], KNOWLEDGE_BASES)
+        assert agent_type == "RAG"
+        assert kbs == ["医疗知识库"]
+        assert len(decision.llm.prompts) == 3
+
+
+def test_parse_route_decision_filters_unknown_knowledge_bases():
+    agent_type, kbs = parse_route_decision(
+        '```json\n{"agent": "RAG", "knowledge_bases": ["医疗知识库", "不存在"]}\n```', KNOWLEDGE_BASES
+    )
+    assert (agent_type, kbs) == ("RAG", ["医疗知识库"])
+
+
+if __name__ == "__main__":
+    test_combined_routing_uses_configured_prompt()
+    test_combined_routing_falls_back_to_two_step()
+    test_parse_route_decision_filters_unknown_knowledge_bases()
+    print("✓ Agent决策测试通过")
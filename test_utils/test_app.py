@@ -0,0 +1,73 @@
+"""
+Web应用测试 - 使用桩智能体创建应用，不调用LLM、向量模型和向量库
+"""
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# 只用于创建LLM客户端，测试中不会发出请求
+os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+from fastapi.testclient import TestClient
+
+import web.app as app_module
+from config_manager import ConfigManager
+
+
+class StubRAG:
+    def __init__(self, config_manager, watch_folder: str):
+        self.embedding_model = None
+        self.vectorstores = {}
+        self.config = SimpleNamespace(
+            model_name="stub", watch_enabled=True, watch_folder=watch_folder, watch_interval=0.05,
+            watch_settle_seconds=0.0, chunk_size=500, chunk_overlap=50, dedup_enabled=False
+        )
+
+    def get_all_knowledge_bases(self):
+        return {}
+
+
+class StubAgent:
+    def __init__(self, config_manager, **kwargs):
+        self.config = SimpleNamespace(model_name="stub")
+
+    def get_agent_info(self):
+        return {"stub": "桩智能体"}
+
+
+def test_create_app_runs_lifespan():
+    """创建应用并完成启动和关闭：启动时开始监听知识库文件夹，关闭时停止监听"""
+    patched = ["ConfigManager", "MedicalRAG", "AgentDecision", "WebSearchAgent", "ConversationAgent"]
+    originals = {name: getattr(app_module, name) for name in patched}
+    with tempfile.TemporaryDirectory() as tmp:
+        watchers = []
+        original_watcher = app_module.KnowledgeBaseWatcher
+
+        def create_watcher(*args, **kwargs):
+            watchers.append(original_watcher(*args, **kwargs))
+            return watchers[-1]
+
+        app_module.ConfigManager = lambda: ConfigManager(os.path.join(tmp, "config.json"))
+        app_module.MedicalRAG = lambda config_manager: StubRAG(config_manager, tmp)
+        app_module.AgentDecision = app_module.WebSearchAgent = app_module.ConversationAgent = StubAgent
+        app_module.KnowledgeBaseWatcher = create_watcher
+        try:
+            app = app_module.create_app()
+            assert watchers and watchers[0]._thread is None
+            with TestClient(app) as client:
+                assert watchers[0]._thread.is_alive()
+                assert client.get("/health").json()["status"] == "healthy"
+                assert client.get("/agents").json()["agents"] == {"stub": "桩智能体"}
+            assert not watchers[0]._thread.is_alive()
+        finally:
+            for name, original in originals.items():
+                setattr(app_module, name, original)
+            app_module.KnowledgeBaseWatcher = original_watcher
+
+
+if __name__ == "__main__":
+    test_create_app_runs_lifespan()
+    print("✓ Web应用测试通过")
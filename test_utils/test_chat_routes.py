@@ -0,0 +1,217 @@
+"""
+聊天路由测试 - 使用桩智能体，不调用LLM、向量模型和网络搜索
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# 只用于创建LLM客户端，测试中不会发出请求
+os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from agents.agent_decision import AgentDecision
+from config_manager import ConfigManager
+from llm_limiter import ProviderLimiter, ProviderOverloadedError
+from web.routes import chat as chat_routes
+from web.semantic_cache import SemanticCache
+from web.session_manager import SessionManager
+
+
+class StubEmbeddings:
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+
+class StubWebSearchAgent:
+    config = SimpleNamespace(model_name="stub")
+
+    async def asearch(self, query, conversation_history=None):
+        await asyncio.sleep(0)
+        return {"agent": "网络搜索智能体", "response": f"搜索结果: {query}", "sources": []}
+
+
+class LimitedWebSearchAgent(StubWebSearchAgent):
+    """搜索前先取得限流额度"""
+
+    def __init__(self, limiter: ProviderLimiter):
+        self.limiter = limiter
+
+    async def asearch(self, query, conversation_history=None):
+        async with self.limiter.aslot():
+            return await super().asearch(query, conversation_history)
+
+    async def astream_search(self, query, conversation_history=None):
+        async with self.limiter.aslot():
+            yield {"event": "result", "data": await super().asearch(query, conversation_history)}
+
+
+class VersionBumpingConversationAgent:
+    """生成回答期间知识库被更新（例如文件夹监听导入）"""
+    config = SimpleNamespace(model_name="stub")
+
+    def __init__(self, versions: dict):
+        self.versions = versions
+
+    async def achat(self, query, conversation_history=None):
+        self.versions["kb"] += 1
+        return {"agent": "对话智能体", "response": f"回答: {query}（知识库版本 {self.versions['kb'] - 1}）"}
+
+
+class StubConversationAgent:
+    config = SimpleNamespace(model_name="stub")
+
+    async def achat(self, query, conversation_history=None):
+        return {"agent": "对话智能体", "response": f"回答: {query}"}
+
+
+class RecordingLLM:
+    """记录路由决策提示词"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content='{"agent": "CONVERSATION", "knowledge_bases": []}')
+
+
+class FailingLLM:
+    """路由决策不应调用LLM"""
+
+    def invoke(self, prompt):
+        raise AssertionError("不应调用LLM决策")
+
+    async def ainvoke(self, prompt):
+        raise AssertionError("不应调用LLM决策")
+
+
+class OverloadedLLM:
+    """LLM限流排队超时"""
+
+    def invoke(self, prompt):
+        raise ProviderOverloadedError("排队超时", 503, 5)
+
+    async def ainvoke(self, prompt):
+        raise ProviderOverloadedError("排队超时", 503, 5)
+
+
+def _create_client(tmp: str, web_search_agent=None, conversation_agent=None, semantic_cache=None,
+                   kb_version=lambda: 0, llm=None, speculative_retrieve=None) -> TestClient:
+    config_manager = ConfigManager(os.path.join(tmp, "config.json"))
+    agent_decision = AgentDecision(config_manager, embedding_model=StubEmbeddings(), knowledge_bases={})
+    agent_decision.llm = llm or FailingLLM()
+    rag_agent = SimpleNamespace(
+        get_all_knowledge_bases=lambda: {},
+        get_knowledge_base_version=kb_version,
+        embedding_model=StubEmbeddings(),
+        speculative_retrieve=speculative_retrieve,
+        config=SimpleNamespace(model_name="stub", speculative_retrieval=speculative_retrieve is not None,
+                               kb_routing="llm")
+    )
+    chat_routes.init_chat_routes(SessionManager(), agent_decision, rag_agent, web_search_agent or StubWebSearchAgent(),
+                                 conversation_agent, config_manager, semantic_cache)
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+    return TestClient(app)
+
+
+def test_fast_router_decides_first_turn():
+    """会话第一个问题：当前问题已加入会话历史，本地快速路由仍按无历史处理"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _create_client(tmp)
+        response = client.post("/chat", json={"query": "最新的流感疫情情况怎么样"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["agent"] == "网络搜索智能体"
+        assert data["debug_info"]["fast_router"]["hit"] is True
+        assert data["debug_info"]["fast_router"]["method"] == "keyword"
+        assert data["debug_info"]["llm_calls"][0]["agent"] == "网络搜索智能体"
+
+
+def test_llm_routing_history_excludes_current_question():
+    """LLM路由决策的对话历史不包含当前问题（当前问题只作为query出现一次）"""
+    llm = RecordingLLM()
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _create_client(tmp, conversation_agent=StubConversationAgent(), llm=llm)
+        session_id = client.post("/chat", json={"query": "你好"}).json()["session_id"]
+        for combined_routing, query in ((True, "血压偏高需要注意什么"), (False, "糖尿病饮食有哪些禁忌")):
+            chat_routes.agent_decision.config.combined_routing = combined_routing
+            response = client.post("/chat", json={"query": query, "session_id": session_id})
+            assert response.status_code == 200
+            prompt = llm.prompts[-1]
+            assert "user: 你好" in prompt
+            assert prompt.count(query) == 1
+        assert len(llm.prompts) == 2
+
+
+def test_answer_is_not_cached_when_knowledge_base_changes_during_generation():
+    """生成回答期间知识库版本变化：回答基于旧知识库，不缓存到新版本的命名空间"""
+    versions = {"kb": 0}
+    cache = SemanticCache()
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _create_client(tmp, conversation_agent=VersionBumpingConversationAgent(versions),
+                                semantic_cache=cache, kb_version=lambda: versions["kb"])
+        first = client.post("/chat", json={"query": "你好"}).json()
+        assert first["debug_info"]["semantic_cache"]["hit"] is False
+        assert cache.get_stats()["size"] == 0
+
+        # 新会话的相同问题不会命中旧知识库生成的回答
+        second = client.post("/chat", json={"query": "你好"}).json()
+        assert second["debug_info"]["semantic_cache"]["hit"] is False
+        assert second["response"] != first["response"]
+
+
+def test_overloaded_provider_returns_retry_after():
+    """LLM限流排队超时：/chat 返回503和Retry-After，流式接口推送带 retry_after 的 error 事件"""
+    limiter = ProviderLimiter(max_in_flight=1, queue_timeout=0.2)
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _create_client(tmp, LimitedWebSearchAgent(limiter))
+        with limiter.slot():
+            response = client.post("/chat", json={"query": "最新的流感疫情情况怎么样"})
+            assert response.status_code == 503
+            assert int(response.headers["Retry-After"]) >= 1
+
+            response = client.post("/chat/stream", json={"query": "最新的流感疫情情况怎么样"})
+            assert response.status_code == 200
+            assert "event: error" in response.text
+            assert '"status_code": 503' in response.text and '"retry_after"' in response.text
+        assert limiter.get_stats()["in_flight"] == 0
+
+        response = client.post("/chat", json={"query": "最新的流感疫情情况怎么样"})
+        assert response.status_code == 200
+
+
+def test_speculative_retrieval_is_cancelled_when_routing_fails():
+    """路由决策被LLM限流拒绝时取消推测检索"""
+    futures = []
+
+    def speculative_retrieve(query):
+        futures.append(Future())
+        return futures[-1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _create_client(tmp, llm=OverloadedLLM(), speculative_retrieve=speculative_retrieve)
+        response = client.post("/chat", json={"query": "血压偏高需要注意什么"})
+        assert response.status_code == 503
+        response = client.post("/chat/stream", json={"query": "血压偏高需要注意什么"})
+        assert response.status_code == 503
+        assert len(futures) == 2 and all(future.cancelled() for future in futures)
+
+
+if __name__ == "__main__":
+    test_fast_router_decides_first_turn()
+    test_llm_routing_history_excludes_current_question()
+    test_answer_is_not_cached_when_knowledge_base_changes_during_generation()
+    test_overloaded_provider_returns_retry_after()
+    test_speculative_retrieval_is_cancelled_when_routing_fails()
+    print("✓ 聊天路由测试通过")
@@ -0,0 +1,145 @@
+"""
+导入检查点测试 - 追加日志、压缩和中断后恢复
+"""
+import json
+import os
+import sys
+import tempfile
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from ingestion.checkpoint import IngestCheckpoint
+from ingestion.manifest import normalize_file_key
+
+# 清单和检查点的键是绝对路径
+A, B = normalize_file_key("a.txt"), normalize_file_key("b.txt")
+
+
+def _entry(content_hash: str, point_ids):
+    return {"content_hash": content_hash, "point_ids": list(point_ids)}
+
+
+def test_batches_are_appended_and_replayed():
+    """每批只追加到日志，快照不重写；重新打开后状态一致"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "medical.checkpoint.json")
+        checkpoint = IngestCheckpoint(path)
+        checkpoint.mark_batch(A, "hash-a", ["p0"])
+        checkpoint.save()
+        assert not os.path.exists(path)
+        log_size = os.path.getsize(checkpoint.log_path)
+
+        for i in range(1, 50):
+            checkpoint.mark_batch(A, "hash-a", [f"p{i}"])
+            checkpoint.save()
+            new_size = os.path.getsize(checkpoint.log_path)
+            assert new_size > log_size
+            log_size = new_size
+        checkpoint.mark_finished(B, _entry("hash-b", ["q0"]))
+        checkpoint.save()
+        assert not os.path.exists(path)
+
+        reopened = IngestCheckpoint(path)
+        assert reopened.files == checkpoint.files
+        assert reopened.resumable_ids(A, "hash-a") == {f"p{i}" for i in range(50)}
+        assert reopened.resumable_ids(A, "hash-changed") == set()
+        assert reopened.point_ids(B) == {"q0"}
+
+
+def test_changed_file_keeps_stale_ids_after_replay():
+    """文件内容变化后旧版本的点ID在重放后仍记录为待清理"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "medical.checkpoint.json")
+        checkpoint = IngestCheckpoint(path)
+        checkpoint.mark_finished(A, _entry("hash-a1", ["old"]))
+        checkpoint.mark_batch(A, "hash-a2", ["new"])
+        checkpoint.save()
+
+        reopened = IngestCheckpoint(path)
+        assert reopened.resumable_ids(A, "hash-a2") == {"new"}
+        assert reopened.point_ids(A) == {"old", "new"}
+
+
+def test_pop_finished_compacts_log():
+    """已完成的文件移出检查点后日志压缩为只包含未完成文件的快照"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "medical.checkpoint.json")
+        checkpoint = IngestCheckpoint(path)
+        checkpoint.mark_finished(A, _entry("hash-a", ["p1"]))
+        checkpoint.mark_batch(B, "hash-b", ["q1"])
+        checkpoint.save()
+
+        assert set(checkpoint.pop_finished()) == {A}
+        checkpoint.save()
+        assert os.path.exists(path) and not os.path.exists(checkpoint.log_path)
+        with open(path, 'r', encoding='utf-8') as f:
+            assert set(json.load(f)["files"]) == {B}
+
+        # 压缩后的进度继续追加到新日志
+        checkpoint.mark_batch(B, "hash-b", ["q2"])
+        checkpoint.save()
+        assert os.path.exists(checkpoint.log_path)
+        assert IngestCheckpoint(path).resumable_ids(B, "hash-b") == {"q1", "q2"}
+
+        # 没有未完成的进度时删除检查点文件
+        checkpoint.remove(B)
+        checkpoint.save()
+        assert not os.path.exists(path) and not os.path.exists(checkpoint.log_path)
+        assert IngestCheckpoint(path).files == {}
+
+
+def test_log_is_compacted_when_larger_than_snapshot():
+    """日志超过快照大小（且不小于下限）时压缩，写入量随进度线性增长"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "medical.checkpoint.json")
+        checkpoint = IngestCheckpoint(path)
+        checkpoint._COMPACT_MIN_BYTES = 4096
+        compactions = 0
+        for i in range(500):
+            checkpoint.mark_batch(A, "hash-a", [f"point-{i}"])
+            checkpoint.save()
+            if not os.path.exists(checkpoint.log_path):
+                compactions += 1
+        assert 0 < compactions < 20
+        assert IngestCheckpoint(path).resumable_ids(A, "hash-a") == {f"point-{i}" for i in range(500)}
+
+
+def test_stale_and_torn_logs_are_ignored():
+    """压缩中断留下的旧日志不重放；追加中断留下的不完整记录被忽略，下次保存时重写"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "medical.checkpoint.json")
+        checkpoint = IngestCheckpoint(path)
+        checkpoint.mark_finished(A, _entry("hash-a", ["p1"]))
+        checkpoint.mark_batch(B, "hash-b", ["q1"])
+        checkpoint.save()
+        with open(checkpoint.log_path, 'r', encoding='utf-8') as f:
+            old_log = f.read()
+
+        checkpoint.pop_finished()
+        checkpoint.save()
+        # 模拟写入快照后、删除日志前中断
+        with open(checkpoint.log_path, 'w', encoding='utf-8') as f:
+            f.write(old_log)
+        reopened = IngestCheckpoint(path)
+        assert set(reopened.files) == {B}
+
+        reopened.mark_batch(B, "hash-b", ["q2"])
+        reopened.save()
+        with open(reopened.log_path, 'a', encoding='utf-8') as f:
+            f.write('{"op": "batch", "file": "b.txt", "ha')
+        torn = IngestCheckpoint(path)
+        assert torn.resumable_ids(B, "hash-b") == {"q1", "q2"}
+
+        torn.mark_batch(B, "hash-b", ["q3"])
+        torn.save()
+        assert IngestCheckpoint(path).resumable_ids(B, "hash-b") == {"q1", "q2", "q3"}
+
+
+if __name__ == "__main__":
+    test_batches_are_appended_and_replayed()
+    test_changed_file_keeps_stale_ids_after_replay()
+    test_pop_finished_compacts_log()
+    test_log_is_compacted_when_larger_than_snapshot()
+    test_stale_and_torn_logs_are_ignored()
+    print("✓ 导入检查点测试通过")
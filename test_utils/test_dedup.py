@@ -0,0 +1,85 @@
+"""
+近似重复检测测试 - SimHash指纹和近似重复过滤器
+"""
+import os
+import sys
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from ingestion.dedup import NearDuplicateFilter, hamming_distance, simhash
+
+TEXT = "高血压患者应当低盐低脂饮食，每日食盐摄入量不超过5克，规律服用降压药物，定期监测血压并记录。" * 3
+SOURCE_A = ("manifest_a.json", "docs/a.txt", "hash-a1")
+SOURCE_B = ("manifest_a.json", "docs/b.txt", "hash-b1")
+
+
+def test_simhash_ignores_whitespace_and_punctuation():
+    variant = " ".join(TEXT.replace("，", ",").replace("。", ".")) + "\n"
+    assert simhash(TEXT) == simhash(variant)
+    assert simhash("Aspirin 100MG") == simhash("aspirin100mg")
+    assert hamming_distance(simhash(TEXT), simhash("糖尿病患者需要控制碳水化合物摄入，监测血糖。" * 3)) > 3
+
+
+def test_filter_finds_near_duplicates_within_scope():
+    """海明距离不超过阈值的指纹都能通过分段索引找到（翻转的位分布在不同的段中）"""
+    fingerprint = simhash(TEXT)
+    near = fingerprint ^ (1 << 3) ^ (1 << 20) ^ (1 << 40)
+    far = near ^ (1 << 60)
+    dedup = NearDuplicateFilter(max_distance=3)
+    dedup.add("medical", "p1", fingerprint, SOURCE_A)
+    assert dedup.find("medical", near, SOURCE_B) == "p1"
+    assert dedup.find("medical", far, SOURCE_B) is None
+    # 知识库范围内去重时其他知识库的文本块不算重复
+    assert dedup.find("drug", near, SOURCE_B) is None
+
+    global_dedup = NearDuplicateFilter(max_distance=3, scope="global")
+    global_dedup.add("medical", "p1", fingerprint, SOURCE_A)
+    assert global_dedup.find("drug", near, SOURCE_B) == "p1"
+
+
+def test_old_version_of_same_file_is_not_a_duplicate():
+    """文件更新后，新版本的文本块不会被判定为旧版本文本块的重复"""
+    dedup = NearDuplicateFilter()
+    dedup.add("medical", "p1", simhash(TEXT), SOURCE_A)
+    assert dedup.find("medical", simhash(TEXT), ("manifest_a.json", "docs/a.txt", "hash-a2")) is None
+    assert dedup.find("medical", simhash(TEXT), SOURCE_A) == "p1"
+
+
+def test_removing_kept_chunk_invalidates_dependents():
+    """保留的文本块被删除时，依赖它的文件需要重新导入"""
+    dedup = NearDuplicateFilter()
+    dedup.add("medical", "p1", simhash(TEXT), SOURCE_A)
+    duplicate_of = dedup.find("medical", simhash(TEXT), SOURCE_B)
+    dedup.record_duplicate(duplicate_of, "manifest_a.json", "docs/b.txt", TEXT)
+    assert dedup.get_stats() == {"duplicate_chunks": 1, "duplicate_bytes": len(TEXT.encode('utf-8'))}
+
+    assert dedup.remove(["p1"]) == {("manifest_a.json", "docs/b.txt")}
+    assert ("manifest_a.json", "docs/b.txt") in dedup.invalidated
+    assert dedup.find("medical", simhash(TEXT), SOURCE_B) is None
+
+
+def test_seed_from_manifest():
+    """从清单恢复索引：只有与清单一致的文件参与去重，依赖关系全部恢复"""
+    files = {
+        "docs/a.txt": {"content_hash": "hash-a1", "point_ids": ["p1"], "fingerprints": [f"{simhash(TEXT):x}"],
+                       "duplicate_of": []},
+        "docs/b.txt": {"content_hash": "hash-b1", "point_ids": [], "fingerprints": [], "duplicate_of": ["p1"]},
+        "docs/c.txt": {"content_hash": "hash-c1", "point_ids": ["p3"],
+                       "fingerprints": [f"{simhash('已修改的文件内容，不参与去重。' * 3):x}"], "duplicate_of": []}
+    }
+    dedup = NearDuplicateFilter()
+    dedup.seed("manifest_a.json", "medical", files, is_current=lambda file_key, entry: file_key != "docs/c.txt")
+    assert dedup.find("medical", simhash(TEXT), ("manifest_a.json", "docs/d.txt", "hash-d1")) == "p1"
+    assert dedup.find("medical", simhash('已修改的文件内容，不参与去重。' * 3),
+                      ("manifest_a.json", "docs/d.txt", "hash-d1")) is None
+    assert dedup.remove(["p1"]) == {("manifest_a.json", "docs/b.txt")}
+
+
+if __name__ == "__main__":
+    test_simhash_ignores_whitespace_and_punctuation()
+    test_filter_finds_near_duplicates_within_scope()
+    test_old_version_of_same_file_is_not_a_duplicate()
+    test_removing_kept_chunk_invalidates_dependents()
+    test_seed_from_manifest()
+    print("✓ 近似重复检测测试通过")
@@ -0,0 +1,53 @@
+"""
+Embedding缓存测试 - 命中不写数据库、访问时间批量写回、近似LRU淘汰
+"""
+import os
+import sys
+import tempfile
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.rag_agent.embedding_cache import EmbeddingCache
+
+
+def _vector(i: int):
+    return [float(i), 1.0]
+
+
+def test_hits_do_not_write_until_flush():
+    """命中缓存只读数据库，访问时间积累到一定数量后才批量写回"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(os.path.join(tmp, "cache.sqlite"))
+        cache._ACCESS_FLUSH_SIZE = 3
+        cache.put_many({f"k{i}": _vector(i) for i in range(5)})
+        changes = cache._conn.total_changes
+
+        assert cache.get_many(["k0", "k1", "缺失"]) == {"k0": _vector(0), "k1": _vector(1)}
+        assert cache._conn.total_changes == changes
+        assert cache.get_stats()["hits"] == 2 and cache.get_stats()["misses"] == 1
+
+        cache.get_many(["k2"])
+        assert cache._conn.total_changes == changes + 3
+        assert not cache._pending_access
+
+
+def test_eviction_uses_recent_access():
+    """写入新向量时先写回访问时间，淘汰最久未访问的条目"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(os.path.join(tmp, "cache.sqlite"), max_items=10)
+        cache.put_many({f"old{i}": _vector(i) for i in range(10)})
+        # 最早写入的条目最近被访问过（访问时间还在内存中）
+        cache._conn.execute("UPDATE embeddings SET last_access = last_access - 100 WHERE key IN ('old0', 'old1')")
+        cache.get_many(["old0", "old1"])
+        cache.put_many({"new": _vector(99)})
+
+        remaining = set(cache.get_many([f"old{i}" for i in range(10)] + ["new"]))
+        assert {"old0", "old1", "new"} <= remaining
+        assert len(remaining) == 9
+
+
+if __name__ == "__main__":
+    test_hits_do_not_write_until_flush()
+    test_eviction_uses_recent_access()
+    print("✓ Embedding缓存测试通过")
@@ -0,0 +1,262 @@
+"""
+导入管道测试 - 使用桩RAG智能体，不调用向量模型和向量库
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import ingestion.extractor as extractor_module
+import ingestion.pipeline as pipeline_module
+from ingestion.dedup import NearDuplicateFilter
+from ingestion.pipeline import IngestionPipeline
+from ingestion.text_splitter import TextSplitter
+
+
+class StubBatcher:
+    def embed(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class StubRAG:
+    """只记录写入和删除的RAG智能体"""
+
+    def __init__(self, manifest_dir: str):
+        self.config = SimpleNamespace(
+            embedding_batch_size=2, embedding_max_concurrency=1, bulk_write_size=4,
+            ingest_queue_size=1, ingest_checkpoint_interval=0.0, ingest_manifest_dir=manifest_dir
+        )
+        self.embedding_batcher = StubBatcher()
+        self.points = {}
+        self.deleted = []
+
+    def get_collection_name(self, knowledge_base=None):
+        return "test_collection"
+
+    def bulk_load(self, knowledge_base=None):
+        return nullcontext()
+
+    def add_embeddings(self, texts, vectors, metadatas, knowledge_base=None, ids=None):
+        self.points.update(dict(zip(ids, texts)))
+        return True
+
+    def delete_documents(self, ids, knowledge_base=None):
+        self.deleted.extend(ids)
+        for point_id in ids:
+            self.points.pop(point_id, None)
+        return True
+
+
+def _write_files(folder: str, count: int):
+    for i in range(count):
+        with open(os.path.join(folder, f"doc{i:02d}.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"第{i}篇文档。" + "高血压患者需要低盐饮食，规律服药。" * 20)
+
+
+def _run_with_timeout(target, timeout: float = 20.0):
+    """在线程中运行，超时说明管道死锁"""
+    outcome = {}
+
+    def runner():
+        try:
+            outcome["result"] = target()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "导入管道没有返回（死锁）"
+    return outcome
+
+
+def test_pipeline_ingests_folder():
+    """正常导入：所有文件写入并记录到清单"""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "docs")
+        os.makedirs(folder)
+        _write_files(folder, 5)
+        rag = StubRAG(os.path.join(tmp, "manifest"))
+        pipeline = IngestionPipeline(rag, TextSplitter(64, 8), bulk_load=False)
+
+        outcome = _run_with_timeout(lambda: pipeline.run(folder))
+        assert "error" not in outcome
+        assert outcome["result"]["added_files"] == 5
+        assert rag.points
+
+
+def test_pipeline_returns_when_discovery_fails():
+    """发现阶段中途出错时管道要停止并抛出错误，不能死锁"""
+    original_hash = pipeline_module.compute_file_hash
+    calls = []
+
+    def failing_hash(path):
+        calls.append(path)
+        if len(calls) == 6:
+            # 等下游阶段处理完已输出的批次、空闲等待时再出错
+            time.sleep(0.5)
+            raise PermissionError(f"无法读取 {path}")
+        return original_hash(path)
+
+    pipeline_module.compute_file_hash = failing_hash
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = os.path.join(tmp, "docs")
+            os.makedirs(folder)
+            _write_files(folder, 12)
+            rag = StubRAG(os.path.join(tmp, "manifest"))
+            pipeline = IngestionPipeline(rag, TextSplitter(64, 8), queue_size=1, bulk_load=False)
+
+            outcome = _run_with_timeout(lambda: pipeline.run(folder))
+            assert isinstance(outcome.get("error"), PermissionError)
+    finally:
+        pipeline_module.compute_file_hash = original_hash
+
+
+def test_pipeline_returns_when_consumer_fails():
+    """写入阶段出错时上游阶段要退出"""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "docs")
+        os.makedirs(folder)
+        _write_files(folder, 12)
+        rag = StubRAG(os.path.join(tmp, "manifest"))
+
+        def failing_add(*args, **kwargs):
+            raise RuntimeError("向量库不可用")
+
+        rag.add_embeddings = failing_add
+        pipeline = IngestionPipeline(rag, TextSplitter(64, 8), queue_size=1, bulk_load=False)
+
+        outcome = _run_with_timeout(lambda: pipeline.run(folder))
+        assert isinstance(outcome.get("error"), RuntimeError)
+
+
+def test_unreadable_file_keeps_existing_points():
+    """已导入的文件读取失败时保留原有向量、不更新清单，恢复后重新导入；读取成功但内容为空时才移除向量"""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "docs")
+        os.makedirs(folder)
+        _write_files(folder, 1)
+        file_path = os.path.join(folder, "doc00.txt")
+        rag = StubRAG(os.path.join(tmp, "manifest"))
+        pipeline = IngestionPipeline(rag, TextSplitter(64, 8), bulk_load=False)
+        pipeline.run(folder)
+        imported = set(rag.points)
+        assert imported
+
+        with open(file_path, 'a', encoding='utf-8') as f:
+            f.write("新增内容：注意监测血压。")
+        original_read = extractor_module.read_txt_file
+
+        def failing_read(path):
+            raise PermissionError("文件被占用")
+
+        extractor_module.read_txt_file = failing_read
+        try:
+            stats = pipeline.run(folder)
+        finally:
+            extractor_module.read_txt_file = original_read
+        assert stats["failed_files"] == 1
+        assert not rag.deleted
+        assert imported <= set(rag.points)
+
+        # 恢复读取后文件内容已变化，会重新导入
+        stats = pipeline.run(folder)
+        assert stats["updated_files"] == 1
+
+        # 读取成功但内容为空：移除该文件的所有向量
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write("")
+        stats = pipeline.run(folder)
+        assert stats["updated_files"] == 1
+        assert not rag.points
+
+
+
+def test_duplicate_files_are_embedded_once():
+    """内容相同的文件只向量化一次；保留的文件被删除后，重复的文件重新导入"""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "docs")
+        os.makedirs(folder)
+        _write_files(folder, 1)
+        with open(os.path.join(folder, "doc00.txt"), 'r', encoding='utf-8') as f:
+            content = f.read()
+        with open(os.path.join(folder, "doc01.txt"), 'w', encoding='utf-8') as f:
+            f.write(content.replace("。", "。 "))
+        rag = StubRAG(os.path.join(tmp, "manifest"))
+        pipeline = IngestionPipeline(rag, TextSplitter(64, 8), dedup=NearDuplicateFilter(), bulk_load=False)
+
+        stats = pipeline.run(folder)
+        assert stats["added_files"] == 2
+        assert stats["duplicate_chunks"] > 0
+        # doc01 的开头与 doc00 重复，没有单独写入
+        assert sum("第0篇文档" in text for text in rag.points.values()) == 1
+
+        # 删除 doc00 后 doc01 依赖的文本块被移除，重新导入 doc01 的全部内容
+        os.remove(os.path.join(folder, "doc00.txt"))
+        pipeline.run(folder)
+        pipeline.run(folder)
+        texts = list(rag.points.values())
+        assert all("。 " in text for text in texts)
+        assert any("第0篇文档" in text for text in texts)
+
+
+def test_file_keys_do_not_depend_on_working_directory():
+    """从不同工作目录、以相对路径或绝对路径导入同一个文件夹：清单键和点ID相同，再次导入不产生新向量"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "kb", "docs")
+        os.makedirs(folder)
+        _write_files(folder, 3)
+        rag = StubRAG(os.path.join(tmp, "manifest"))
+        try:
+            os.chdir(os.path.join(tmp, "kb"))
+            first = IngestionPipeline(rag, TextSplitter(64, 8), bulk_load=False).run("docs")
+            point_ids = set(rag.points)
+            os.chdir(tmp)
+            second = IngestionPipeline(rag, TextSplitter(64, 8), bulk_load=False).run(folder, force=True)
+        finally:
+            os.chdir(cwd)
+        assert first["added_files"] == 3
+        assert second["deleted_files"] == 0 and not rag.deleted
+        assert set(rag.points) == point_ids
+        manifest = pipeline_module.load_manifest(rag)
+        assert sorted(manifest.files) == [Path(folder, f"doc{i:02d}.txt").as_posix() for i in range(3)]
+
+
+def test_legacy_relative_manifest_keys_are_migrated():
+    """旧版本清单中相对于工作目录的键读取时转换为绝对路径，未修改的文件仍然跳过"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "docs")
+        os.makedirs(folder)
+        _write_files(folder, 2)
+        rag = StubRAG(os.path.join(tmp, "manifest"))
+        IngestionPipeline(rag, TextSplitter(64, 8), bulk_load=False).run(folder)
+        manifest = pipeline_module.load_manifest(rag)
+        manifest.files = {os.path.relpath(key, tmp): entry for key, entry in manifest.files.items()}
+        manifest.save()
+        try:
+            os.chdir(tmp)
+            stats = IngestionPipeline(rag, TextSplitter(64, 8), bulk_load=False).run(folder)
+        finally:
+            os.chdir(cwd)
+        assert stats["unchanged_files"] == 2 and stats["deleted_files"] == 0
+
+
+if __name__ == "__main__":
+    test_pipeline_ingests_folder()
+    test_pipeline_returns_when_discovery_fails()
+    test_pipeline_returns_when_consumer_fails()
+    test_unreadable_file_keeps_existing_points()
+    test_duplicate_files_are_embedded_once()
+    test_file_keys_do_not_depend_on_working_directory()
+    test_legacy_relative_manifest_keys_are_migrated()
+    print("✓ 导入管道测试通过")
@@ -0,0 +1,53 @@
+"""
+知识库向量路由测试 - 使用随机向量，不调用向量模型
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.rag_agent.kb_router import KnowledgeBaseRouter
+
+COLLECTIONS = {"医疗知识库": "medical_knowledge", "药品知识库": "drug_knowledge"}
+
+
+def _cluster(center: np.ndarray, count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return center + 0.1 * rng.normal(size=(count, len(center)))
+
+
+def test_router_reloads_profiles_updated_by_other_process():
+    """Web服务中的路由器在命令行导入（另一个路由器实例）更新画像后使用新画像"""
+    centers = np.eye(8)
+    with tempfile.TemporaryDirectory() as tmp:
+        web_router = KnowledgeBaseRouter(tmp, threshold=0.5)
+        cli_router = KnowledgeBaseRouter(tmp, threshold=0.5)
+        cli_router.update("medical_knowledge", _cluster(centers[0], 20, seed=0).tolist())
+
+        assert web_router.route(centers[1], COLLECTIONS)["knowledge_bases"] == []
+        assert list(web_router.route(centers[0], COLLECTIONS)["scores"]) == ["医疗知识库"]
+
+        # 命令行导入新的知识库
+        cli_router.update("drug_knowledge", _cluster(centers[1], 20, seed=1).tolist())
+        assert web_router.route(centers[1], COLLECTIONS)["knowledge_bases"] == ["药品知识库"]
+
+        # 命令行重建画像：清空后用新内容累计
+        cli_router.reset("medical_knowledge")
+        assert "医疗知识库" not in web_router.route(centers[0], COLLECTIONS)["scores"]
+        cli_router.update("medical_knowledge", _cluster(centers[2], 20, seed=2).tolist())
+        assert web_router.route(centers[2], COLLECTIONS)["knowledge_bases"] == ["医疗知识库"]
+
+        # 本进程的更新与其他进程的更新累计在一起
+        web_router.update("drug_knowledge", _cluster(centers[1], 5, seed=3).tolist())
+        assert web_router.profiles["drug_knowledge"].count == 25
+        cli_router.update("drug_knowledge", _cluster(centers[1], 5, seed=4).tolist())
+        assert cli_router.profiles["drug_knowledge"].count == 30
+
+
+if __name__ == "__main__":
+    test_router_reloads_profiles_updated_by_other_process()
+    print("✓ 知识库向量路由测试通过")
@@ -0,0 +1,98 @@
+"""
+BM25词法索引测试 - 分词、检索、增删和倒数排名融合
+"""
+import os
+import sys
+import tempfile
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.rag_agent.lexical_index import BM25Index, normalize_point_id, reciprocal_rank_fusion, tokenize
+
+DOCS = {
+    "d1": "阿莫西林胶囊0.5g，每日三次，用于呼吸道感染。",
+    "d2": "布洛芬缓释胶囊用于缓解头痛、牙痛和发热。",
+    "d3": "高血压患者需要低盐饮食，规律服用降压药。",
+    "d4": "H1N1流感疫苗每年接种一次，ICD-10编码为J09。"
+}
+
+
+def _create_index(tmp: str) -> BM25Index:
+    index = BM25Index(os.path.join(tmp, "test.sqlite"))
+    index.add(list(DOCS), list(DOCS.values()), [{"source": point_id} for point_id in DOCS])
+    return index
+
+
+def test_tokenize():
+    """中文切分为字符二元组，英文、数字、编号整体保留"""
+    assert tokenize("降压药") == ["降压", "压药"]
+    assert tokenize("药") == ["药"]
+    assert tokenize("H1N1疫苗 0.5mg ICD-10") == ["h1n1", "0.5mg", "icd-10", "疫苗"]
+
+
+def test_search_exact_terms():
+    """药品名、编码、剂量等精确词检索到对应文档"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = _create_index(tmp)
+        assert index.search("布洛芬", k=2)[0][0] == "d2"
+        assert index.search("icd-10", k=2)[0][0] == "d4"
+        assert index.search("0.5g 阿莫西林", k=2)[0][0] == "d1"
+        point_id, content, metadata, score = index.search("高血压 降压", k=1)[0]
+        assert (point_id, content, metadata) == ("d3", DOCS["d3"], {"source": "d3"})
+        assert score > 0
+        assert index.search("完全无关 xyz", k=3) == []
+        index.close()
+
+
+def test_add_overwrite_remove_and_reopen():
+    """覆盖和删除后统计与检索结果一致，重新打开后数据保留"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = _create_index(tmp)
+        assert len(index) == 4
+        index.add(["d2"], ["对乙酰氨基酚片用于退热。"])
+        assert len(index) == 4
+        assert index.search("布洛芬") == []
+        assert index.search("对乙酰氨基酚")[0][0] == "d2"
+
+        index.remove(["d1", "不存在"])
+        assert len(index) == 3
+        assert index.search("阿莫西林") == []
+        index.close()
+
+        reopened = BM25Index(os.path.join(tmp, "test.sqlite"))
+        assert len(reopened) == 3
+        assert reopened.search("流感疫苗")[0][0] == "d4"
+        reopened.clear()
+        assert len(reopened) == 0 and reopened.search("流感疫苗") == []
+        reopened.close()
+
+
+def test_point_ids_are_normalized():
+    """UUID格式的点ID统一为带连字符的小写形式，与Qdrant返回的ID一致"""
+    hex_id = "6F9619FF8B86D011B42D00C04FC964FF"
+    assert normalize_point_id(hex_id) == "6f9619ff-8b86-d011-b42d-00c04fc964ff"
+    assert normalize_point_id(42) == "42"
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(os.path.join(tmp, "test.sqlite"))
+        index.add([hex_id], [DOCS["d3"]])
+        index.remove(["6f9619ff-8b86-d011-b42d-00c04fc964ff"])
+        assert len(index) == 0
+        index.close()
+
+
+def test_reciprocal_rank_fusion():
+    """两个排名中都靠前的文档融合后排在最前"""
+    scores = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert max(scores, key=scores.get) == "b"
+    assert scores["a"] > scores["c"]
+    assert scores["b"] == 1 / 62 + 1 / 61
+
+
+if __name__ == "__main__":
+    test_tokenize()
+    test_search_exact_terms()
+    test_add_overwrite_remove_and_reopen()
+    test_point_ids_are_normalized()
+    test_reciprocal_rank_fusion()
+    print("✓ BM25词法索引测试通过")
@@ -0,0 +1,286 @@
+"""
+LLM供应商限流和请求合并测试 - 使用桩模型，不调用LLM
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from llm_coalescing import CoalescingChatModel, SingleFlight
+from llm_limiter import (BACKGROUND, INTERACTIVE, LimitedChatModel, ProviderLimiter, ProviderOverloadedError,
+                         llm_priority)
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+class _Holder:
+    """在线程中占用一个额度，直到 release()"""
+
+    def __init__(self, limiter: ProviderLimiter, priority: int = INTERACTIVE):
+        self._release = threading.Event()
+        self.acquired = threading.Event()
+        self.error = None
+
+        def hold():
+            try:
+                with llm_priority(priority), limiter.slot():
+                    self.acquired.set()
+                    self._release.wait()
+            except ProviderOverloadedError as e:
+                self.error = e
+
+        self.thread = threading.Thread(target=hold, daemon=True)
+        self.thread.start()
+
+    def release(self):
+        self._release.set()
+        self.thread.join(5)
+
+
+def test_interactive_requests_go_first():
+    """额度释放后先放行排队的交互式请求，再放行先到的后台请求"""
+    limiter = ProviderLimiter(max_in_flight=1, background_max_in_flight=1)
+    first = _Holder(limiter)
+    first.acquired.wait(5)
+
+    holders = []
+    for name, priority in [("后台1", BACKGROUND), ("后台2", BACKGROUND), ("交互1", INTERACTIVE)]:
+        holders.append((name, _Holder(limiter, priority)))
+        _wait_until(lambda: limiter.get_stats()["queued"] == len(holders))
+
+    # 同时只放行一个请求，按放行顺序逐个释放
+    first.release()
+    order = []
+    while len(order) < len(holders):
+        waiting = [(name, holder) for name, holder in holders if name not in order]
+        _wait_until(lambda: any(holder.acquired.is_set() for _, holder in waiting))
+        name, holder = next((name, holder) for name, holder in waiting if holder.acquired.is_set())
+        order.append(name)
+        holder.release()
+    assert order == ["交互1", "后台1", "后台2"]
+    assert limiter.get_stats()["in_flight"] == 0
+
+
+def test_background_in_flight_cap():
+    """后台请求最多占用 background_max_in_flight 个并发，交互式请求不受影响"""
+    limiter = ProviderLimiter(max_in_flight=4, background_max_in_flight=1)
+    background = _Holder(limiter, BACKGROUND)
+    background.acquired.wait(5)
+    queued_background = _Holder(limiter, BACKGROUND)
+    _wait_until(lambda: limiter.get_stats()["queued"] == 1)
+
+    interactive = _Holder(limiter, INTERACTIVE)
+    assert interactive.acquired.wait(5)
+    assert not queued_background.acquired.is_set()
+    assert limiter.get_stats()["background_in_flight"] == 1
+
+    background.release()
+    assert queued_background.acquired.wait(5)
+    queued_background.release()
+    interactive.release()
+
+
+def test_full_queue_is_rejected_with_429():
+    limiter = ProviderLimiter(max_in_flight=1, max_queue=1)
+    holder = _Holder(limiter)
+    holder.acquired.wait(5)
+    waiter = _Holder(limiter)
+    _wait_until(lambda: limiter.get_stats()["queued"] == 1)
+
+    try:
+        with limiter.slot():
+            raise AssertionError("队列已满时应拒绝")
+    except ProviderOverloadedError as e:
+        assert e.status_code == 429
+        assert e.retry_after >= 1
+    assert limiter.get_stats()["rejected_queue_full"] == 1
+
+    holder.release()
+    assert waiter.acquired.wait(5)
+    waiter.release()
+
+
+def test_queue_deadline_is_rejected_with_503():
+    """排队超过期限返回503和Retry-After，超时的请求不再占用队列"""
+    limiter = ProviderLimiter(max_in_flight=1, queue_timeout=0.2)
+    holder = _Holder(limiter)
+    holder.acquired.wait(5)
+
+    started_at = time.monotonic()
+    try:
+        with limiter.slot():
+            raise AssertionError("排队超时时应拒绝")
+    except ProviderOverloadedError as e:
+        assert e.status_code == 503
+        assert e.retry_after >= 1
+    assert 0.15 <= time.monotonic() - started_at < 2
+    stats = limiter.get_stats()
+    assert stats["rejected_deadline"] == 1 and stats["queued"] == 0
+    holder.release()
+
+
+def test_token_budget_retry_after():
+    """每分钟token数用完时Retry-After包含额度补足所需的时间"""
+    limiter = ProviderLimiter(tokens_per_minute=600, queue_timeout=0.1)
+    with limiter.slot(600):
+        pass
+    try:
+        with limiter.slot(600):
+            raise AssertionError("token额度不足时应拒绝")
+    except ProviderOverloadedError as e:
+        assert e.status_code == 503
+        assert e.retry_after >= 50
+
+
+def test_cancelled_requests_release_slots():
+    """排队中或生成中被取消（客户端断开）时归还额度"""
+
+    class SlowStreamLLM:
+        async def astream(self, prompt):
+            for i in range(100):
+                await asyncio.sleep(0.01)
+                yield i
+
+    async def scenario():
+        limiter = ProviderLimiter(max_in_flight=1)
+        llm = LimitedChatModel(SlowStreamLLM(), limiter)
+
+        async def consume():
+            async for _ in llm.astream("问题"):
+                pass
+
+        streaming = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        stats = limiter.get_stats()
+        assert stats["in_flight"] == 1 and stats["queued"] == 1
+
+        # 排队中的请求被取消
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert limiter.get_stats()["queued"] == 0
+
+        # 生成中的请求被取消
+        streaming.cancel()
+        await asyncio.gather(streaming, return_exceptions=True)
+        assert limiter.get_stats()["in_flight"] == 0
+
+        # 额度已归还，新请求立即放行
+        async with limiter.aslot():
+            assert limiter.get_stats()["in_flight"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_single_flight_fans_out_errors():
+    """合并的请求失败时所有调用方都收到同一个异常，之后的请求重新发起"""
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise RuntimeError("上游错误")
+
+    errors = []
+
+    def call():
+        try:
+            single_flight.do("key", failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_until(lambda: single_flight.get_stats()["coalesced"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(errors) == 3 and errors[0] is errors[1] is errors[2]
+    assert single_flight.do("key", lambda: "重新发起") == "重新发起"
+
+
+def test_single_flight_async_errors_and_cancellation():
+    """异步合并：发起请求的调用方被取消不影响其他调用方；上游失败时所有调用方收到异常"""
+
+    class StubLLM:
+        def __init__(self):
+            self.calls = 0
+            self.fail = False
+
+        async def ainvoke(self, prompt):
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            if self.fail:
+                raise RuntimeError("上游错误")
+            return f"回答: {prompt}"
+
+        async def astream(self, prompt):
+            self.calls += 1
+            for i in range(3):
+                await asyncio.sleep(0.01)
+                yield i
+            raise RuntimeError("流中断")
+
+    async def scenario():
+        stub = StubLLM()
+        llm = CoalescingChatModel(stub, ("stub", 0.0, 1.0), SingleFlight())
+
+        leader = asyncio.create_task(llm.ainvoke("问题"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(llm.ainvoke("问题"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == "回答: 问题"
+        assert stub.calls == 1
+
+        stub.fail = True
+        results = await asyncio.gather(*(llm.ainvoke("另一个问题") for _ in range(3)), return_exceptions=True)
+        assert stub.calls == 2
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        async def collect():
+            chunks = []
+            try:
+                async for chunk in llm.astream("流式问题"):
+                    chunks.append(chunk)
+            except RuntimeError as e:
+                return chunks, e
+            return chunks, None
+
+        results = await asyncio.gather(collect(), collect())
+        assert stub.calls == 3
+        for chunks, error in results:
+            assert chunks == [0, 1, 2]
+            assert isinstance(error, RuntimeError)
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_interactive_requests_go_first()
+    test_background_in_flight_cap()
+    test_full_queue_is_rejected_with_429()
+    test_queue_deadline_is_rejected_with_503()
+    test_token_budget_retry_after()
+    test_cancelled_requests_release_slots()
+    test_single_flight_fans_out_errors()
+    test_single_flight_async_errors_and_cancellation()
+    print("✓ LLM限流和请求合并测试通过")
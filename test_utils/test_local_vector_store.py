@@ -0,0 +1,137 @@
+"""
+本地向量库测试 - 使用随机向量，不调用向量模型
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.rag_agent.local_vector_store import LocalCollection, hnswlib
+
+DIM = 16
+
+
+def _vectors(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+
+
+def _ids(start: int, count: int):
+    return [str(i) for i in range(start, start + count)]
+
+
+def test_int8_auto_does_not_build_hnsw():
+    """int8量化时auto模式达到点数也不构建HNSW，检索结果与暴力检索一致"""
+    vectors = _vectors(300)
+    with tempfile.TemporaryDirectory() as tmp:
+        flat = LocalCollection(os.path.join(tmp, "flat"), DIM, index_type="flat")
+        quantized = LocalCollection(os.path.join(tmp, "int8"), DIM, index_type="auto", hnsw_min_points=100,
+                                    quantization="int8", oversampling=5)
+        for collection in (flat, quantized):
+            collection.upsert(_ids(0, 300), vectors, [{} for _ in range(300)])
+        assert quantized.hnsw is None
+        assert not os.path.exists(os.path.join(tmp, "int8", "hnsw.bin"))
+
+        for query in _vectors(10, seed=1):
+            expected = flat.search(query, 5)
+            found = quantized.search(query, 5)
+            assert [point_id for point_id, _ in found] == [point_id for point_id, _ in expected]
+            assert np.allclose([score for _, score in found], [score for _, score in expected], atol=1e-5)
+        flat.close()
+        quantized.close()
+
+
+def test_int8_with_hnsw_is_rejected():
+    """int8量化与HNSW索引不能同时使用"""
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            LocalCollection(os.path.join(tmp, "int8"), DIM, index_type="hnsw", quantization="int8")
+        except ValueError:
+            return
+    raise AssertionError("应拒绝 int8 + hnsw 配置")
+
+
+def test_auto_builds_hnsw_without_quantization():
+    if hnswlib is None:
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        collection = LocalCollection(os.path.join(tmp, "float32"), DIM, index_type="auto", hnsw_min_points=100)
+        collection.upsert(_ids(0, 150), _vectors(150), [{} for _ in range(150)])
+        assert collection.hnsw is not None
+        collection.close()
+
+
+
+def _check_search(collection: LocalCollection, vectors: dict):
+    """每个存活的点用自身向量检索时排在第一位"""
+    for point_id, vector in vectors.items():
+        assert collection.search(vector, 1)[0][0] == point_id
+
+
+def test_compaction_after_deletes():
+    """删除的行达到阈值时自动压缩：文件变小、行号连续，重新打开后数据一致"""
+    vectors = _vectors(3000)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "float32")
+        collection = LocalCollection(path, DIM, index_type="flat", compact_threshold=0.5)
+        collection.upsert(_ids(0, 3000), vectors, [{"n": i} for i in range(3000)])
+        collection.delete(_ids(0, 1000))
+        assert collection.row_count == 3000
+        collection.delete(_ids(1000, 600))
+        # 1600/3000 行已删除，超过阈值后压缩
+        assert collection.row_count == len(collection) == 1400
+        assert collection.generation == 1
+        assert not os.path.exists(os.path.join(path, "vectors.f32"))
+        expected = {str(i): vectors[i] for i in range(1600, 3000)}
+        _check_search(collection, expected)
+
+        # 压缩后继续写入和覆盖
+        collection.upsert(["1600", "5000"], _vectors(2, seed=2), [{"n": -1}, {"n": 5000}])
+        expected["1600"], expected["5000"] = _vectors(2, seed=2)
+        collection.close()
+
+        reopened = LocalCollection(path, DIM, index_type="flat", compact_threshold=0.5)
+        assert len(reopened) == 1401
+        assert reopened.get_payloads(["1600", "5000", "2999"]) == {"1600": {"n": -1}, "5000": {"n": 5000},
+                                                                   "2999": {"n": 2999}}
+        _check_search(reopened, expected)
+        reopened.close()
+
+
+def test_manual_compaction_with_int8_and_hnsw():
+    """手动压缩：int8量化和HNSW索引都按压缩后的行号重建"""
+    vectors = _vectors(600)
+    with tempfile.TemporaryDirectory() as tmp:
+        collections = [
+            LocalCollection(os.path.join(tmp, "int8"), DIM, quantization="int8", oversampling=5, compact_threshold=0)
+        ]
+        if hnswlib is not None:
+            collections.append(LocalCollection(os.path.join(tmp, "hnsw"), DIM, index_type="hnsw", compact_threshold=0))
+        for collection in collections:
+            collection.upsert(_ids(0, 600), vectors, [{} for _ in range(600)])
+            collection.delete(_ids(0, 400))
+            assert collection.row_count == 600
+            assert collection.compact() == 400
+            assert collection.compact() == 0
+            expected = {str(i): vectors[i] for i in range(400, 600)}
+            _check_search(collection, expected)
+            collection.close()
+
+            reopened = LocalCollection(collection.path, DIM, index_type=collection.index_type,
+                                       quantization="int8" if collection.quantized else "none")
+            assert reopened.row_count == 200
+            assert (reopened.hnsw is not None) == (collection.index_type == "hnsw")
+            _check_search(reopened, expected)
+            reopened.close()
+
+
+if __name__ == "__main__":
+    test_int8_auto_does_not_build_hnsw()
+    test_int8_with_hnsw_is_rejected()
+    test_auto_builds_hnsw_without_quantization()
+    test_compaction_after_deletes()
+    test_manual_compaction_with_int8_and_hnsw()
+    print("✓ 本地向量库测试通过")
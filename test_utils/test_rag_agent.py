@@ -0,0 +1,111 @@
+"""
+RAG智能体测试 - 使用桩检索和桩LLM，不调用向量模型和向量库
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# 只用于创建LLM客户端，测试中不会发出请求
+os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
+
+from agents.rag_agent import MedicalRAG
+from agents.rag_agent.locked_client import LockedClient
+from agents.rag_agent.reranker import Reranker
+
+
+def _create_rag(retrieved):
+    """跳过向量库初始化，检索直接返回给定的 (文档, 分数) 列表"""
+    rag = MedicalRAG.__new__(MedicalRAG)
+    rag.config = SimpleNamespace(min_retrieval_confidence=0.4, reranker_top_k=2, rerank_budget_ms=0,
+                                 include_sources=True)
+    rag.vectorstores = {"医疗知识库": object()}
+    rag.reranker = Reranker()
+    rag.response_prompt = PromptTemplate.from_template("{conversation_history}\n{context}\n{query}")
+    rag.llm = SimpleNamespace(invoke=lambda prompt: SimpleNamespace(content="回答"))
+    rag._retrieve = lambda query, search_kbs: list(retrieved)
+    return rag
+
+
+def _doc(text: str) -> Document:
+    return Document(page_content=text, metadata={"knowledge_base": "医疗知识库"})
+
+
+def test_confidence_uses_best_vector_score():
+    """混合检索按融合排名排序时，置信度与置信度检查使用同一个最好的向量分数"""
+    # 融合排名第一的文档向量分数不是最好的（分数越小越相似）
+    rag = _create_rag([(_doc("BM25命中"), 0.35), (_doc("向量最相似"), 0.12), (_doc("其他"), 0.3)])
+    result = rag.query("高血压")
+    assert result["response"] == "回答"
+    assert result["confidence"] == 0.12
+
+
+def test_low_confidence_skips_generation():
+    rag = _create_rag([(_doc("不相关"), 0.8), (_doc("不相关"), 0.9)])
+    result = rag.query("高血压")
+    assert result["confidence"] == 0.0
+    assert not result["sources"]
+
+
+class ReentrancyCheckingClient:
+    """记录是否有两个线程同时调用"""
+
+    def __init__(self):
+        self.active = 0
+        self.overlapped = False
+        self.name = "本地客户端"
+
+    def search(self, collection_name):
+        self.active += 1
+        self.overlapped |= self.active > 1
+        time.sleep(0.01)
+        self.active -= 1
+        return collection_name
+
+
+def test_locked_client_serializes_calls():
+    """本地模式的客户端加锁后多个线程的调用不会同时执行"""
+    stub = ReentrancyCheckingClient()
+    client = LockedClient(stub)
+    assert client.name == "本地客户端"
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(client.search, ["a", "b", "c", "d"])) == ["a", "b", "c", "d"]
+    assert not stub.overlapped
+
+
+def test_local_client_searches_knowledge_bases_serially():
+    """本地Qdrant（没有检索线程池）在调用线程中逐个检索知识库"""
+    threads = []
+
+    class StubVectorStore:
+        def __init__(self, name):
+            self.collection_name = name
+
+        def similarity_search_with_score_by_vector(self, vector, k, **kwargs):
+            threads.append(threading.current_thread())
+            return [(Document(page_content=self.collection_name, metadata={}), 0.1)]
+
+    rag = MedicalRAG.__new__(MedicalRAG)
+    rag.config = SimpleNamespace(top_k=3, hybrid_search_enabled=False)
+    rag.embedding_model = SimpleNamespace(embed_query=lambda query: [1.0, 0.0])
+    rag.vectorstores = {"kb1": StubVectorStore("c1"), "kb2": StubVectorStore("c2")}
+    rag._search_kwargs = {}
+    rag._search_executor = None
+    docs = rag._retrieve("高血压", ["kb1", "kb2"])
+    assert sorted(doc.metadata["knowledge_base"] for doc, _ in docs) == ["kb1", "kb2"]
+    assert threads == [threading.current_thread()] * 2
+
+
+if __name__ == "__main__":
+    test_confidence_uses_best_vector_score()
+    test_low_confidence_skips_generation()
+    test_locked_client_serializes_calls()
+    test_local_client_searches_knowledge_bases_serially()
+    print("✓ RAG智能体测试通过")
@@ -0,0 +1,69 @@
+"""
+文本分块测试 - 句子边界重叠、按字符重叠的退化情况和超长句子
+"""
+import os
+import sys
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from ingestion.text_splitter import TextSplitter
+
+
+def _check_chunks(text: str, chunks, splitter: TextSplitter):
+    """偏移与内容一致，分块不超过chunk_size，起点递增且不早于上一个分块，覆盖全部文本"""
+    assert [chunk["index"] for chunk in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert text[chunk["start"]:chunk["end"]] == chunk["text"]
+        assert len(chunk["text"]) <= splitter.chunk_size
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous["start"] < chunk["start"] <= previous["end"]
+    assert chunks[0]["start"] == 0 and chunks[-1]["end"] == len(text)
+
+
+def test_overlap_starts_at_sentence_boundary():
+    """重叠部分从句子边界开始：下一个分块以上一个分块的最后一句开头"""
+    splitter = TextSplitter(chunk_size=25, chunk_overlap=12)
+    sentences = ["高血压需要低盐饮食。", "糖尿病需要控制血糖。", "感冒多喝水多休息。", "骨折需要及时就医。"]
+    text = "".join(sentences)
+    chunks = list(splitter.split(text))
+    _check_chunks(text, chunks, splitter)
+    assert chunks[0]["text"] == "".join(sentences[:2])
+    assert chunks[1]["text"].startswith(sentences[1])
+
+
+def test_character_overlap_fallback():
+    """句子比重叠长时退化为按字符重叠；短句后跟超长句子时重叠不会早于上一个分块的起点"""
+    splitter = TextSplitter(chunk_size=30, chunk_overlap=10)
+    text = "短句。" + "长" * 70 + "。结尾。"
+    chunks = list(splitter.split(text))
+    _check_chunks(text, chunks, splitter)
+    assert chunks[1]["start"] == chunks[0]["end"] - splitter.chunk_overlap
+
+    class UnsplitSpans(TextSplitter):
+        """句子区间不按 chunk_size - chunk_overlap 切开，上一个分块可能比重叠部分短"""
+
+        def _split_long_span(self, start, end):
+            yield start, end
+
+    splitter = UnsplitSpans(chunk_size=30, chunk_overlap=10)
+    text = "短句。" + "长" * 30 + "。"
+    chunks = list(splitter.split(text))
+    assert [chunk["start"] for chunk in chunks] == [0, 0]
+    assert chunks[1]["text"] == text
+
+
+def test_sentence_longer_than_chunk_size():
+    """超长句子按固定长度切开，加上重叠部分后不超过chunk_size"""
+    splitter = TextSplitter(chunk_size=20, chunk_overlap=5)
+    text = "开头。" + "没有标点的超长句子" * 10 + "。结尾。"
+    chunks = list(splitter.split(text))
+    _check_chunks(text, chunks, splitter)
+    assert len(chunks) > len(text) // splitter.chunk_size
+
+
+if __name__ == "__main__":
+    test_overlap_starts_at_sentence_boundary()
+    test_character_overlap_fallback()
+    test_sentence_longer_than_chunk_size()
+    print("✓ 文本分块测试通过")
@@ -0,0 +1,64 @@
+"""
+知识库文件夹监听测试 - 使用桩导入管道，不调用向量模型和向量库
+"""
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# 添加父目录到系统路径，以便导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import ingestion.watcher as watcher_module
+from ingestion.watcher import KnowledgeBaseWatcher
+
+
+class StubPipeline:
+    """按顺序返回预设失败文件数的导入管道"""
+    failures = []
+    runs = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def run(self, folder, knowledge_base=None):
+        StubPipeline.runs.append(folder)
+        failed = StubPipeline.failures.pop(0) if StubPipeline.failures else 0
+        return {"added_files": 1, "updated_files": 0, "deleted_files": 0, "failed_files": failed}
+
+
+def test_failed_files_are_retried_on_next_poll():
+    """有文件导入失败时不记录快照，文件不再变化也会在之后的检查中重试，成功后不再导入"""
+    original = watcher_module.IngestionPipeline
+    watcher_module.IngestionPipeline = StubPipeline
+    StubPipeline.failures, StubPipeline.runs = [1], []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            kb_folder = os.path.join(tmp, "medical")
+            os.makedirs(kb_folder)
+            with open(os.path.join(kb_folder, "a.txt"), 'w', encoding='utf-8') as f:
+                f.write("高血压患者需要低盐饮食。")
+            watcher = KnowledgeBaseWatcher(SimpleNamespace(vectorstores={"medical": None}), tmp,
+                                           splitter=None, settle_seconds=1.0)
+
+            # 发现变化，等待稳定后导入（失败）
+            watcher.poll_once(now=0.0)
+            watcher.poll_once(now=1.0)
+            assert len(StubPipeline.runs) == 1
+
+            # 文件没有变化，仍然重试（成功）
+            watcher.poll_once(now=2.0)
+            watcher.poll_once(now=3.0)
+            assert len(StubPipeline.runs) == 2
+
+            # 成功后不再重复导入
+            watcher.poll_once(now=4.0)
+            watcher.poll_once(now=5.0)
+            assert len(StubPipeline.runs) == 2
+    finally:
+        watcher_module.IngestionPipeline = original
+
+
+if __name__ == "__main__":
+    test_failed_files_are_retried_on_next_poll()
+    print("✓ 知识库文件夹监听测试通过")
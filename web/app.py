@@ -1,11 +1,13 @@
 """
 FastAPI应用初始化
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 
+from .semantic_cache import SemanticCache
 from .session_manager import SessionManager
 from .routes import chat_router, config_router, health_router
 from .routes.chat import init_chat_routes
@@ -14,12 +16,19 @@ from .routes.health import init_health_routes
 
 # 导入智能体
 from agents.agent_decision import AgentDecision
+from agents.executor import install_default_executor
 from agents.rag_agent import MedicalRAG
 from agents.web_search_agent import WebSearchAgent
 from agents.conversation_agent import ConversationAgent
 
 # 导入配置管理器
 from config_manager import ConfigManager
+from config import SemanticCacheConfig
+from llm_clients import get_client_registry
+
+from ingestion.dedup import NearDuplicateFilter
+from ingestion.text_splitter import TextSplitter
+from ingestion.watcher import KnowledgeBaseWatcher
 
 
 def create_app() -> FastAPI:
@@ -29,11 +38,66 @@ def create_app() -> FastAPI:
     Returns:
         FastAPI: 配置好的FastAPI应用实例
     """
+    # 初始化组件
+    session_manager = SessionManager()
+    config_manager = ConfigManager()
+    
+    # 初始化智能体（传入配置管理器）
+    rag_agent = MedicalRAG(config_manager)
+    # 本地快速路由与检索共用向量化模型和向量缓存
+    agent_decision = AgentDecision(
+        config_manager,
+        embedding_model=rag_agent.embedding_model,
+        knowledge_bases=rag_agent.get_all_knowledge_bases()
+    )
+    web_search_agent = WebSearchAgent(config_manager)
+    conversation_agent = ConversationAgent(config_manager)
+    
+    # 随服务监听知识库文件夹（本地Qdrant只允许一个进程打开，与服务共用同一个RAG智能体）
+    rag_config = rag_agent.config
+    watcher = None
+    if rag_config.watch_enabled:
+        watcher = KnowledgeBaseWatcher(
+            rag_agent,
+            rag_config.watch_folder,
+            TextSplitter(rag_config.chunk_size, rag_config.chunk_overlap),
+            interval=rag_config.watch_interval,
+            settle_seconds=rag_config.watch_settle_seconds,
+            dedup=NearDuplicateFilter(rag_config.dedup_max_distance, rag_config.dedup_scope)
+            if rag_config.dedup_enabled else None
+        )
+    
+    # 语义答案缓存（相似问题直接返回缓存的回答）
+    cache_config = SemanticCacheConfig()
+    semantic_cache = None
+    if cache_config.enabled:
+        semantic_cache = SemanticCache(
+            similarity_threshold=cache_config.similarity_threshold,
+            ttl_seconds=cache_config.ttl_seconds,
+            max_entries=cache_config.max_entries
+        )
+    
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        """服务启动和关闭"""
+        # LLM客户端异步接口内部的同步请求也使用共享的有界线程池
+        install_default_executor()
+        if watcher is not None:
+            watcher.start()
+        try:
+            yield
+        finally:
+            if watcher is not None:
+                watcher.stop()
+            # 服务关闭时释放共享的LLM连接池
+            await get_client_registry().aclose()
+    
     # 创建FastAPI应用
     app = FastAPI(
         title="简易医疗Agent系统",
         description="基于LLM的智能医疗咨询系统(文字版)",
-        version="2.0.0"
+        version="2.0.0",
+        lifespan=lifespan
     )
     
     # 配置CORS
@@ -50,16 +114,6 @@ def create_app() -> FastAPI:
     if os.path.exists(static_dir):
         app.mount("/static", StaticFiles(directory=static_dir), name="static")
     
-    # 初始化组件
-    session_manager = SessionManager()
-    config_manager = ConfigManager()
-    
-    # 初始化智能体（传入配置管理器）
-    agent_decision = AgentDecision(config_manager)
-    rag_agent = MedicalRAG(config_manager)
-    web_search_agent = WebSearchAgent(config_manager)
-    conversation_agent = ConversationAgent(config_manager)
-    
     # 初始化各个路由模块的依赖
     init_chat_routes(
         session_manager,
@@ -67,7 +121,8 @@ def create_app() -> FastAPI:
         rag_agent,
         web_search_agent,
         conversation_agent,
-        config_manager
+        config_manager,
+        semantic_cache
     )
     
     init_config_routes(
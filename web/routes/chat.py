@@ -1,8 +1,14 @@
 """
 聊天相关路由
 """
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from ..models import ChatRequest, ChatResponse
+from agents.executor import run_blocking
+from llm_limiter import ProviderOverloadedError
 
 # 创建路由
 router = APIRouter()
@@ -14,9 +20,10 @@ rag_agent = None
 web_search_agent = None
 conversation_agent = None
 config_manager = None
+semantic_cache = None
 
 
-def init_chat_routes(sm, ad, ra, wsa, ca, cm):
+def init_chat_routes(sm, ad, ra, wsa, ca, cm, sc=None):
     """
     初始化聊天路由的依赖
     
@@ -27,102 +34,316 @@ def init_chat_routes(sm, ad, ra, wsa, ca, cm):
         wsa: WebSearchAgent - 网络搜索Agent
         ca: ConversationAgent - 对话Agent
         cm: ConfigManager - 配置管理器
+        sc: SemanticCache - 语义答案缓存，None表示不缓存
     """
     global session_manager, agent_decision, rag_agent, web_search_agent, conversation_agent, config_manager
+    global semantic_cache
     session_manager = sm
     agent_decision = ad
     rag_agent = ra
     web_search_agent = wsa
     conversation_agent = ca
     config_manager = cm
+    semantic_cache = sc
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """处理聊天请求"""
-    try:
-        # 初始化调试信息
-        debug_info = {
-            "llm_calls": [],
-            "decision_agent": None,
-            "execution_agent": None
+def _cache_namespace():
+    """缓存命名空间：提示词或知识库变化后旧的缓存回答全部失效"""
+    return config_manager.get_prompt_version(), rag_agent.get_knowledge_base_version()
+
+
+def _response_data(session_id: str, result: Dict, debug_info: Dict) -> Dict:
+    """组装 ChatResponse 的字段"""
+    return {
+        "session_id": session_id,
+        "agent": result["agent"],
+        "response": result["response"],
+        "sources": result.get("sources", []),
+        "confidence": result.get("confidence"),
+        "debug_info": debug_info
+    }
+
+
+async def _decide_route(request: ChatRequest, previous_history: List[Dict], query_vector: Optional[List[float]],
+                        debug_info: Dict) -> Tuple[str, Optional[List[str]]]:
+    """
+    路由决策：选择智能体，RAG时同时选出知识库
+    
+    所有决策都使用当前问题之前的对话历史，当前问题只作为 query 出现在提示词中
+    
+    Returns:
+        (智能体类型, RAG时选定的知识库列表)
+    """
+    # Agent决策：先尝试本地快速路由，置信度不够时再调用LLM（合并决策时同时选出知识库）
+    selected_kbs = None
+    purpose = None
+    available_kbs = rag_agent.get_all_knowledge_bases() if config_manager.is_rag_enabled() else {}
+    fast_decision = await agent_decision.afast_route(request.query, previous_history, available_kbs, query_vector)
+    if agent_decision.fast_router is not None:
+        debug_info["fast_router"] = {
+            "hit": fast_decision is not None,
+            **agent_decision.fast_router.get_stats()
         }
+    if fast_decision is not None:
+        agent_type, selected_kbs = fast_decision["agent"], fast_decision["knowledge_bases"] or None
+        debug_info["fast_router"].update({
+            "method": fast_decision["method"],
+            "similarity": fast_decision["similarity"]
+        })
+    else:
+        # 知识库向量路由：足够确定时LLM只需决定智能体类型，提示词里不再列出知识库
+        if available_kbs and rag_agent.config.kb_routing == "embedding":
+            try:
+                kb_routing = await rag_agent.aroute_knowledge_bases(request.query, query_vector)
+                debug_info["kb_routing"] = kb_routing
+                selected_kbs = kb_routing["knowledge_bases"] or None
+            except Exception as e:
+                print(f"⚠️  知识库向量路由失败: {e}")
         
-        # 获取或创建session
-        session_id, conversation_history = session_manager.get_or_create_session(
-            request.session_id
-        )
-        
-        # 添加用户消息到历史
-        session_manager.add_message(session_id, "user", request.query)
-        
-        # Agent决策
-        agent_type = agent_decision.decide(request.query, conversation_history)
-        debug_info["decision_agent"] = agent_type
+        if selected_kbs is None and agent_decision.config.combined_routing:
+            agent_type, selected_kbs = await agent_decision.adecide_route(
+                request.query, previous_history, available_kbs
+            )
+            purpose = "路由决策 + 知识库选择"
+        else:
+            agent_type = await agent_decision.adecide(request.query, previous_history)
+            purpose = "路由决策"
+    debug_info["decision_agent"] = agent_type
+    if purpose:
         debug_info["llm_calls"].append({
             "agent": "Agent决策系统",
             "model": agent_decision.config.model_name,
-            "purpose": "路由决策"
+            "purpose": purpose
         })
+    
+    # 检查RAG是否启用，如果禁用则不使用RAG
+    if agent_type == "RAG" and not config_manager.is_rag_enabled():
+        # RAG被禁用，改为使用对话Agent
+        agent_type = "CONVERSATION"
+        debug_info["decision_agent"] = f"RAG(已禁用) -> {agent_type}"
+    
+    if agent_type == "RAG" and selected_kbs is None:
+        # 获取可用的知识库
+        available_kbs = rag_agent.get_all_knowledge_bases()
         
-        # 检查RAG是否启用，如果禁用则不使用RAG
-        if agent_type == "RAG" and not config_manager.is_rag_enabled():
-            # RAG被禁用，改为使用对话Agent
-            agent_type = "CONVERSATION"
-            debug_info["decision_agent"] = f"RAG(已禁用) -> {agent_type}"
+        # 决定使用哪个知识库
+        selected_kbs = await agent_decision.adecide_knowledge_base(request.query, available_kbs)
+        debug_info["llm_calls"].append({
+            "agent": "知识库路由系统",
+            "model": agent_decision.config.model_name,
+            "purpose": "知识库选择决策"
+        })
+    return agent_type, selected_kbs
+
+
+async def _chat_events(request: ChatRequest, stream: bool) -> AsyncIterator[Dict]:
+    """
+    处理聊天请求，按处理进度产出事件（所有阻塞调用都在线程池或LLM异步接口中执行，不阻塞事件循环）
+    
+    Args:
+        request: 聊天请求
+        stream: 是否流式生成回答；否则只产出 decision 和 done 事件
         
-        # 根据决策调用相应的Agent
-        if agent_type == "RAG":
-            # 获取可用的知识库
-            available_kbs = rag_agent.get_all_knowledge_bases()
-            
-            # 决定使用哪个知识库
-            selected_kbs = agent_decision.decide_knowledge_base(request.query, available_kbs)
-            debug_info["selected_knowledge_bases"] = selected_kbs
-            debug_info["llm_calls"].append({
-                "agent": "知识库路由系统",
-                "model": agent_decision.config.model_name,
-                "purpose": "知识库选择决策"
-            })
-            
-            # 查询选定的知识库
-            result = rag_agent.query(request.query, conversation_history, knowledge_bases=selected_kbs)
-            debug_info["execution_agent"] = "RAG智能体"
-            debug_info["llm_calls"].append({
-                "agent": "RAG智能体",
-                "model": rag_agent.config.model_name if hasattr(rag_agent, 'config') else "未知",
-                "purpose": "知识库检索回答",
-                "knowledge_bases": selected_kbs
-            })
-        elif agent_type == "WEBSEARCH":
-            result = web_search_agent.search(request.query, conversation_history)
-            debug_info["execution_agent"] = "网络搜索智能体"
-            debug_info["llm_calls"].append({
-                "agent": "网络搜索智能体",
-                "model": web_search_agent.config.model_name if hasattr(web_search_agent, 'config') else "未知",
-                "purpose": "网络搜索结果总结"
-            })
-        else:  # CONVERSATION
-            result = conversation_agent.chat(request.query, conversation_history)
-            debug_info["execution_agent"] = "对话智能体"
-            debug_info["llm_calls"].append({
-                "agent": "对话智能体",
-                "model": conversation_agent.config.model_name,
-                "purpose": "对话生成"
+    Yields:
+        {"event": 事件类型, "data": 数据}，事件类型依次为
+        decision（路由决策）、sources（检索/搜索来源）、token（回答片段）、done（完整的 ChatResponse 字段）；
+        命中语义缓存时只有 done
+    """
+    # 初始化调试信息
+    debug_info = {
+        "llm_calls": [],
+        "decision_agent": None,
+        "execution_agent": None
+    }
+    
+    # 获取或创建session
+    session_id, conversation_history = session_manager.get_or_create_session(
+        request.session_id
+    )
+    
+    # 当前问题之前的对话历史（conversation_history 是会话自身的列表，加入当前问题后会随之变化）
+    previous_history = list(conversation_history)
+    
+    # 只缓存会话的第一个问题，后续问题的回答依赖对话历史
+    query_vector = None
+    if semantic_cache is not None and not previous_history:
+        try:
+            query_vector = await run_blocking(rag_agent.embedding_model.embed_query, request.query)
+        except Exception as e:
+            print(f"⚠️  语义缓存查询向量化失败: {e}")
+    
+    # 添加用户消息到历史
+    session_manager.add_message(session_id, "user", request.query)
+    
+    if query_vector is not None:
+        # 回答按查找时的命名空间缓存，生成期间知识库或提示词变化时不缓存
+        namespace = _cache_namespace()
+        cached = semantic_cache.lookup(query_vector, namespace)
+        debug_info["semantic_cache"] = {
+            "hit": cached is not None,
+            **semantic_cache.get_stats()
+        }
+        if cached is not None:
+            result = cached["result"]
+            debug_info["semantic_cache"].update({
+                "similarity": round(cached["similarity"], 4),
+                "matched_query": cached["query"]
             })
+            debug_info["decision_agent"] = result["agent"]
+            debug_info["execution_agent"] = "语义缓存"
+            session_manager.add_message(session_id, "assistant", result["response"])
+            yield {"event": "done", "data": _response_data(session_id, result, debug_info)}
+            return
+    
+    # 推测检索：与路由决策同时检索所有知识库，决策不是RAG时丢弃结果
+    speculative = None
+    if rag_agent.config.speculative_retrieval and config_manager.is_rag_enabled():
+        speculative = rag_agent.speculative_retrieve(request.query)
+    
+    try:
+        agent_type, selected_kbs = await _decide_route(request, previous_history, query_vector, debug_info)
         
-        # 添加助手回复到历史
-        session_manager.add_message(session_id, "assistant", result["response"])
+        # 不使用RAG时丢弃推测检索（还没开始的直接取消）
+        if speculative is not None and agent_type != "RAG":
+            speculative.cancel()
         
-        return ChatResponse(
-            session_id=session_id,
-            agent=result["agent"],
-            response=result["response"],
-            sources=result.get("sources", []),
-            confidence=result.get("confidence"),
-            debug_info=debug_info
-        )
+        # 路由决策完成，流式接口先把决策推送给客户端
+        yield {"event": "decision", "data": {
+            "session_id": session_id,
+            "agent_type": agent_type,
+            "knowledge_bases": selected_kbs if agent_type == "RAG" else [],
+            "debug_info": debug_info
+        }}
+    except BaseException:
+        # 路由出错（例如LLM限流拒绝）或客户端断开时推测检索的结果不会再用到
+        if speculative is not None:
+            speculative.cancel()
+        raise
+    
+    # 根据决策调用相应的Agent（流式接口逐段推送来源和回答）
+    if agent_type == "RAG":
+        debug_info["selected_knowledge_bases"] = selected_kbs
         
+        # 查询选定的知识库
+        if stream:
+            async for event in rag_agent.astream_query(request.query, conversation_history,
+                                                       knowledge_bases=selected_kbs, speculative=speculative):
+                if event["event"] == "result":
+                    result = event["data"]
+                else:
+                    yield event
+        else:
+            result = await rag_agent.aquery(request.query, conversation_history, knowledge_bases=selected_kbs,
+                                            speculative=speculative)
+        debug_info["execution_agent"] = "RAG智能体"
+        debug_info["llm_calls"].append({
+            "agent": "RAG智能体",
+            "model": rag_agent.config.model_name if hasattr(rag_agent, 'config') else "未知",
+            "purpose": "知识库检索回答",
+            "knowledge_bases": selected_kbs
+        })
+        if result.get("timings"):
+            debug_info["rag_timings"] = result["timings"]
+    elif agent_type == "WEBSEARCH":
+        if stream:
+            async for event in web_search_agent.astream_search(request.query, conversation_history):
+                if event["event"] == "result":
+                    result = event["data"]
+                else:
+                    yield event
+        else:
+            result = await web_search_agent.asearch(request.query, conversation_history)
+        debug_info["execution_agent"] = "网络搜索智能体"
+        debug_info["llm_calls"].append({
+            "agent": "网络搜索智能体",
+            "model": web_search_agent.config.model_name if hasattr(web_search_agent, 'config') else "未知",
+            "purpose": "网络搜索结果总结"
+        })
+    else:  # CONVERSATION
+        if stream:
+            async for event in conversation_agent.astream_chat(request.query, conversation_history):
+                if event["event"] == "result":
+                    result = event["data"]
+                else:
+                    yield event
+        else:
+            result = await conversation_agent.achat(request.query, conversation_history)
+        debug_info["execution_agent"] = "对话智能体"
+        debug_info["llm_calls"].append({
+            "agent": "对话智能体",
+            "model": conversation_agent.config.model_name,
+            "purpose": "对话生成"
+        })
+    
+    # 网络搜索结果有时效性，不缓存；出错的回答和知识库没有找到资料的回答也不缓存
+    cacheable = agent_type == "CONVERSATION" or (agent_type == "RAG" and result.get("sources"))
+    if query_vector is not None and cacheable and not result.get("error") and _cache_namespace() == namespace:
+        semantic_cache.store(request.query, query_vector, namespace, {
+            key: result.get(key) for key in ("agent", "response", "sources", "confidence")
+        })
+    
+    # 添加助手回复到历史
+    session_manager.add_message(session_id, "assistant", result["response"])
+    
+    yield {"event": "done", "data": _response_data(session_id, result, debug_info)}
+    
+
+
+def _overloaded_exception(e: ProviderOverloadedError) -> HTTPException:
+    """LLM限流排队失败：队列已满返回429，排队超时返回503，都带 Retry-After"""
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    """处理聊天请求"""
+    try:
+        async for event in _chat_events(request, stream=False):
+            if event["event"] == "done":
+                return ChatResponse(**event["data"])
+    except ProviderOverloadedError as e:
+        raise _overloaded_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def _format_sse(event: str, data) -> str:
+    """编码一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    流式处理聊天请求（Server-Sent Events）
+    
+    依次推送 decision、sources、token、done 事件，出错时推送 error 事件；
+    路由决策阶段被LLM限流拒绝时直接返回429/503（响应开始之后被拒绝时 error 事件中带 retry_after）
+    """
+    events = _chat_events(request, stream=True)
+    try:
+        # 先完成路由决策再开始响应，限流拒绝才能以状态码返回
+        first_event = await events.__anext__()
+    except ProviderOverloadedError as e:
+        raise _overloaded_exception(e)
+    except Exception as e:
+        first_event = {"event": "error", "data": {"detail": str(e)}}
+    
+    async def event_source():
+        yield _format_sse(first_event["event"], first_event["data"])
+        if first_event["event"] in ("done", "error"):
+            return
+        try:
+            async for event in events:
+                yield _format_sse(event["event"], event["data"])
+        except ProviderOverloadedError as e:
+            yield _format_sse("error", {"detail": str(e), "status_code": e.status_code,
+                                        "retry_after": e.retry_after})
+        except Exception as e:
+            yield _format_sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -5,6 +5,8 @@ from fastapi import APIRouter
 from fastapi.responses import HTMLResponse
 import os
 
+from llm_clients import get_client_registry
+
 # 创建路由
 router = APIRouter()
 
@@ -47,6 +49,7 @@ async def get_agents():
     """获取可用的Agent信息"""
     return {
         "agents": agent_decision.get_agent_info(),
-        "current_sessions": session_manager.get_session_count()
+        "current_sessions": session_manager.get_session_count(),
+        "llm_clients": get_client_registry().get_stats()
     }
 
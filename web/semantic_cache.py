@@ -0,0 +1,122 @@
+"""
+语义缓存 - 按查询向量的余弦相似度命中已回答过的问题，跳过决策、路由和回答的LLM调用
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    语义答案缓存
+
+    缓存条目属于一个版本命名空间（提示词版本、知识库版本），
+    版本变化后旧条目全部失效；超过TTL的条目不会命中，超出容量时按最近访问时间（LRU）淘汰
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 1000):
+        """
+        Args:
+            similarity_threshold: 命中所需的最小余弦相似度
+            ttl_seconds: 条目有效期（秒）
+            max_entries: 最多缓存的条目数
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._namespace: Optional[Hashable] = None
+        self._next_id = 0
+        # 所有条目的向量矩阵，条目变化后重建
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _check_namespace(self, namespace: Hashable):
+        """提示词或知识库版本变化时清空缓存"""
+        if namespace != self._namespace:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+            self._namespace = namespace
+
+    def _expire(self, now: float):
+        expired = [entry_id for entry_id, entry in self._entries.items()
+                   if now - entry["created_at"] > self.ttl_seconds]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._matrix = None
+
+    def lookup(self, query_vector: List[float], namespace: Hashable) -> Optional[Dict]:
+        """
+        查找语义相似的已缓存回答
+
+        Returns:
+            命中时返回 {"result": 缓存的回答, "query": 原始问题, "similarity": 相似度}，否则返回None
+        """
+        query = self._normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            self._check_namespace(namespace)
+            self._expire(now)
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_ids = list(self._entries.keys())
+                    self._matrix = np.stack([self._entries[entry_id]["vector"] for entry_id in self._matrix_ids])
+                similarities = self._matrix @ query
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+                if similarity >= self.similarity_threshold:
+                    entry_id = self._matrix_ids[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    entry = self._entries[entry_id]
+                    return {"result": entry["result"], "query": entry["query"], "similarity": similarity}
+            self.misses += 1
+            return None
+
+    def store(self, query: str, query_vector: List[float], namespace: Hashable, result: Dict):
+        """缓存一个回答"""
+        with self._lock:
+            self._check_namespace(namespace)
+            self._entries[self._next_id] = {
+                "query": query,
+                "vector": self._normalize(query_vector),
+                "result": result,
+                "created_at": time.time()
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def get_stats(self) -> Dict:
+        """获取缓存命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -150,7 +150,7 @@ function showSuccessMessage(message) {
 }
 
 /**
- * 发送消息
+ * 发送消息（通过 /chat/stream 流式接收路由决策、来源和回答片段）
  */
 async function sendMessage() {
     const input = document.getElementById('userInput');
@@ -166,9 +166,14 @@ async function sendMessage() {
     document.getElementById('sendBtn').disabled = true;
     document.getElementById('loading').classList.add('active');
     
+    let messageDiv = null;
+    let content = '';
+    let agent = '';
+    let sources = null;
+    
     try {
         // 发送请求
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -179,21 +184,43 @@ async function sendMessage() {
             })
         });
         
-        const data = await response.json();
-        
-        // 保存session_id
-        if (data.session_id) {
-            sessionId = data.session_id;
+        if (response.status === 429 || response.status === 503) {
+            // LLM服务繁忙（限流排队已满或超时），按 Retry-After 提示稍后重试
+            const body = await response.json().catch(() => ({}));
+            throw new Error(retryMessage(body.detail || '服务繁忙', response.headers.get('Retry-After')));
         }
-        
-        // 显示助手回复
-        addMessage('assistant', data.response, data.agent, data.sources);
-        
-        // 更新调试信息
-        if (data.debug_info) {
-            updateDebugInfo(data.debug_info);
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP ${response.status}`);
         }
         
+        await readEventStream(response, (event, data) => {
+            if (event === 'decision') {
+                // 路由决策完成，先显示执行的智能体，等待回答片段
+                sessionId = data.session_id;
+                agent = AGENT_LABELS[data.agent_type] || data.agent_type;
+                messageDiv = addMessage('assistant', '', agent);
+                updateDebugInfo(data.debug_info);
+            } else if (event === 'sources') {
+                sources = data;
+            } else if (event === 'token') {
+                document.getElementById('loading').classList.remove('active');
+                content += data;
+                renderMessage(messageDiv, 'assistant', content, agent, sources);
+            } else if (event === 'done') {
+                // 以完整回答为准（命中语义缓存时没有之前的事件）
+                sessionId = data.session_id;
+                if (!messageDiv) {
+                    messageDiv = addMessage('assistant', '');
+                }
+                renderMessage(messageDiv, 'assistant', data.response, data.agent, data.sources);
+                if (data.debug_info) {
+                    updateDebugInfo(data.debug_info);
+                }
+            } else if (event === 'error') {
+                throw new Error(data.retry_after ? retryMessage(data.detail, data.retry_after) : data.detail);
+            }
+        });
+        
     } catch (error) {
         addMessage('assistant', '抱歉,发生错误: ' + error.message, '系统');
     } finally {
@@ -202,18 +229,87 @@ async function sendMessage() {
     }
 }
 
+/**
+ * 服务繁忙时的重试提示
+ * @param {string} detail - 错误信息
+ * @param {string|number|null} retryAfter - 建议等待的秒数
+ */
+function retryMessage(detail, retryAfter) {
+    return retryAfter ? `${detail}，请${retryAfter}秒后重试` : `${detail}，请稍后重试`;
+}
+
+// 路由决策中的智能体类型对应的显示名称（完整回答到达后以回答中的名称为准）
+const AGENT_LABELS = {
+    RAG: 'RAG智能体',
+    WEBSEARCH: '网络搜索智能体',
+    CONVERSATION: '对话智能体'
+};
+
+/**
+ * 读取Server-Sent Events响应流
+ * @param {Response} response - fetch响应
+ * @param {Function} onEvent - 事件回调 (事件类型, 解析后的数据)
+ */
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // 事件之间以空行分隔
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            const dataLines = [];
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trim());
+                }
+            });
+            if (dataLines.length > 0) {
+                onEvent(event, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+}
+
 /**
  * 添加消息到聊天框
  * @param {string} role - 角色 (user/assistant)
  * @param {string} content - 消息内容
  * @param {string} agent - Agent名称
  * @param {Array} sources - 来源信息
+ * @returns {HTMLElement} 消息元素，流式回答时用于更新内容
  */
 function addMessage(role, content, agent = '', sources = null) {
     const chatBox = document.getElementById('chatBox');
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${role}`;
+    renderMessage(messageDiv, role, content, agent, sources);
     
+    chatBox.appendChild(messageDiv);
+    chatBox.scrollTop = chatBox.scrollHeight;
+    return messageDiv;
+}
+
+/**
+ * 渲染消息内容
+ * @param {HTMLElement} messageDiv - 消息元素
+ * @param {string} role - 角色 (user/assistant)
+ * @param {string} content - 消息内容
+ * @param {string} agent - Agent名称
+ * @param {Array} sources - 来源信息
+ */
+function renderMessage(messageDiv, role, content, agent = '', sources = null) {
     let html = '';
     if (agent) {
         html += `<div class="agent-label">${agent}</div>`;
@@ -236,7 +332,7 @@ function addMessage(role, content, agent = '', sources = null) {
     html += '</div>';
     messageDiv.innerHTML = html;
     
-    chatBox.appendChild(messageDiv);
+    const chatBox = document.getElementById('chatBox');
     chatBox.scrollTop = chatBox.scrollHeight;
 }
 
@@ -257,12 +353,44 @@ function updateDebugInfo(debugInfo) {
     const decisionEl = document.getElementById('debugDecision');
     if (debugInfo.decision_agent) {
         decisionEl.innerHTML = `<strong>决策结果:</strong> ${debugInfo.decision_agent}`;
+        
+        // 本地快速路由情况
+        const router = debugInfo.fast_router;
+        if (router) {
+            const status = router.hit ? `本地决策 (${router.method === 'keyword' ? '关键词' : `向量相似度 ${router.similarity}`})` : '交给LLM';
+            decisionEl.innerHTML += `<div><strong>快速路由:</strong> ${status}，已省下 ${router.llm_calls_saved} 次LLM调用</div>`;
+        }
+        
+        // 知识库向量路由情况
+        const kbRouting = debugInfo.kb_routing;
+        if (kbRouting) {
+            const scores = Object.entries(kbRouting.scores).map(([kb, score]) => `${kb} ${score}`).join(' / ');
+            const selected = kbRouting.knowledge_bases.length ? kbRouting.knowledge_bases.join('、') : '不确定，交给LLM';
+            decisionEl.innerHTML += `<div><strong>知识库路由:</strong> ${selected}${scores ? ` (${scores})` : ''}</div>`;
+        }
     }
     
     // 更新执行Agent信息
     const executionEl = document.getElementById('debugExecution');
     if (debugInfo.execution_agent) {
         executionEl.innerHTML = `<strong>执行Agent:</strong> ${debugInfo.execution_agent}`;
+        
+        // RAG各阶段耗时
+        const timings = debugInfo.rag_timings;
+        if (timings) {
+            const stages = [['检索', timings.retrieve_ms], ['重排序', timings.rerank_ms], ['首字', timings.first_token_ms], ['生成', timings.generate_ms]]
+                .filter(([, ms]) => ms !== undefined)
+                .map(([label, ms]) => `${label} ${ms.toFixed(0)}ms`);
+            const mode = timings.speculative ? ' (推测检索)' : '';
+            executionEl.innerHTML += `<div><strong>耗时:</strong> ${stages.join(' / ')}${mode}</div>`;
+        }
+
+        // 语义缓存命中情况
+        const cache = debugInfo.semantic_cache;
+        if (cache) {
+            const status = cache.hit ? `命中 (相似度 ${cache.similarity})` : '未命中';
+            executionEl.innerHTML += `<div><strong>语义缓存:</strong> ${status}，命中率 ${(cache.hit_rate * 100).toFixed(1)}% (${cache.hits}/${cache.hits + cache.misses})</div>`;
+        }
     }
     
     // 更新LLM调用记录